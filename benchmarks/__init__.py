@@ -0,0 +1,21 @@
+"""
+Performance benchmarks for the WhatsApp webhook project.
+
+Run from the project root, e.g.:
+    python -m benchmarks.graph_client
+"""
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """Configure Django so benchmarks can import project code"""
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'whatsapp_webhook.settings')
+
+    import django
+    django.setup()
@@ -0,0 +1,145 @@
+"""
+Benchmark: per-send latency of the pooled Graph API client.
+
+Starts a local HTTP/1.1 keep-alive server that answers like the Graph API
+messages endpoint, then sends the same messages two ways:
+
+- unpooled: a new requests.post (new TCP connection) per message, as
+  send_whatsapp_message did before the shared client
+- pooled:   send_whatsapp_message through the shared GraphAPIClient
+
+The stand-in server speaks plain HTTP, so the numbers leave out the TLS
+handshake a real graph.facebook.com connection also pays; savings in
+production are larger.
+
+Usage:
+    python -m benchmarks.graph_client --sends 500 --threads 4
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import setup_django
+from webhook.utils import percentile
+
+
+_message_ids = itertools.count(1)
+
+
+class GraphStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment; split writes on a kept-alive
+    # connection stall on Nagle + delayed ACK and would skew the comparison
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({
+            'messaging_product': 'whatsapp',
+            'contacts': [{'input': '0', 'wa_id': '0'}],
+            'messages': [{'id': f'wamid.benchmark.{next(_message_ids)}'}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GraphStandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(send_one, sends, threads):
+    """Time `sends` calls of send_one spread over `threads` threads"""
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(i):
+        start = time.perf_counter()
+        result = send_one(i)
+        elapsed = time.perf_counter() - start
+        assert result, 'send failed'
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(timed, range(sends)))
+    total = time.perf_counter() - start
+    return {
+        'sends': sends,
+        'sends_per_sec': sends / total,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sends', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    logging.disable(logging.CRITICAL)
+
+    import requests
+    from django.conf import settings
+    from webhook.services import send_whatsapp_message
+
+    server = start_server()
+    settings.WHATSAPP_API_BASE_URL = f'http://127.0.0.1:{server.server_address[1]}/v21.0'
+    settings.WHATSAPP_ACCESS_TOKEN = 'benchmark-token'
+    settings.WHATSAPP_PHONE_NUMBER_ID = '100000000000000'
+    settings.WHATSAPP_HTTP_POOL_SIZE = max(settings.WHATSAPP_HTTP_POOL_SIZE, args.threads)
+    # Measure the HTTP path only, not outbound pacing
+    settings.WHATSAPP_RATE_LIMIT_ENABLED = False
+
+    url = f"{settings.WHATSAPP_API_BASE_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+
+    def unpooled(i):
+        headers = {
+            'Authorization': f'Bearer {settings.WHATSAPP_ACCESS_TOKEN}',
+            'Content-Type': 'application/json',
+        }
+        payload = {'messaging_product': 'whatsapp', 'to': '910000000000', 'type': 'text', 'text': {'body': f'msg {i}'}}
+        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json()['messages'][0]['id']
+
+    def pooled(i):
+        return send_whatsapp_message('910000000000', f'msg {i}')['success']
+
+    # Warm up both paths (imports, first connections)
+    run(unpooled, 20, args.threads)
+    run(pooled, 20, args.threads)
+
+    results = {
+        'unpooled': run(unpooled, args.sends, args.threads),
+        'pooled': run(pooled, args.sends, args.threads),
+    }
+    server.shutdown()
+
+    for name, result in results.items():
+        print(f"{name:9s} {result['sends_per_sec']:9.1f} sends/s  "
+              f"mean {result['mean_ms']:6.2f} ms  p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms")
+    saved = results['unpooled']['mean_ms'] - results['pooled']['mean_ms']
+    print(f"saved per send: {saved:.2f} ms ({saved / results['unpooled']['mean_ms'] * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark: per-request cost of the full middleware stack on webhook routes.
+
+Calls the two WSGI handlers directly (no sockets) with the same requests:
+
+- full: Django's WSGIHandler with settings.MIDDLEWARE
+- lean: the WHATSAPP_LEAN_MIDDLEWARE handler that whatsapp_webhook.wsgi
+  uses for /webhook/ and /api/ with WHATSAPP_LEAN_DISPATCH=True
+
+Two request types are timed. A GET verification challenge touches no
+database, so nearly all of its time is dispatch overhead. A webhook POST
+with one text message shows how much that overhead matters next to a real
+ingest against a throwaway SQLite database.
+
+Usage:
+    python -m benchmarks.middleware_overhead --requests 5000
+"""
+import argparse
+import io
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks import setup_django
+from benchmarks.payloads import PayloadFactory
+from webhook.utils import percentile
+
+
+def make_environ(method, path, query='', body=b''):
+    from django.conf import settings
+    from webhook.signature import sign_body
+
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': '127.0.0.1',
+        'SERVER_PORT': '8000',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': '127.0.0.1:8000',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if body and settings.WHATSAPP_APP_SECRET:
+        environ['HTTP_X_HUB_SIGNATURE_256'] = sign_body(body, settings.WHATSAPP_APP_SECRET)
+    return environ
+
+
+def run(handler, environs):
+    """Time each request through a WSGI handler"""
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    latencies = []
+    start = time.perf_counter()
+    for environ in environs:
+        request_start = time.perf_counter()
+        response = handler(environ, start_response)
+        b''.join(response)
+        if hasattr(response, 'close'):
+            response.close()
+        latencies.append(time.perf_counter() - request_start)
+    total = time.perf_counter() - start
+    failed = sum(1 for status in statuses if not status.startswith('200'))
+    assert not failed, f'{failed} requests failed: {statuses[:3]}'
+    return {
+        'req_per_sec': len(latencies) / total,
+        'mean_us': sum(latencies) / len(latencies) * 1e6,
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000, help='GET requests per handler')
+    parser.add_argument('--posts', type=int, default=500, help='POST requests per handler')
+    args = parser.parse_args()
+
+    setup_django()
+    logging.disable(logging.CRITICAL)
+
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from whatsapp_webhook.dispatch import LeanWSGIHandler
+
+    setup_test_environment(debug=False)
+    fd, test_db = tempfile.mkstemp(prefix='webhook-benchmark-', suffix='.sqlite3')
+    os.close(fd)
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = test_db
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    handlers = {'full': WSGIHandler(), 'lean': LeanWSGIHandler()}
+    query = f'hub.mode=subscribe&hub.verify_token={settings.WHATSAPP_VERIFY_TOKEN}&hub.challenge=1'
+    factory = PayloadFactory(batch_size=1, seed=1)
+
+    try:
+        results = {}
+        for name, handler in handlers.items():
+            # Warm up URL resolving, view imports and the database connection
+            run(handler, [make_environ('GET', '/webhook/', query) for _ in range(200)])
+            run(handler, [make_environ('POST', '/webhook/', body=factory.build('text')[0]) for _ in range(20)])
+        for name, handler in handlers.items():
+            results[name] = {
+                'get': run(handler, [make_environ('GET', '/webhook/', query) for _ in range(args.requests)]),
+                'post': run(handler, [make_environ('POST', '/webhook/', body=factory.build('text')[0])
+                                      for _ in range(args.posts)]),
+            }
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+        if os.path.exists(test_db):
+            os.unlink(test_db)
+
+    print(f"full stack: {len(settings.MIDDLEWARE)} middleware, lean: {len(settings.WHATSAPP_LEAN_MIDDLEWARE)}")
+    for kind, label in (('get', 'GET verify'), ('post', 'POST 1 msg')):
+        for name in handlers:
+            result = results[name][kind]
+            print(f"{label} {name:4s} {result['req_per_sec']:9.1f} req/s  mean {result['mean_us']:8.1f} us  "
+                  f"p50 {result['p50_us']:8.1f} us  p99 {result['p99_us']:8.1f} us")
+        saved = results['full'][kind]['mean_us'] - results['lean'][kind]['mean_us']
+        print(f"{label} saved per request: {saved:.1f} us ({saved / results['full'][kind]['mean_us'] * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
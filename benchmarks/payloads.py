@@ -0,0 +1,206 @@
+"""
+Synthetic webhook payloads for benchmarks.
+
+Generates the payload shapes of test_commands.sh (text, audio, image, video,
+document, location, sticker, contacts) plus status batches and call events,
+in batches of any size. A share of the items can repeat earlier ones, the
+way Meta redelivers messages and statuses it has not seen acknowledged.
+
+    factory = PayloadFactory(batch_size=10, duplicate_ratio=0.1, seed=1)
+    body, items = factory.build('image')
+"""
+import base64
+import hashlib
+import json
+import random
+
+from webhook.utils import build_webhook_envelope
+
+
+ENTRY_ID = '356955237510870'
+METADATA = {'display_phone_number': '918745097126', 'phone_number_id': '432038163320755'}
+
+MESSAGE_SCENARIOS = ['text', 'audio', 'image', 'video', 'document', 'location', 'sticker', 'contacts']
+SCENARIOS = MESSAGE_SCENARIOS + ['status', 'call', 'mixed']
+
+_WORDS = (
+    'hello order delivery invoice payment refund thanks please when where price stock '
+    'tomorrow today address photo receipt help support cancel confirm update'
+).split()
+
+STATUS_SEQUENCE = ['sent', 'delivered', 'read']
+
+
+def _sha256(seed):
+    return base64.b64encode(hashlib.sha256(seed.encode()).digest()).decode()
+
+
+def _media(kind, n, **extra):
+    return {
+        'mime_type': extra.pop('mime_type'),
+        'sha256': _sha256(f'{kind}{n}'),
+        'id': str(1000000000000000 + n),
+        'url': f'https://lookaside.fbsbx.com/whatsapp_business/attachments/?mid={1000000000000000 + n}',
+        **extra,
+    }
+
+
+class PayloadFactory:
+    """
+    Builds webhook bodies with unique ids, deterministic for a given seed.
+
+    Args:
+        batch_size: Messages, statuses or call events per webhook body
+        duplicate_ratio: Share of items (0-1) that repeat an earlier item
+        contacts: Number of distinct senders
+        seed: Random seed
+    """
+
+    def __init__(self, batch_size=1, duplicate_ratio=0.0, contacts=50, seed=0):
+        self.batch_size = batch_size
+        self.duplicate_ratio = duplicate_ratio
+        self.random = random.Random(seed)
+        self.wa_ids = [f'9182{n:08d}' for n in range(contacts)]
+        self.timestamp = 1766216432
+        self.counter = 0
+        # Earlier items per kind, for redeliveries
+        self.sent = {'messages': [], 'statuses': [], 'calls': []}
+        # wamids of outgoing messages that status batches refer to
+        self.outgoing_ids = []
+
+    def _next(self):
+        self.counter += 1
+        self.timestamp += 1
+        return self.counter
+
+    def _text(self, words):
+        return ' '.join(self.random.choice(_WORDS) for _ in range(words))
+
+    def message(self, message_type):
+        """One incoming message object of the given type"""
+        n = self._next()
+        message = {
+            'from': self.random.choice(self.wa_ids),
+            'id': f'wamid.benchmark.in.{n}',
+            'timestamp': str(self.timestamp),
+            'type': message_type,
+        }
+        if message_type == 'text':
+            message['text'] = {'body': self._text(self.random.randint(3, 20))}
+        elif message_type == 'audio':
+            message['audio'] = _media('audio', n, mime_type='audio/ogg; codecs=opus', voice=True)
+        elif message_type == 'image':
+            message['image'] = _media('image', n, mime_type='image/jpeg', caption=self._text(4))
+        elif message_type == 'video':
+            message['video'] = _media('video', n, mime_type='video/mp4', caption=self._text(4))
+        elif message_type == 'document':
+            message['document'] = _media('document', n, mime_type='application/pdf',
+                                         filename=f'{self.random.choice(_WORDS)}_{n}.pdf')
+        elif message_type == 'location':
+            message['location'] = {'latitude': round(self.random.uniform(8, 35), 6),
+                                   'longitude': round(self.random.uniform(68, 97), 6)}
+        elif message_type == 'sticker':
+            message['sticker'] = _media('sticker', n, mime_type='image/webp', animated=False)
+        elif message_type == 'contacts':
+            message['contacts'] = [{
+                'name': {'first_name': 'Anil', 'last_name': f'Contact{n}', 'formatted_name': f'Anil Contact{n}'},
+                'phones': [{'phone': f'+91 9{n:09d}', 'wa_id': f'919{n:09d}', 'type': 'MOBILE'}],
+            }]
+        return message
+
+    def status(self):
+        """One status event for an outgoing message, advancing it through sent/delivered/read"""
+        self._next()
+        if not self.outgoing_ids or self.random.random() < 0.4:
+            self.outgoing_ids.append([f'wamid.benchmark.out.{len(self.outgoing_ids) + 1}', 0])
+        entry = self.random.choice(self.outgoing_ids)
+        status_name = STATUS_SEQUENCE[min(entry[1], len(STATUS_SEQUENCE) - 1)]
+        entry[1] += 1
+        return {
+            'id': entry[0],
+            'status': status_name,
+            'timestamp': str(self.timestamp),
+            'recipient_id': self.random.choice(self.wa_ids),
+            'conversation': {'id': f'conv{entry[0]}', 'origin': {'type': 'service'}},
+            'pricing': {'billable': True, 'pricing_model': 'CBP', 'category': 'service'},
+        }
+
+    def call_events(self):
+        """Connect and terminate events of one user-initiated call"""
+        n = self._next()
+        caller = self.random.choice(self.wa_ids)
+        common = {
+            'id': f'wacid.benchmark.{n}',
+            'from': caller,
+            'to': METADATA['display_phone_number'],
+            'direction': 'USER_INITIATED',
+        }
+        duration = self.random.randint(5, 600)
+        start = self.timestamp
+        self.timestamp += duration
+        return [
+            {**common, 'event': 'connect', 'timestamp': str(start),
+             'session': {'sdp_type': 'offer', 'sdp': 'v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\n'}},
+            {**common, 'event': 'terminate', 'timestamp': str(self.timestamp), 'status': 'COMPLETED',
+             'start_time': str(start), 'end_time': str(self.timestamp), 'duration': duration},
+        ]
+
+    def _with_redeliveries(self, kind, make):
+        """
+        At least batch_size items from make(), some replaced by earlier items.
+
+        Call events come in pairs, so a call batch can run one over.
+        """
+        items = []
+        while len(items) < self.batch_size:
+            earlier = self.sent[kind]
+            if earlier and self.random.random() < self.duplicate_ratio:
+                items.append(self.random.choice(earlier))
+                continue
+            new = make()
+            new = new if isinstance(new, list) else [new]
+            earlier.extend(new)
+            items.extend(new)
+        return items
+
+    def _contacts(self, wa_ids):
+        return [{'profile': {'name': f'User {wa_id[-4:]}'}, 'wa_id': wa_id} for wa_id in dict.fromkeys(wa_ids)]
+
+    def payload(self, scenario):
+        """
+        Build one webhook payload.
+
+        Args:
+            scenario: A name from SCENARIOS; 'mixed' picks a message type per item
+
+        Returns:
+            dict: Webhook payload
+        """
+        if scenario == 'status':
+            statuses = self._with_redeliveries('statuses', self.status)
+            return build_webhook_envelope('messages', {'metadata': METADATA, 'statuses': statuses}, ENTRY_ID)
+        if scenario == 'call':
+            calls = self._with_redeliveries('calls', self.call_events)
+            value = {'metadata': METADATA, 'contacts': self._contacts([c['from'] for c in calls]), 'calls': calls}
+            return build_webhook_envelope('calls', value, ENTRY_ID)
+        if scenario == 'mixed':
+            make = lambda: self.message(self.random.choice(MESSAGE_SCENARIOS))
+        elif scenario in MESSAGE_SCENARIOS:
+            make = lambda: self.message(scenario)
+        else:
+            raise ValueError(f"Unknown scenario: {scenario}")
+        messages = self._with_redeliveries('messages', make)
+        value = {'metadata': METADATA, 'contacts': self._contacts([m['from'] for m in messages]), 'messages': messages}
+        return build_webhook_envelope('messages', value, ENTRY_ID)
+
+    def build(self, scenario):
+        """
+        Build one encoded webhook body.
+
+        Returns:
+            tuple: (body bytes, number of items in it)
+        """
+        payload = self.payload(scenario)
+        value = payload['entry'][0]['changes'][0]['value']
+        items = sum(len(value.get(key, [])) for key in ('messages', 'statuses', 'calls'))
+        return json.dumps(payload).encode(), items
@@ -0,0 +1,313 @@
+"""
+Benchmark: webhook ingest throughput.
+
+Posts synthetic webhook bodies (see benchmarks/payloads.py) for each
+scenario and reports requests/s, items/s, p50/p99 latency and, in process,
+database queries per item.
+
+- inprocess: requests go through Django's test client (middleware, URL
+  routing and the view) against a throwaway SQLite database file, with
+  every SQL statement counted
+- http:      requests are posted to a running server (--url) from
+  --concurrency threads; queries are not counted
+
+Results are written as JSON. Pass an earlier result with --compare to flag
+regressions: lower throughput or higher p99 beyond --tolerance, or any
+increase in queries per item. The exit status is 1 if there are any.
+
+Logging is disabled while timing, as in the other benchmarks.
+
+Usage:
+    python -m benchmarks.webhook_throughput --requests 300 --batch-size 10
+    python -m benchmarks.webhook_throughput --scenarios text,status --duplicate-ratio 0.2 \\
+        --output baseline.json
+    python -m benchmarks.webhook_throughput --compare baseline.json
+    python -m benchmarks.webhook_throughput --mode http --url http://127.0.0.1:8000/webhook/ --concurrency 8
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks import PROJECT_ROOT, setup_django
+from benchmarks.payloads import SCENARIOS, PayloadFactory
+from webhook.utils import percentile
+
+
+RESULTS_DIR = PROJECT_ROOT / 'benchmarks' / 'results'
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts statements (executemany counts once)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def summarize(latencies, items, queries, errors, elapsed):
+    requests = len(latencies)
+    return {
+        'requests': requests,
+        'items': items,
+        'errors': errors,
+        'req_per_sec': requests / elapsed,
+        'items_per_sec': items / elapsed,
+        'mean_ms': sum(latencies) / requests * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_request': queries / requests if queries is not None else None,
+        'queries_per_item': queries / items if queries is not None and items else None,
+    }
+
+
+def seed_outgoing(factory, count):
+    """Create the outgoing messages that status batches refer to"""
+    from webhook.models import WhatsAppOutgoingMessage
+
+    WhatsAppOutgoingMessage.objects.bulk_create([
+        WhatsAppOutgoingMessage(
+            message_id=f'wamid.benchmark.out.{n}', to_number=factory.wa_ids[n % len(factory.wa_ids)],
+            message_type='text', message_text='benchmark', status='sent',
+        )
+        for n in range(1, count + 1)
+    ], ignore_conflicts=True)
+
+
+def signature_headers(body):
+    """X-Hub-Signature-256 for a body when WHATSAPP_APP_SECRET is set, so signed setups are benchmarked too"""
+    from django.conf import settings
+    from webhook.signature import SIGNATURE_HEADER, sign_body
+
+    if not settings.WHATSAPP_APP_SECRET:
+        return {}
+    return {SIGNATURE_HEADER: sign_body(body, settings.WHATSAPP_APP_SECRET)}
+
+
+def run_inprocess(bodies):
+    """Post prepared bodies one by one through the Django test client"""
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    counter = QueryCounter()
+    latencies = []
+    errors = 0
+    signed = [(body, signature_headers(body)) for body in bodies]
+    with connection.execute_wrapper(counter):
+        start = time.perf_counter()
+        for body, headers in signed:
+            request_start = time.perf_counter()
+            response = client.post('/webhook/', data=body, content_type='application/json', headers=headers)
+            latencies.append(time.perf_counter() - request_start)
+            if response.status_code != 200:
+                errors += 1
+        elapsed = time.perf_counter() - start
+    return latencies, counter.count, errors, elapsed
+
+
+def run_http(bodies, url, concurrency):
+    """Post prepared bodies to a running server from concurrency threads"""
+    import requests
+
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def post(body):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        request_start = time.perf_counter()
+        try:
+            headers = {'Content-Type': 'application/json', **signature_headers(body)}
+            ok = session.post(url, data=body, headers=headers, timeout=30).ok
+        except requests.exceptions.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - request_start
+        with lock:
+            latencies.append(elapsed)
+            errors[0] += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(post, bodies))
+    return latencies, None, errors[0], time.perf_counter() - start
+
+
+def run_scenario(scenario, args, factory):
+    warmup = [factory.build(scenario)[0] for _ in range(args.warmup)]
+    prepared = [factory.build(scenario) for _ in range(args.requests)]
+    bodies = [body for body, _ in prepared]
+    items = sum(count for _, count in prepared)
+
+    if args.mode == 'inprocess':
+        if scenario == 'status':
+            seed_outgoing(factory, len(factory.outgoing_ids))
+        run_inprocess(warmup)
+        latencies, queries, errors, elapsed = run_inprocess(bodies)
+    else:
+        run_http(warmup, args.url, args.concurrency)
+        latencies, queries, errors, elapsed = run_http(bodies, args.url, args.concurrency)
+    return summarize(latencies, items, queries, errors, elapsed)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(args):
+    import django
+    from django.conf import settings
+    from django.db import connection
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor if args.mode == 'inprocess' else None,
+        'mode': args.mode,
+        'url': args.url if args.mode == 'http' else None,
+        'concurrency': args.concurrency if args.mode == 'http' else 1,
+        'batch_size': args.batch_size,
+        'duplicate_ratio': args.duplicate_ratio,
+        'requests': args.requests,
+        'seed': args.seed,
+        'settings': {
+            name: getattr(settings, name, None) for name in (
+                'WHATSAPP_WEBHOOK_INBOX_MODE', 'WHATSAPP_DEDUP_ENABLED', 'WHATSAPP_ARCHIVE_PAYLOADS',
+            )
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change of each scenario against a baseline result file.
+
+    Returns:
+        list: Descriptions of regressions
+    """
+    regressions = []
+    print(f"\ncompared with {baseline['environment'].get('git_revision')} "
+          f"({baseline['environment'].get('timestamp')})")
+    for scenario, current in results['scenarios'].items():
+        before = baseline['scenarios'].get(scenario)
+        if before is None:
+            continue
+        changes = []
+        throughput = current['req_per_sec'] / before['req_per_sec'] - 1
+        changes.append(f"req/s {throughput:+.1%}")
+        if throughput < -tolerance:
+            regressions.append(f"{scenario}: req/s {throughput:+.1%}")
+        p99 = current['p99_ms'] / before['p99_ms'] - 1 if before['p99_ms'] else 0.0
+        changes.append(f"p99 {p99:+.1%}")
+        if p99 > tolerance:
+            regressions.append(f"{scenario}: p99 {p99:+.1%}")
+        if current['queries_per_item'] is not None and before.get('queries_per_item') is not None:
+            delta = current['queries_per_item'] - before['queries_per_item']
+            changes.append(f"queries/item {delta:+.2f}")
+            # Query counts are deterministic for a given seed, so any increase is real
+            if delta > 0.005:
+                regressions.append(f"{scenario}: queries/item {before['queries_per_item']:.2f} -> "
+                                   f"{current['queries_per_item']:.2f}")
+        print(f"{scenario:9s} " + '  '.join(changes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per scenario')
+    parser.add_argument('--batch-size', type=int, default=10, help='Items per webhook body')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help='Share of redelivered items (0-1)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/webhook/', help='Webhook URL (http mode)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads (http mode)')
+    parser.add_argument('--output', help=f'Result file (default: a timestamped file in {RESULTS_DIR})')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed relative drop in req/s or rise in p99 before flagging (default 0.15)')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    setup_django()
+    logging.disable(logging.CRITICAL)
+
+    from django.conf import settings
+    from django.db import connection
+
+    test_db = None
+    if args.mode == 'inprocess':
+        from django.test.utils import setup_test_environment
+
+        # Lets the test client's 'testserver' host past ALLOWED_HOSTS
+        setup_test_environment(debug=False)
+        if connection.vendor == 'sqlite':
+            # A file, not the default in-memory test database, so commits pay for disk writes
+            fd, test_db = tempfile.mkstemp(prefix='webhook-benchmark-', suffix='.sqlite3')
+            os.close(fd)
+            settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = test_db
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    results = {'environment': environment(args), 'scenarios': {}}
+    try:
+        factory = PayloadFactory(batch_size=args.batch_size, duplicate_ratio=args.duplicate_ratio, seed=args.seed)
+        for scenario in scenarios:
+            result = results['scenarios'][scenario] = run_scenario(scenario, args, factory)
+            queries = (f"{result['queries_per_item']:5.2f} queries/item"
+                       if result['queries_per_item'] is not None else '')
+            print(f"{scenario:9s} {result['req_per_sec']:8.1f} req/s {result['items_per_sec']:9.1f} items/s  "
+                  f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  {queries}"
+                  + (f"  {result['errors']} errors" if result['errors'] else ''))
+    finally:
+        if args.mode == 'inprocess':
+            connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+        if test_db and os.path.exists(test_db):
+            os.unlink(test_db)
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = RESULTS_DIR / f"webhook_throughput-{args.mode}-{stamp}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nregressions:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
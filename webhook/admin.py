@@ -1,55 +1,134 @@
 from django.contrib import admin
-from .models import WhatsAppMessage, WhatsAppCall, WhatsAppMessageStatus, WhatsAppOutgoingMessage
+from django.db.models import Q
+from .admin_utils import CachedAllValuesFieldListFilter, LargeTableAdminMixin
+from .models import (
+    Conversation, WhatsAppMessage, WhatsAppMessageAttachment, WhatsAppCall, WhatsAppMessageStatus,
+    WhatsAppOutgoingMessage, WhatsAppCallSession, WebhookInboxEntry,
+)
+from .search import get_search_backend
+
+
+class WhatsAppMessageAttachmentInline(admin.StackedInline):
+    model = WhatsAppMessageAttachment
+    fields = ['media_id', 'url', 'mime_type', 'sha256', 'caption', 'filename', 'is_voice', 'is_animated',
+              'latitude', 'longitude', 'contacts_data', 'fetch_status', 'fetch_attempts', 'fetch_error',
+              'media_blob']
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(WhatsAppMessage)
-class WhatsAppMessageAdmin(admin.ModelAdmin):
+class WhatsAppMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['from_number', 'contact_name', 'message_type', 'message_text', 'created_at', 'processed']
     list_filter = ['message_type', 'processed', 'created_at']
     search_fields = ['from_number', 'contact_name', 'message_text', 'message_id']
     readonly_fields = ['message_id', 'wa_id', 'from_number', 'contact_name', 'message_type', 
-                      'message_text', 'audio_id', 'audio_url', 'audio_mime_type', 'is_voice',
-                      'timestamp', 'phone_number_id', 'display_phone_number', 'raw_payload', 'created_at']
+                      'message_text', 'timestamp', 'event_at', 'phone_number_id', 'display_phone_number',
+                      'payload', 'created_at']
+    exclude = ['raw_payload', 'raw_payload_archive']
+    inlines = [WhatsAppMessageAttachmentInline]
+    changelist_defer = ['raw_payload']
+    # Upper bound on full-text matches listed for one admin search
+    search_limit = 1000
     
     def has_add_permission(self, request):
         return False  # Messages are only created via webhook
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Search the full-text index, plus exact matches on the indexed ID columns"""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        ids = get_search_backend().search(search_term, limit=self.search_limit)
+        matches = Q(id__in=ids) | Q(message_id=search_term) | Q(wa_id=search_term)
+        return queryset.filter(matches), False
 
 
 @admin.register(WhatsAppCall)
-class WhatsAppCallAdmin(admin.ModelAdmin):
+class WhatsAppCallAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['from_number', 'to_number', 'contact_name', 'event', 'status', 'direction', 'duration', 'created_at']
     list_filter = ['event', 'status', 'direction', 'created_at']
     search_fields = ['from_number', 'to_number', 'contact_name', 'call_id']
     readonly_fields = ['call_id', 'from_number', 'to_number', 'wa_id', 'contact_name', 
-                      'event', 'direction', 'status', 'timestamp', 'start_time', 'end_time',
+                      'event', 'direction', 'status', 'timestamp', 'event_at', 'start_time', 'started_at',
+                      'end_time', 'ended_at',
                       'duration', 'session_sdp', 'session_sdp_type', 'phone_number_id',
-                      'display_phone_number', 'raw_payload', 'created_at']
+                      'display_phone_number', 'payload', 'created_at']
+    exclude = ['raw_payload', 'raw_payload_archive']
+    changelist_defer = ['raw_payload', 'session_sdp']
     
     def has_add_permission(self, request):
         return False  # Calls are only created via webhook
 
 
+@admin.register(WhatsAppCallSession)
+class WhatsAppCallSessionAdmin(admin.ModelAdmin):
+    list_display = ['from_number', 'to_number', 'contact_name', 'direction', 'status', 'duration', 'first_event_at']
+    list_filter = ['status', 'direction']
+    search_fields = ['from_number', 'to_number', 'contact_name', 'call_id']
+    readonly_fields = ['call_id', 'from_number', 'to_number', 'wa_id', 'contact_name', 'direction', 'status',
+                      'first_event_at', 'connected_at', 'terminated_at', 'started_at', 'ended_at', 'duration',
+                      'session_sdp', 'session_sdp_type', 'phone_number_id', 'created_at', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False  # Call sessions are maintained by the ingest path
+
+
 @admin.register(WhatsAppMessageStatus)
-class WhatsAppMessageStatusAdmin(admin.ModelAdmin):
+class WhatsAppMessageStatusAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['recipient_id', 'status', 'message_id', 'is_billable', 'pricing_type', 'created_at']
-    list_filter = ['status', 'is_billable', 'pricing_category', 'created_at']
+    list_filter = ['status', 'is_billable', ('pricing_category', CachedAllValuesFieldListFilter), 'created_at']
     search_fields = ['recipient_id', 'message_id', 'conversation_id']
     readonly_fields = ['message_id', 'status', 'recipient_id', 'conversation_id',
-                      'conversation_expiration_timestamp', 'conversation_origin_type',
+                      'conversation_expiration_timestamp', 'conversation_expires_at', 'conversation_origin_type',
                       'is_billable', 'pricing_model', 'pricing_category', 'pricing_type',
-                      'timestamp', 'phone_number_id', 'display_phone_number', 'raw_payload', 'created_at']
+                      'timestamp', 'event_at', 'phone_number_id', 'display_phone_number', 'payload', 'created_at']
+    exclude = ['raw_payload', 'raw_payload_archive']
+    changelist_defer = ['raw_payload']
     
     def has_add_permission(self, request):
         return False  # Statuses are only created via webhook
 
 
 @admin.register(WhatsAppOutgoingMessage)
-class WhatsAppOutgoingMessageAdmin(admin.ModelAdmin):
-    list_display = ['to_number', 'message_text', 'status', 'message_id', 'created_at', 'sent_at']
+class WhatsAppOutgoingMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['to_number', 'message_text', 'status', 'message_id', 'attempt_count', 'created_at', 'sent_at']
     list_filter = ['status', 'message_type', 'created_at']
     search_fields = ['to_number', 'message_text', 'message_id']
     readonly_fields = ['message_id', 'to_number', 'message_type', 'message_text', 'status',
-                      'api_response', 'error_message', 'created_at', 'sent_at', 'updated_at']
+                      'api_response_payload', 'error_message', 'attempt_count', 'next_attempt_at',
+                      'created_at', 'sent_at', 'delivered_at', 'read_at', 'updated_at']
+    exclude = ['api_response', 'api_response_archive']
+    changelist_defer = ['api_response']
     
     def has_add_permission(self, request):
         return False  # Outgoing messages are created via API endpoint only
+
+
+@admin.register(WebhookInboxEntry)
+class WebhookInboxEntryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status']
+    readonly_fields = ['status', 'attempts', 'last_error', 'received_at', 'processed_at']
+    exclude = ['body']
+    changelist_defer = ['body', 'last_error']
+    
+    def has_add_permission(self, request):
+        return False  # Inbox entries are only created via webhook
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ['wa_id', 'contact_name', 'last_direction', 'last_message_preview',
+                    'unprocessed_count', 'message_count', 'last_message_at']
+    search_fields = ['wa_id', 'contact_name']
+    readonly_fields = ['phone_number_id', 'wa_id', 'contact_name', 'last_message_at', 'last_direction',
+                      'last_message_type', 'last_message_preview', 'last_inbound_at',
+                      'message_count', 'unprocessed_count', 'created_at', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False  # Conversations are maintained by the ingest and send paths
@@ -0,0 +1,91 @@
+"""
+Admin helpers for tables with millions of rows.
+
+The stock changelist runs an exact COUNT(*) (twice, with
+show_full_result_count), loads every column of each listed row and reads
+the distinct values of un-choiced list_filter fields on every page view.
+LargeTableAdminMixin swaps in a paginator that estimates or caps the count,
+defers bulky columns in the changelist and is meant to be combined with
+CachedAllValuesFieldListFilter.
+"""
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Cheap approximate row count of a model's table.
+
+    Uses the planner statistics on PostgreSQL and the largest primary key on
+    SQLite (rows are rarely deleted from the webhook tables).
+
+    Returns:
+        int, or None if no estimate is available
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            pk_column = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(f'SELECT MAX({pk_column}) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a large result set exactly.
+
+    An unfiltered changelist uses estimate_row_count. A filtered one counts
+    at most count_limit rows; beyond that the changelist shows count_limit
+    results and the filters have to be narrowed, which also bounds the
+    OFFSET of the deepest page.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate > self.count_limit:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """AllValuesFieldListFilter whose SELECT DISTINCT is cached for cache_timeout seconds"""
+    cache_timeout = 600
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f"admin-filter-values:{model._meta.label_lower}:{field_path}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.lookup_choices)
+            cache.set(key, choices, self.cache_timeout)
+        self.lookup_choices = choices
+
+
+class LargeTableAdminMixin:
+    """ModelAdmin mixin for the high-volume webhook tables"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Columns not loaded for changelist rows
+    changelist_defer = []
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.changelist_defer and match and (match.url_name or '').endswith('_changelist'):
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
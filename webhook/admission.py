@@ -0,0 +1,148 @@
+"""
+Admission control for webhook POSTs.
+
+When the database slows down, webhook requests queue up on the SQLite write
+lock until every worker is busy and even the GET verification goes
+unanswered. Meta redelivers anything not acknowledged with a 200, so under
+that kind of load it is cheaper to refuse new deliveries at once with
+``503 Retry-After`` than to let them wait.
+
+Two signals are tracked per process:
+
+- Requests in flight: admitted POSTs that have not finished yet. Limited by
+  WHATSAPP_ADMISSION_MAX_IN_FLIGHT.
+- Write latency: an exponentially weighted moving average of the seconds
+  spent writing a delivery (the ingest transaction, or the inbox insert in
+  inbox mode). Limited by WHATSAPP_ADMISSION_MAX_WRITE_SECONDS. While
+  nothing is in flight the average decays, so that once the database
+  recovers a new request gets through and refreshes it.
+
+Status-only deliveries (sent/delivered/read receipts) are shed first. They
+are refused past WHATSAPP_ADMISSION_STATUS_SHARE of either limit, which
+keeps room for user messages and calls. GET requests are never shed.
+
+Shed requests are counted in the ``whatsapp_webhook_shed_total`` metric.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.http import JsonResponse
+from .metrics import WEBHOOK_SHED
+
+logger = logging.getLogger(__name__)
+
+
+# Weight of the newest write in the latency average
+WRITE_LATENCY_ALPHA = 0.2
+# Seconds for the latency average to halve while nothing is in flight
+IDLE_HALF_LIFE = 2.0
+
+
+def is_status_only(body):
+    """
+    Whether a raw webhook body only carries message statuses.
+
+    Checked on the raw bytes so nothing is parsed for a request that may be
+    shed. Messages and calls always have a "from" field, statuses never do.
+    """
+    return b'"statuses"' in body and b'"from"' not in body
+
+
+class AdmissionController:
+    """In-flight count and write latency average of this process"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.write_seconds = 0.0
+        self._observed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _current_write_seconds(self, now):
+        if self.in_flight:
+            return self.write_seconds
+        idle = now - self._observed_at
+        return self.write_seconds * 0.5 ** (idle / IDLE_HALF_LIFE)
+
+    def try_admit(self, priority):
+        """
+        Count a request in flight unless a limit is reached.
+
+        Args:
+            priority: 'message' or 'status'
+
+        Returns:
+            str: Reason the request is shed ('in_flight' or 'write_latency'),
+                or None if it was admitted; admitted requests must call release()
+        """
+        share = settings.WHATSAPP_ADMISSION_STATUS_SHARE if priority == 'status' else 1.0
+        max_in_flight = settings.WHATSAPP_ADMISSION_MAX_IN_FLIGHT
+        max_write_seconds = settings.WHATSAPP_ADMISSION_MAX_WRITE_SECONDS
+        with self._lock:
+            now = time.monotonic()
+            if max_in_flight and self.in_flight >= max(1, int(max_in_flight * share)):
+                return 'in_flight'
+            if max_write_seconds and self._current_write_seconds(now) > max_write_seconds * share:
+                return 'write_latency'
+            if not self.in_flight:
+                # Fold the idle decay in before the average stops decaying
+                self.write_seconds = self._current_write_seconds(now)
+                self._observed_at = now
+            self.in_flight += 1
+            return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._observed_at = time.monotonic()
+
+    def observe_write(self, seconds):
+        with self._lock:
+            self.write_seconds += WRITE_LATENCY_ALPHA * (seconds - self.write_seconds)
+            self._observed_at = time.monotonic()
+
+    @contextmanager
+    def timed_write(self):
+        """Feed the seconds spent in the block into the write latency average"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_write(time.perf_counter() - start)
+
+    def state(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'write_seconds': self._current_write_seconds(time.monotonic()),
+            }
+
+
+admission = AdmissionController()
+
+
+def shed_webhook_request(request):
+    """
+    Admit a webhook POST or refuse it with 503.
+
+    Args:
+        request: Django HttpRequest of the webhook POST
+
+    Returns:
+        JsonResponse shedding the request, or None if it was admitted; admitted
+        requests must call admission.release() when done
+    """
+    priority = 'status' if is_status_only(request.body) else 'message'
+    reason = admission.try_admit(priority)
+    if reason is None:
+        return None
+
+    WEBHOOK_SHED.inc(priority=priority, reason=reason)
+    logger.debug(f"Shed webhook POST ({priority}, {reason}): {admission.state()}")
+    response = JsonResponse({'status': 'error', 'message': 'Overloaded, retry later'}, status=503)
+    response['Retry-After'] = str(settings.WHATSAPP_ADMISSION_RETRY_AFTER)
+    # Shedding is counted above; skip Django's error log line for every 5xx response
+    response._has_been_logged = True
+    return response
@@ -0,0 +1,41 @@
+"""
+Bearer-token access to the read APIs.
+
+Conversation history, message search and media downloads expose customer
+data, so they require "Authorization: Bearer <WHATSAPP_API_TOKEN>". While
+WHATSAPP_API_TOKEN is unset every request to them is refused.
+"""
+import hmac
+from django.conf import settings
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission
+
+
+class APITokenAuthentication(BaseAuthentication):
+    """Accepts "Authorization: Bearer <WHATSAPP_API_TOKEN>"; request.auth is set to the token"""
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = request.headers.get('Authorization', '')
+        if not header.startswith(f'{self.keyword} '):
+            return None
+        token = settings.WHATSAPP_API_TOKEN
+        presented = header[len(self.keyword) + 1:].strip()
+        if not token or not hmac.compare_digest(presented.encode(), token.encode()):
+            raise AuthenticationFailed('Invalid API token')
+        return None, token
+
+    def authenticate_header(self, request):
+        # Makes DRF answer 401 rather than 403 when no token is sent
+        return self.keyword
+
+
+class HasAPIToken(BasePermission):
+    """Allows requests authenticated by APITokenAuthentication"""
+
+    message = 'An API token is required'
+
+    def has_permission(self, request, view):
+        return request.auth is not None
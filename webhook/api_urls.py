@@ -1,12 +1,20 @@
 """
-API URL routes for WhatsApp message sending
+API URL routes for WhatsApp message sending, history, search and media
 """
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'api'
 
 urlpatterns = [
-    path('send-message/', views.send_message, name='send_message'),
+    path(
+        'send-message/',
+        async_views.send_message if settings.WHATSAPP_ASYNC_VIEWS else views.send_message,
+        name='send_message',
+    ),
+    path('send-messages/', views.send_messages, name='send_messages'),
+    path('conversations/<str:wa_id>/messages/', views.conversation_messages, name='conversation_messages'),
+    path('search/', views.search, name='search'),
+    path('messages/<str:message_id>/media/', views.message_media, name='message_media'),
 ]
-
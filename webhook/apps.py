@@ -5,3 +5,6 @@ class WebhookConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'webhook'
 
+    def ready(self):
+        # Registers the app secret system check
+        from . import signature  # noqa: F401
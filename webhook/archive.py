@@ -0,0 +1,146 @@
+"""
+Cold storage for raw payload columns.
+
+The complete webhook payload (and the Graph API response for sends) is
+only read when debugging, yet as an inline JSON column it makes every row
+of the hot tables several times wider than the fields that are queried.
+With WHATSAPP_ARCHIVE_PAYLOADS enabled the payload is compressed into an
+ArchivedPayload row as it is written, the inline column is left empty and
+the ``payload`` / ``api_response_payload`` model properties load it back
+on first access. ``python manage.py archive_payloads`` moves existing
+rows in batches.
+
+Archives whose row was deleted (the foreign keys are SET_NULL) or whose
+send was retried with a new API response are no longer referenced;
+``python manage.py prune_archived_payloads`` deletes them.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import (
+    ArchivedPayload,
+    WhatsAppCall,
+    WhatsAppMessage,
+    WhatsAppMessageStatus,
+    WhatsAppOutgoingMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Archives younger than this are never pruned: they may belong to a row
+# that is about to be saved
+PRUNE_GRACE = timedelta(hours=1)
+
+
+# Inline column, archive foreign key and the value an archived inline column is reset to
+ARCHIVED_COLUMNS = {
+    'messages': (WhatsAppMessage, 'raw_payload', 'raw_payload_archive', dict),
+    'calls': (WhatsAppCall, 'raw_payload', 'raw_payload_archive', dict),
+    'statuses': (WhatsAppMessageStatus, 'raw_payload', 'raw_payload_archive', dict),
+    'outgoing': (WhatsAppOutgoingMessage, 'api_response', 'api_response_archive', lambda: None),
+}
+
+
+def archive_objects(objs, inline_field, archive_field, empty=dict):
+    """
+    Move the inline payload of each object into a new ArchivedPayload row.
+
+    The archives are written with one bulk insert and attached to the
+    objects, which are left unsaved; the caller saves them with the archive
+    foreign key among the written fields. Objects with an empty payload are
+    left alone.
+
+    Args:
+        objs: Model instances
+        inline_field: Name of the JSON column holding the payload
+        archive_field: Name of the ArchivedPayload foreign key
+        empty: Callable returning the value the inline column is reset to
+
+    Returns:
+        list: The objects that were archived
+    """
+    archived = [obj for obj in objs if getattr(obj, inline_field)]
+    if not archived:
+        return []
+    archives = ArchivedPayload.objects.bulk_create(
+        [ArchivedPayload.pack(getattr(obj, inline_field)) for obj in archived]
+    )
+    for obj, archive in zip(archived, archives):
+        setattr(obj, archive_field, archive)
+        setattr(obj, inline_field, empty())
+    return archived
+
+
+def archive_on_write(objs, kind):
+    """
+    Archive payloads of objects about to be saved, if WHATSAPP_ARCHIVE_PAYLOADS is on.
+
+    Args:
+        objs: Model instances of the ARCHIVED_COLUMNS kind
+        kind: Key of ARCHIVED_COLUMNS ('messages', 'calls', 'statuses' or 'outgoing')
+    """
+    if settings.WHATSAPP_ARCHIVE_PAYLOADS:
+        _, inline_field, archive_field, empty = ARCHIVED_COLUMNS[kind]
+        archive_objects(objs, inline_field, archive_field, empty)
+
+
+def archive_existing(kind, batch_size=1000):
+    """
+    Move stored payloads of one table into cold storage, a batch per transaction.
+
+    Rows are walked in primary key order, so an interrupted run can simply
+    be started again.
+
+    Args:
+        kind: Key of ARCHIVED_COLUMNS
+        batch_size: Rows per batch
+
+    Returns:
+        int: Number of rows archived
+    """
+    model, inline_field, archive_field, empty = ARCHIVED_COLUMNS[kind]
+    queryset = model.objects.filter(**{f'{archive_field}__isnull': True}).only('id', inline_field)
+
+    total = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.select_for_update().filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1].id
+            archived = archive_objects(rows, inline_field, archive_field, empty)
+            if archived:
+                model.objects.bulk_update(archived, [inline_field, archive_field])
+        total += len(archived)
+        logger.info(f"Archived {total} {kind} payloads (up to id {last_id})")
+    return total
+
+
+def prune_orphaned_archives(batch_size=1000):
+    """
+    Delete ArchivedPayload rows no longer referenced by any archived column.
+
+    Args:
+        batch_size: Rows deleted per statement
+
+    Returns:
+        int: Number of archives deleted
+    """
+    orphans = ArchivedPayload.objects.filter(created_at__lt=timezone.now() - PRUNE_GRACE)
+    for model, _, archive_field, _ in ARCHIVED_COLUMNS.values():
+        orphans = orphans.filter(~Exists(model.objects.filter(**{archive_field: OuterRef('pk')})))
+
+    total = 0
+    while True:
+        ids = list(orphans.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        ArchivedPayload.objects.filter(id__in=ids).delete()
+        total += len(ids)
+    logger.info(f"Pruned {total} orphaned archived payloads")
+    return total
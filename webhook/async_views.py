@@ -0,0 +1,176 @@
+"""
+Async versions of the webhook and send endpoints for ASGI deployments.
+
+Enabled with WHATSAPP_ASYNC_VIEWS=True. Under uvicorn/daphne these views run
+on the event loop, so slow Graph API calls and queued webhook deliveries no
+longer each hold a worker thread.
+
+Blocking ORM work runs through in_thread, on asgiref's thread pool rather
+than the single thread sync_to_async uses by default, so the ingests of
+concurrent deliveries run side by side, each on its own connection and
+transaction.
+"""
+import json
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from .admission import admission, shed_webhook_request
+from .archive import archive_on_write
+from .conversations import record_outbound
+from .ingest import ingest_payload
+from .metrics import record_request, stage
+from .models import WebhookInboxEntry, WhatsAppOutgoingMessage
+from .profiling import profile_request
+from .services import asend_whatsapp_message
+from .signature import reject_webhook_request
+from .views import apply_send_result, build_ingest_response, validate_send_request, verify_webhook_subscription
+
+logger = logging.getLogger(__name__)
+
+
+def in_thread(func):
+    """
+    Wrap a blocking function to be awaited on a pool thread.
+
+    The connection the thread opened is released afterwards the way Django
+    does at the end of a request, so it honours CONN_MAX_AGE.
+    """
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class WhatsAppWebhookView(View):
+    """
+    Async WhatsApp webhook endpoint.
+
+    GET: Webhook verification (required by Meta)
+    POST: Receive incoming messages
+    """
+    http_method_names = ['get', 'post']
+
+    async def get(self, request):
+        return verify_webhook_subscription(request)
+
+    async def post(self, request):
+        start = time.perf_counter()
+        response, outcome = await self.receive(request)
+        record_request(outcome, time.perf_counter() - start)
+        return response
+
+    async def receive(self, request):
+        """Handle a webhook POST; returns (response, outcome label for the request metrics)"""
+        # Oversized and unsigned bodies are refused before they are parsed, logged or stored
+        with stage('verify'):
+            rejection = reject_webhook_request(request)
+        if rejection is not None:
+            return rejection, 'rejected'
+
+        # Under load, refuse at once and let Meta redeliver rather than queue on the write lock
+        with stage('admission'):
+            shed = shed_webhook_request(request)
+        if shed is not None:
+            return shed, 'shed'
+        try:
+            return await self.store(request)
+        finally:
+            admission.release()
+
+    async def store(self, request):
+        """Queue or ingest an admitted webhook POST; returns (response, outcome label)"""
+        # Inbox mode: persist the raw body and ack without parsing
+        if settings.WHATSAPP_WEBHOOK_INBOX_MODE:
+            with stage('inbox_append'), admission.timed_write():
+                entry = await WebhookInboxEntry.objects.acreate(body=request.body)
+            logger.debug(f"Webhook body queued in inbox: {entry.id}")
+            return JsonResponse({'status': 'queued', 'inbox_id': entry.id}, status=200), 'queued'
+
+        try:
+            with stage('parse'):
+                data = json.loads(request.body)
+            with stage('log_payload'):
+                logger.info(f"Received webhook payload: {json.dumps(data, indent=2)}")
+
+            # Verify it's a WhatsApp Business Account webhook
+            if data.get('object') != 'whatsapp_business_account':
+                logger.warning(f"Invalid webhook object type: {data.get('object')}")
+                return (JsonResponse({'status': 'error', 'message': 'Invalid webhook object'}, status=400),
+                        'invalid_object')
+
+            # The batch write needs a transaction, which Django only offers to sync code;
+            # it runs on a pool thread so concurrent deliveries are not serialized
+            with stage('ingest'), admission.timed_write():
+                batch = await in_thread(ingest_payload)(data)
+
+            return JsonResponse(build_ingest_response(batch), status=200), 'ok'
+
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error: {str(e)}")
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400), 'invalid_json'
+        except Exception as e:
+            logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=500), 'error'
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SendMessageView(View):
+    """
+    Async API endpoint to send WhatsApp messages.
+
+    Accepts the same request and returns the same response as views.send_message.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+
+        to_number = data.get('to')
+        message_text = data.get('message')
+
+        error = validate_send_request(to_number, message_text)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+
+        # Create pending message record
+        outgoing_msg = await WhatsAppOutgoingMessage.objects.acreate(
+            to_number=to_number,
+            message_type='text',
+            message_text=message_text,
+            status='pending'
+        )
+        await in_thread(record_outbound)([outgoing_msg])
+
+        # Send message via WhatsApp API without blocking the event loop
+        result = await asend_whatsapp_message(to_number, message_text)
+
+        response_data, status_code = apply_send_result(outgoing_msg, result)
+        await in_thread(archive_on_write)([outgoing_msg], 'outgoing')
+        await outgoing_msg.asave()
+
+        if result['success']:
+            logger.info(f"Outgoing message saved: ID {outgoing_msg.id}, WhatsApp ID {result['message_id']}")
+        elif outgoing_msg.status == 'pending':
+            logger.warning(f"Send failed, retry scheduled for {outgoing_msg.next_attempt_at}: {result.get('error')}")
+        else:
+            logger.error(f"Failed to send message: {result.get('error')}")
+
+        return JsonResponse(response_data, status=status_code)
+
+
+whatsapp_webhook = profile_request(WhatsAppWebhookView.as_view())
+send_message = profile_request(SendMessageView.as_view())
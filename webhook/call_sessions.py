@@ -0,0 +1,118 @@
+"""
+Per-call session summaries.
+
+Meta sends a connect and a terminate event for each call, stored as
+separate WhatsAppCall rows. Each event is also folded into the call's
+WhatsAppCallSession row as it is ingested, so the duration, outcome and SDP
+of a call are read from one row instead of gathering events by call_id.
+``python manage.py rebuild_call_sessions`` regenerates every row from the
+stored events.
+"""
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .models import WhatsAppCall, WhatsAppCallSession
+
+logger = logging.getLogger(__name__)
+
+
+CALL_SESSION_UPDATE_FIELDS = [
+    'from_number', 'to_number', 'wa_id', 'contact_name', 'direction', 'status',
+    'first_event_at', 'connected_at', 'terminated_at', 'started_at', 'ended_at', 'duration',
+    'session_sdp', 'session_sdp_type', 'phone_number_id', 'updated_at',
+]
+
+
+def _fold(session, call):
+    """
+    Fold one call event into a session (unsaved).
+
+    Events may arrive out of order or more than once, so each field is only
+    filled or moved to an earlier/later time, never blindly overwritten.
+    """
+    at = call.event_at or call.created_at or timezone.now()
+    if session.first_event_at is None or at < session.first_event_at:
+        session.first_event_at = at
+
+    for name in ('from_number', 'to_number', 'wa_id', 'contact_name', 'direction', 'phone_number_id'):
+        value = getattr(call, name)
+        if value and not getattr(session, name):
+            setattr(session, name, value)
+
+    if call.event == 'connect':
+        if session.connected_at is None or at < session.connected_at:
+            session.connected_at = at
+        if call.session_sdp:
+            session.session_sdp = call.session_sdp
+            session.session_sdp_type = call.session_sdp_type
+    elif call.event == 'terminate':
+        if session.terminated_at is None or at >= session.terminated_at:
+            session.terminated_at = at
+            session.status = call.status or session.status
+
+    # Timing details are only reported on terminate/completed events
+    session.started_at = call.started_at or session.started_at
+    session.ended_at = call.ended_at or session.ended_at
+    if call.duration is not None:
+        session.duration = call.duration
+
+
+def record_call_events(calls):
+    """
+    Fold newly stored call events into their sessions: one query to load
+    the existing sessions, one bulk_create for new ones and one bulk_update
+    for the rest. Call inside the ingest transaction.
+
+    Args:
+        calls: WhatsAppCall instances
+    """
+    calls = [call for call in calls if call.call_id]
+    if not calls:
+        return
+
+    existing = {
+        session.call_id: session
+        for session in WhatsAppCallSession.objects.select_for_update()
+        .filter(call_id__in={call.call_id for call in calls})
+    }
+    created = {}
+    now = timezone.now()
+    for call in sorted(calls, key=lambda call: call.event_at or now):
+        session = existing.get(call.call_id) or created.get(call.call_id)
+        if session is None:
+            session = created[call.call_id] = WhatsAppCallSession(call_id=call.call_id)
+        _fold(session, call)
+        session.updated_at = now
+
+    if created:
+        WhatsAppCallSession.objects.bulk_create(created.values())
+    if existing:
+        WhatsAppCallSession.objects.bulk_update(existing.values(), CALL_SESSION_UPDATE_FIELDS)
+
+
+def rebuild_call_sessions(batch_size=2000):
+    """
+    Regenerate every call session from the stored call events.
+
+    Streams WhatsAppCall once in event order and replaces the session table
+    in a single transaction.
+
+    Returns:
+        int: Number of sessions written
+    """
+    sessions = {}
+    events = WhatsAppCall.objects.order_by('event_at', 'id').defer('raw_payload')
+    for call in events.iterator(chunk_size=batch_size):
+        if not call.call_id:
+            continue
+        session = sessions.get(call.call_id)
+        if session is None:
+            session = sessions[call.call_id] = WhatsAppCallSession(call_id=call.call_id)
+        _fold(session, call)
+
+    with transaction.atomic():
+        WhatsAppCallSession.objects.all().delete()
+        WhatsAppCallSession.objects.bulk_create(sessions.values(), batch_size=batch_size)
+
+    logger.info(f"Rebuilt {len(sessions)} call sessions")
+    return len(sessions)
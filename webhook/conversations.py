@@ -0,0 +1,194 @@
+"""
+Incrementally maintained conversation summaries.
+
+Each (phone_number_id, wa_id) pair has one Conversation row with the
+latest activity and counters. The ingest path folds in newly stored
+incoming messages and the send endpoints fold in outgoing ones, so an
+inbox view reads one row per contact instead of grouping the message
+tables. ``python manage.py rebuild_conversations`` regenerates every row
+from history.
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Conversation, WhatsAppMessage, WhatsAppOutgoingMessage
+
+logger = logging.getLogger(__name__)
+
+
+CONVERSATION_UPDATE_FIELDS = [
+    'contact_name', 'last_message_at', 'last_direction', 'last_message_type',
+    'last_message_preview', 'last_inbound_at', 'message_count', 'unprocessed_count',
+    'updated_at',
+]
+
+
+def message_preview(message):
+    """Short text shown for an incoming message in an inbox listing"""
+    text = message.message_text
+    if not text:
+        attachment = message.get_attachment()
+        if attachment is not None:
+            text = attachment.caption or attachment.filename
+    return (text or f"[{message.message_type}]")[:255]
+
+
+def _fold(conversation, at, direction, message_type, preview, contact_name=None, unprocessed=0):
+    """Fold one message into a conversation summary (unsaved)"""
+    conversation.message_count += 1
+    conversation.unprocessed_count += unprocessed
+    if contact_name:
+        conversation.contact_name = contact_name
+    if direction == 'inbound' and (conversation.last_inbound_at is None or at > conversation.last_inbound_at):
+        conversation.last_inbound_at = at
+    if conversation.last_message_at is None or at >= conversation.last_message_at:
+        conversation.last_message_at = at
+        conversation.last_direction = direction
+        conversation.last_message_type = message_type
+        conversation.last_message_preview = preview
+
+
+def _inbound_event(message):
+    return (
+        (message.phone_number_id, message.wa_id),
+        dict(
+            at=message.event_at or message.created_at or timezone.now(),
+            direction='inbound',
+            message_type=message.message_type,
+            preview=message_preview(message),
+            contact_name=message.contact_name,
+            unprocessed=0 if message.processed else 1,
+        ),
+    )
+
+
+def _outbound_event(outgoing_msg, phone_number_id):
+    return (
+        (phone_number_id, outgoing_msg.to_number),
+        dict(
+            at=outgoing_msg.created_at or timezone.now(),
+            direction='outbound',
+            message_type=outgoing_msg.message_type,
+            preview=(outgoing_msg.message_text or '')[:255],
+        ),
+    )
+
+
+def _apply_events(events):
+    """
+    Fold (key, event) pairs into their conversations: one query to load
+    the existing rows, one bulk_create for new ones and one bulk_update
+    for the rest. Must run inside a transaction.
+    """
+    if not events:
+        return
+    keys = {key for key, _ in events}
+    wa_ids = {wa_id for _, wa_id in keys}
+
+    existing = {
+        (conv.phone_number_id, conv.wa_id): conv
+        for conv in Conversation.objects.select_for_update().filter(wa_id__in=wa_ids)
+        if (conv.phone_number_id, conv.wa_id) in keys
+    }
+    created = {}
+    now = timezone.now()
+    for key, event in events:
+        conversation = existing.get(key) or created.get(key)
+        if conversation is None:
+            conversation = created[key] = Conversation(phone_number_id=key[0], wa_id=key[1])
+        _fold(conversation, **event)
+        conversation.updated_at = now
+
+    if created:
+        Conversation.objects.bulk_create(created.values())
+    if existing:
+        Conversation.objects.bulk_update(existing.values(), CONVERSATION_UPDATE_FIELDS)
+
+
+def record_inbound(messages):
+    """
+    Fold newly stored incoming messages into their conversations.
+    Call inside the ingest transaction, with messages that were not stored before.
+    """
+    _apply_events([_inbound_event(message) for message in messages])
+
+
+def record_outbound(outgoing_msgs):
+    """Fold newly created outgoing messages into their conversations"""
+    phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
+    with transaction.atomic():
+        _apply_events([_outbound_event(msg, phone_number_id) for msg in outgoing_msgs])
+
+
+def mark_processed(messages):
+    """
+    Mark incoming messages as processed by the chatbot and keep the
+    conversations' unprocessed counts in step.
+
+    Args:
+        messages: WhatsAppMessage queryset
+
+    Returns:
+        int: Number of messages newly marked processed
+    """
+    with transaction.atomic():
+        rows = list(
+            messages.filter(processed=False).select_for_update()
+            .values_list('id', 'phone_number_id', 'wa_id')
+        )
+        if not rows:
+            return 0
+        WhatsAppMessage.objects.filter(id__in=[row[0] for row in rows]).update(processed=True)
+
+        per_conversation = {}
+        for _, phone_number_id, wa_id in rows:
+            key = (phone_number_id, wa_id)
+            per_conversation[key] = per_conversation.get(key, 0) + 1
+        for (phone_number_id, wa_id), count in per_conversation.items():
+            Conversation.objects.filter(phone_number_id=phone_number_id, wa_id=wa_id).update(
+                unprocessed_count=Greatest(F('unprocessed_count') - count, Value(0)),
+            )
+    return len(rows)
+
+
+def rebuild_conversations(batch_size=2000):
+    """
+    Regenerate every conversation from the message tables.
+
+    Streams both message tables once and replaces the Conversation table
+    in a single transaction.
+
+    Returns:
+        int: Number of conversations written
+    """
+    conversations = {}
+
+    def fold(key, event):
+        conversation = conversations.get(key)
+        if conversation is None:
+            conversation = conversations[key] = Conversation(phone_number_id=key[0], wa_id=key[1])
+        _fold(conversation, **event)
+
+    incoming = WhatsAppMessage.objects.order_by().select_related('attachment').only(
+        'phone_number_id', 'wa_id', 'contact_name', 'message_type', 'message_text',
+        'processed', 'event_at', 'created_at', 'attachment__caption', 'attachment__filename',
+    )
+    for message in incoming.iterator(chunk_size=batch_size):
+        fold(*_inbound_event(message))
+
+    phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
+    outgoing = WhatsAppOutgoingMessage.objects.order_by().only(
+        'to_number', 'message_type', 'message_text', 'created_at',
+    )
+    for outgoing_msg in outgoing.iterator(chunk_size=batch_size):
+        fold(*_outbound_event(outgoing_msg, phone_number_id))
+
+    with transaction.atomic():
+        Conversation.objects.all().delete()
+        Conversation.objects.bulk_create(conversations.values(), batch_size=batch_size)
+
+    logger.info(f"Rebuilt {len(conversations)} conversations")
+    return len(conversations)
@@ -0,0 +1,141 @@
+"""
+Idempotency filter for Meta redeliveries.
+
+Meta redelivers the same message (wamid) and the same status events until
+it sees a 200, sometimes many times. Every ingested message and
+(message_id, status) pair is recorded as a short digest in a per-process
+LRU cache and in the WebhookSeenKey table. Redelivered items are then
+skipped before any write, usually without touching the database at all.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from .metrics import DUPLICATES
+from .models import WebhookSeenKey
+
+logger = logging.getLogger(__name__)
+
+
+class SeenKeyCache:
+    """Thread-safe bounded LRU set of key digests"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide seen-key cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SeenKeyCache(settings.WHATSAPP_DEDUP_CACHE_SIZE)
+    return _cache
+
+
+def _digest(raw):
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def message_key(message_id):
+    """Seen-key digest for an incoming message"""
+    return _digest(f"m:{message_id}")
+
+
+def status_key(message_id, status):
+    """Seen-key digest for a status event of a message"""
+    return _digest(f"s:{message_id}:{status}")
+
+
+def filter_duplicates(messages, statuses):
+    """
+    Drop messages and status events that were already ingested.
+
+    Keys are checked against the in-process cache first; only cache misses
+    are looked up in WebhookSeenKey, with one query for the whole batch.
+    Must be called inside the ingest transaction: the keys of surviving
+    items are stored there too and reach the cache only after commit.
+
+    Args:
+        messages: WhatsAppMessage instances, unique by message_id
+        statuses: WhatsAppMessageStatus instances
+
+    Returns:
+        tuple: (new messages, new statuses, duplicate message count, duplicate status count)
+    """
+    cache = get_cache()
+
+    keyed_messages = [(message_key(msg.message_id), msg) for msg in messages]
+    keyed_statuses = []
+    batch_keys = set()
+    duplicate_statuses = 0
+    for status_obj in statuses:
+        key = status_key(status_obj.message_id, status_obj.status)
+        # The same status can also be repeated inside a single delivery
+        if key in batch_keys:
+            duplicate_statuses += 1
+            continue
+        batch_keys.add(key)
+        keyed_statuses.append((key, status_obj))
+
+    candidates = [(key, obj) for key, obj in keyed_messages + keyed_statuses if key not in cache]
+    seen = set()
+    if candidates:
+        seen = set(
+            WebhookSeenKey.objects.filter(key__in=[key for key, _ in candidates])
+            .values_list('key', flat=True)
+        )
+        if seen:
+            cache.add_many(seen)
+    fresh = {key for key, _ in candidates if key not in seen}
+
+    new_messages = [msg for key, msg in keyed_messages if key in fresh]
+    new_statuses = [status_obj for key, status_obj in keyed_statuses if key in fresh]
+    duplicate_messages = len(messages) - len(new_messages)
+    duplicate_statuses += len(keyed_statuses) - len(new_statuses)
+
+    if fresh:
+        WebhookSeenKey.objects.bulk_create(
+            [WebhookSeenKey(key=key) for key in fresh], ignore_conflicts=True
+        )
+        transaction.on_commit(lambda: cache.add_many(fresh))
+
+    if duplicate_messages:
+        DUPLICATES.inc(duplicate_messages, kind='message')
+    if duplicate_statuses:
+        DUPLICATES.inc(duplicate_statuses, kind='status')
+    if duplicate_messages or duplicate_statuses:
+        logger.info(f"Skipped redelivered items: {duplicate_messages} messages, {duplicate_statuses} statuses")
+
+    return new_messages, new_statuses, duplicate_messages, duplicate_statuses
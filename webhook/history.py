@@ -0,0 +1,161 @@
+"""
+Conversation history reads with keyset (cursor) pagination.
+
+Incoming and outgoing messages of one contact are read as a single
+timeline, newest first, ordered by (created_at, direction, id). A page is
+fetched with at most one indexed range query per table (on
+(wa_id, -created_at) and (to_number, -created_at)) that starts where the
+cursor left off, so a page deep in the history costs the same as the
+first one. Only the requested columns are selected, never raw_payload.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from .models import WhatsAppMessage, WhatsAppOutgoingMessage
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Output field -> model column, per direction. Fields missing for a
+# direction are returned as None.
+INBOUND_FIELDS = {
+    'id': 'id',
+    'message_id': 'message_id',
+    'message_type': 'message_type',
+    'text': 'message_text',
+    'caption': 'attachment__caption',
+    'contact_name': 'contact_name',
+    'event_at': 'event_at',
+    'processed': 'processed',
+    'created_at': 'created_at',
+}
+
+OUTBOUND_FIELDS = {
+    'id': 'id',
+    'message_id': 'message_id',
+    'message_type': 'message_type',
+    'text': 'message_text',
+    'status': 'status',
+    'error_message': 'error_message',
+    'sent_at': 'sent_at',
+    'delivered_at': 'delivered_at',
+    'read_at': 'read_at',
+    'created_at': 'created_at',
+}
+
+HISTORY_FIELDS = ['direction'] + list(dict.fromkeys([*INBOUND_FIELDS, *OUTBOUND_FIELDS]))
+
+# Tie-break between rows stored in the same instant: inbound sorts after outbound
+DIRECTION_RANK = {'outbound': 0, 'inbound': 1}
+
+
+class InvalidHistoryRequest(ValueError):
+    """Raised for a malformed cursor, page size or field list"""
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just past a history row"""
+    key = [row['created_at'].isoformat(), row['direction'], row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    Returns:
+        tuple: (created_at, direction rank, id)
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, direction, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), DIRECTION_RANK[direction], int(row_id)
+    except (binascii.Error, KeyError, TypeError, ValueError) as e:
+        raise InvalidHistoryRequest('Invalid cursor') from e
+
+
+def parse_fields(fields):
+    """
+    Validate a comma-separated fields= projection.
+
+    Returns:
+        list: Requested field names (all fields if fields is empty)
+    """
+    if not fields:
+        return HISTORY_FIELDS
+    requested = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in HISTORY_FIELDS]
+    if unknown:
+        raise InvalidHistoryRequest(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def _after_cursor(queryset, rank, cursor):
+    """
+    Restrict one direction's rows to those that sort after the cursor (descending).
+
+    Written as a created_at range plus an exclusion of the cursor's own
+    instant, rather than an OR, so the database can seek the index.
+    """
+    created_at, cursor_rank, row_id = cursor
+    if rank < cursor_rank:
+        return queryset.filter(created_at__lte=created_at)
+    if rank > cursor_rank:
+        return queryset.filter(created_at__lt=created_at)
+    return queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=row_id)
+
+
+def _page(queryset, direction, columns, fields, cursor, limit):
+    """Fetch up to limit rows of one direction as output dicts"""
+    if cursor is not None:
+        queryset = _after_cursor(queryset, DIRECTION_RANK[direction], cursor)
+    # id and created_at are always read: they make up the cursor
+    selected = {'id', 'created_at'} | {columns[name] for name in fields if name in columns}
+    rows = queryset.order_by('-created_at', '-id').values(*selected)[:limit]
+    output = {name: columns.get(name) for name in fields if name != 'direction'}
+    return [
+        {
+            'direction': direction,
+            'id': row['id'],
+            'created_at': row['created_at'],
+            **{name: row[column] if column else None for name, column in output.items()},
+        }
+        for row in rows
+    ]
+
+
+def fetch_history(wa_id, cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None):
+    """
+    Read one page of a contact's conversation, newest first.
+
+    Args:
+        wa_id: WhatsApp ID of the contact
+        cursor: next_cursor from the previous page, or None for the first page
+        limit: Page size (1 to MAX_PAGE_SIZE)
+        fields: Comma-separated output fields, or None for all
+
+    Returns:
+        dict: {'results': [...], 'next_cursor': str or None}
+
+    Raises:
+        InvalidHistoryRequest: For a malformed cursor, limit or field list
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidHistoryRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    fields = parse_fields(fields)
+    position = decode_cursor(cursor) if cursor else None
+
+    # Each table contributes at most limit + 1 rows; merge and cut the page
+    rows = _page(WhatsAppMessage.objects.filter(wa_id=wa_id), 'inbound',
+                 INBOUND_FIELDS, fields, position, limit + 1)
+    rows += _page(WhatsAppOutgoingMessage.objects.filter(to_number=wa_id), 'outbound',
+                  OUTBOUND_FIELDS, fields, position, limit + 1)
+    rows.sort(key=lambda row: (row['created_at'], DIRECTION_RANK[row['direction']], row['id']), reverse=True)
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+
+    results = [{name: row[name] for name in fields} for row in page]
+    return {'results': results, 'next_cursor': next_cursor}
@@ -0,0 +1,182 @@
+"""
+Durable webhook inbox.
+
+In inbox mode the webhook only appends the raw request body to
+WebhookInboxEntry and acknowledges Meta immediately. The
+``process_webhook_inbox`` management command drains pending entries in
+batches through the regular ingest path, and ``prune_webhook_inbox``
+deletes processed entries once they are old enough.
+"""
+import json
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .ingest import IngestBatch, collect_payload, run_post_ingest_hook, save_batch
+from .models import WebhookInboxEntry
+
+logger = logging.getLogger(__name__)
+
+
+class InboxClaimConflict(Exception):
+    """Raised when another worker marked part of a batch first"""
+
+
+def append_to_inbox(body):
+    """
+    Store a raw webhook body for later ingest.
+
+    Args:
+        body: Raw request body (bytes)
+
+    Returns:
+        WebhookInboxEntry instance
+    """
+    return WebhookInboxEntry.objects.create(body=body)
+
+
+def decode_entry(entry):
+    """
+    Decode an inbox entry into a webhook payload.
+
+    Raises:
+        ValueError: If the body is not a WhatsApp Business Account payload
+    """
+    data = json.loads(bytes(entry.body))
+    if not isinstance(data, dict) or data.get('object') != 'whatsapp_business_account':
+        raise ValueError(f"Invalid webhook object type: {data.get('object') if isinstance(data, dict) else type(data).__name__}")
+    return data
+
+
+def _mark_processed(entry_ids):
+    """
+    Mark entries processed, but only if they are still pending.
+
+    Runs inside the ingest transaction, so the rows written and the
+    processed mark commit or roll back together. A conflicting worker
+    makes the count come up short, which rolls the whole batch back.
+    """
+    marked = WebhookInboxEntry.objects.filter(id__in=entry_ids, status='pending').update(
+        status='processed', processed_at=timezone.now()
+    )
+    if marked != len(entry_ids):
+        raise InboxClaimConflict(f"Expected to mark {len(entry_ids)} entries, marked {marked}")
+
+
+def _record_failure(entry, error, max_attempts):
+    """Count a failed attempt and give up on the entry after max_attempts"""
+    entry.attempts += 1
+    entry.last_error = str(error)
+    fields = ['attempts', 'last_error']
+    if entry.attempts >= max_attempts:
+        entry.status = 'failed'
+        fields.append('status')
+    WebhookInboxEntry.objects.filter(id=entry.id, status='pending').update(
+        **{name: getattr(entry, name) for name in fields}
+    )
+
+
+def _process_entry(entry, data, max_attempts):
+    """Ingest a single entry in its own transaction"""
+    try:
+        with transaction.atomic():
+            batch = collect_payload(data)
+            save_batch(batch)
+            _mark_processed([entry.id])
+        run_post_ingest_hook(batch)
+        return True
+    except InboxClaimConflict:
+        return False
+    except Exception as e:
+        logger.error(f"Error ingesting inbox entry {entry.id}: {str(e)}", exc_info=True)
+        _record_failure(entry, e, max_attempts)
+        return False
+
+
+def drain_inbox(batch_size=100, max_attempts=5):
+    """
+    Ingest one batch of pending inbox entries.
+
+    All decodable entries in the batch are written with a single
+    save_batch call and marked processed in the same transaction, so an
+    entry is applied exactly once even with several workers running. If
+    the combined write fails, entries are retried one by one so a single
+    bad payload cannot block the rest of the batch.
+
+    Args:
+        batch_size: Maximum number of entries to claim
+        max_attempts: Attempts before an entry is marked failed
+
+    Returns:
+        tuple: (entries ingested, entries attempted); attempted is 0 once
+        the inbox is empty
+    """
+    entries = list(
+        WebhookInboxEntry.objects.filter(status='pending').order_by('id')[:batch_size]
+    )
+    if not entries:
+        return 0, 0
+
+    decoded = []
+    for entry in entries:
+        try:
+            decoded.append((entry, decode_entry(entry)))
+        except ValueError as e:
+            # Malformed bodies never become valid, so fail them straight away
+            logger.warning(f"Discarding inbox entry {entry.id}: {str(e)}")
+            _record_failure(entry, e, max_attempts=1)
+
+    if not decoded:
+        return 0, len(entries)
+
+    try:
+        with transaction.atomic():
+            # Lock the claimed rows where the database supports it
+            entry_ids = list(
+                WebhookInboxEntry.objects.select_for_update(skip_locked=True)
+                .filter(id__in=[entry.id for entry, _ in decoded], status='pending')
+                .values_list('id', flat=True)
+            )
+            claimed = set(entry_ids)
+            batch = IngestBatch()
+            for entry, data in decoded:
+                if entry.id in claimed:
+                    collect_payload(data, batch)
+            if entry_ids:
+                save_batch(batch)
+                _mark_processed(entry_ids)
+        run_post_ingest_hook(batch)
+        return len(entry_ids), len(entries)
+    except InboxClaimConflict as e:
+        logger.info(f"Inbox batch claimed by another worker, skipping: {str(e)}")
+        return 0, len(entries)
+    except Exception as e:
+        logger.error(f"Batch ingest failed, retrying entries individually: {str(e)}", exc_info=True)
+
+    ingested = sum(1 for entry, data in decoded if _process_entry(entry, data, max_attempts))
+    return ingested, len(entries)
+
+
+def prune_processed_entries(older_than, batch_size=1000):
+    """
+    Delete entries that were ingested before a cutoff.
+
+    Pending and failed entries are kept, so nothing is lost that has not
+    been ingested and failures stay available for inspection.
+
+    Args:
+        older_than: Delete entries processed before this datetime
+        batch_size: Maximum number of entries deleted per statement
+
+    Returns:
+        int: Number of entries deleted
+    """
+    total = 0
+    while True:
+        entry_ids = list(
+            WebhookInboxEntry.objects.filter(status='processed', processed_at__lt=older_than)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not entry_ids:
+            return total
+        deleted, _ = WebhookInboxEntry.objects.filter(id__in=entry_ids).delete()
+        total += deleted
@@ -0,0 +1,479 @@
+"""
+Batched ingest of WhatsApp webhook payloads.
+
+A payload is walked once to build unsaved model instances, then every model
+is written with a single bulk statement inside one transaction.
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from .archive import archive_on_write
+from .call_sessions import record_call_events
+from .conversations import record_inbound
+from .dedup import filter_duplicates
+from .metrics import ITEMS, stage
+from .models import WhatsAppMessage, WhatsAppMessageAttachment, WhatsAppCall, WhatsAppMessageStatus
+from .outgoing import roll_up_statuses
+from .search import index_messages
+from .utils import extract_attachment_fields, extract_message_text, parse_epoch
+
+logger = logging.getLogger(__name__)
+
+
+# Columns refreshed when Meta redelivers a message we already stored. The raw
+# payload is kept as first stored, so a redelivery never replaces (and orphans)
+# the row's ArchivedPayload.
+MESSAGE_UPDATE_FIELDS = [
+    'wa_id', 'from_number', 'contact_name', 'message_type', 'message_text',
+    'timestamp', 'event_at', 'phone_number_id', 'display_phone_number',
+]
+
+ATTACHMENT_UPDATE_FIELDS = [
+    'media_id', 'url', 'mime_type', 'sha256', 'caption', 'filename', 'is_voice', 'is_animated',
+    'latitude', 'longitude', 'contacts_data',
+]
+
+
+# Epoch string columns and the DateTime columns parsed from them at ingest
+EVENT_TIME_COLUMNS = {
+    WhatsAppMessage: {'timestamp': 'event_at'},
+    WhatsAppCall: {'timestamp': 'event_at', 'start_time': 'started_at', 'end_time': 'ended_at'},
+    WhatsAppMessageStatus: {
+        'timestamp': 'event_at',
+        'conversation_expiration_timestamp': 'conversation_expires_at',
+    },
+}
+
+
+class IngestBatch:
+    """Unsaved rows collected from one or more webhook payloads"""
+
+    def __init__(self):
+        self.messages = []
+        self.statuses = []
+        self.calls = []
+        # Redelivered items skipped by the idempotency filter
+        self.duplicate_messages = 0
+        self.duplicate_statuses = 0
+        # Items stored for the first time, filled in by save_batch
+        self.new_messages = []
+        self.new_statuses = []
+
+    def __len__(self):
+        return len(self.messages) + len(self.statuses) + len(self.calls)
+
+
+def require_fields(instance):
+    """
+    Check that every NOT NULL column without a default has a value.
+
+    A row missing one would fail the whole bulk write, and with it every
+    valid item of the delivery, on each redelivery of the same body.
+
+    Args:
+        instance: Unsaved model instance from one of the build_* helpers
+
+    Returns:
+        The instance
+
+    Raises:
+        ValueError: naming the missing fields
+    """
+    missing = [
+        field.name for field in instance._meta.concrete_fields
+        if not (field.null or field.primary_key or field.has_default() or getattr(field, 'auto_now_add', False))
+        and getattr(instance, field.attname) is None
+    ]
+    if missing:
+        raise ValueError(f"{type(instance).__name__} is missing {', '.join(missing)}")
+    return instance
+
+
+def build_message(message, contact_map, metadata):
+    """
+    Build an unsaved WhatsAppMessage from a single webhook message object.
+
+    Args:
+        message: The message object from the webhook
+        contact_map: Dictionary mapping wa_id to contact information
+        metadata: Metadata containing phone_number_id and display_phone_number
+
+    Returns:
+        Unsaved WhatsAppMessage instance; non-text content is attached as an
+        unsaved WhatsAppMessageAttachment (message_obj.attachment)
+
+    Raises:
+        ValueError: if the message lacks a required field
+    """
+    from_number = message.get('from')
+    message_type = message.get('type')
+
+    # Get contact information
+    contact = contact_map.get(from_number, {})
+    contact_name = contact.get('profile', {}).get('name', '')
+    wa_id = contact.get('wa_id', from_number)
+
+    message_obj = WhatsAppMessage(
+        message_id=message.get('id'),
+        wa_id=wa_id,
+        from_number=from_number,
+        contact_name=contact_name,
+        message_type=message_type,
+        message_text=extract_message_text(message),
+        timestamp=message.get('timestamp'),
+        event_at=parse_epoch(message.get('timestamp')),
+        phone_number_id=metadata.get('phone_number_id', ''),
+        display_phone_number=metadata.get('display_phone_number', ''),
+        raw_payload=message,  # Store the complete message payload
+    )
+    require_fields(message_obj)
+
+    # Type-specific content goes in a side row; text messages have none
+    attachment_fields = extract_attachment_fields(message)
+    if attachment_fields is not None:
+        if attachment_fields.get('media_id'):
+            # Queued for the fetch_media worker
+            attachment_fields['fetch_status'] = 'pending'
+        message_obj.attachment = WhatsAppMessageAttachment(message=message_obj, **attachment_fields)
+
+    return message_obj
+
+
+def build_call(call, contact_map, metadata):
+    """
+    Build an unsaved WhatsAppCall from a single call event.
+    Each event (connect, terminate) becomes a separate record.
+
+    Args:
+        call: The call object from the webhook
+        contact_map: Dictionary mapping wa_id to contact information
+        metadata: Metadata containing phone_number_id and display_phone_number
+
+    Returns:
+        Unsaved WhatsAppCall instance
+
+    Raises:
+        ValueError: if the event lacks a required field
+    """
+    from_number = call.get('from')
+
+    # Get contact information
+    contact = contact_map.get(from_number, {})
+    contact_name = contact.get('profile', {}).get('name', '')
+    wa_id = contact.get('wa_id', from_number)
+
+    # Session data (available on connect events for WebRTC)
+    session = call.get('session', {})
+
+    return require_fields(WhatsAppCall(
+        call_id=call.get('id'),
+        from_number=from_number,
+        to_number=call.get('to'),
+        wa_id=wa_id,
+        contact_name=contact_name,
+        event=call.get('event'),
+        direction=call.get('direction'),
+        # Call timing (available on terminate/completed events)
+        status=call.get('status'),
+        timestamp=call.get('timestamp'),
+        start_time=call.get('start_time'),
+        end_time=call.get('end_time'),
+        event_at=parse_epoch(call.get('timestamp')),
+        started_at=parse_epoch(call.get('start_time')),
+        ended_at=parse_epoch(call.get('end_time')),
+        duration=call.get('duration'),
+        session_sdp=session.get('sdp'),
+        session_sdp_type=session.get('sdp_type'),
+        phone_number_id=metadata.get('phone_number_id', ''),
+        display_phone_number=metadata.get('display_phone_number', ''),
+        raw_payload=call,
+    ))
+
+
+def build_message_status(status_update, metadata):
+    """
+    Build an unsaved WhatsAppMessageStatus from a status update (sent/delivered/read/failed).
+
+    Args:
+        status_update: The status object from the webhook
+        metadata: Metadata containing phone_number_id and display_phone_number
+
+    Returns:
+        Unsaved WhatsAppMessageStatus instance
+
+    Raises:
+        ValueError: if the status lacks a required field
+    """
+    # Conversation information
+    conversation = status_update.get('conversation', {})
+    conversation_origin = conversation.get('origin', {})
+
+    # Pricing information
+    pricing = status_update.get('pricing', {})
+
+    return require_fields(WhatsAppMessageStatus(
+        message_id=status_update.get('id'),
+        status=status_update.get('status'),
+        recipient_id=status_update.get('recipient_id'),
+        conversation_id=conversation.get('id'),
+        conversation_expiration_timestamp=conversation.get('expiration_timestamp'),
+        conversation_expires_at=parse_epoch(conversation.get('expiration_timestamp')),
+        conversation_origin_type=conversation_origin.get('type'),
+        is_billable=pricing.get('billable', False),
+        pricing_model=pricing.get('pricing_model'),
+        pricing_category=pricing.get('category'),
+        pricing_type=pricing.get('type'),
+        timestamp=status_update.get('timestamp'),
+        event_at=parse_epoch(status_update.get('timestamp')),
+        phone_number_id=metadata.get('phone_number_id', ''),
+        display_phone_number=metadata.get('display_phone_number', ''),
+        raw_payload=status_update,
+    ))
+
+
+def collect_payload(data, batch=None):
+    """
+    Walk a webhook payload and collect unsaved rows for every message,
+    status update and call event it contains.
+
+    Items that fail to build, including items missing a required field,
+    are logged and skipped so the rest of the delivery is still stored.
+
+    Args:
+        data: Decoded webhook payload
+        batch: Optional IngestBatch to append to
+
+    Returns:
+        IngestBatch
+    """
+    if batch is None:
+        batch = IngestBatch()
+
+    for entry in data.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            field = change.get('field')
+            metadata = value.get('metadata', {})
+
+            # Create a mapping of wa_id to contact info
+            contacts = value.get('contacts', [])
+            contact_map = {contact.get('wa_id'): contact for contact in contacts}
+
+            # Handle messages field (can contain messages OR statuses)
+            if field == 'messages':
+                for message in value.get('messages', []):
+                    try:
+                        batch.messages.append(build_message(message, contact_map, metadata))
+                    except ValueError as e:
+                        logger.warning(f"Skipping message {message.get('id')}: {str(e)}")
+                    except Exception as e:
+                        logger.error(f"Error processing individual message: {str(e)}", exc_info=True)
+
+                for status_update in value.get('statuses', []):
+                    try:
+                        batch.statuses.append(build_message_status(status_update, metadata))
+                    except ValueError as e:
+                        logger.warning(f"Skipping status of {status_update.get('id')}: {str(e)}")
+                    except Exception as e:
+                        logger.error(f"Error processing message status: {str(e)}", exc_info=True)
+
+            # Handle calls
+            elif field == 'calls':
+                for call in value.get('calls', []):
+                    try:
+                        batch.calls.append(build_call(call, contact_map, metadata))
+                    except ValueError as e:
+                        logger.warning(f"Skipping call event {call.get('id')}: {str(e)}")
+                    except Exception as e:
+                        logger.error(f"Error processing call event: {str(e)}", exc_info=True)
+
+    return batch
+
+
+def save_attachments(messages):
+    """
+    Upsert the attachment rows of freshly built messages in one statement.
+
+    Args:
+        messages: WhatsAppMessage instances from build_message
+    """
+    # Copied without the in-memory message link: upserted messages get no pk back
+    attachments = [
+        WhatsAppMessageAttachment(
+            message_id=message.message_id,
+            fetch_status=message.attachment.fetch_status,
+            **{name: getattr(message.attachment, name) for name in ATTACHMENT_UPDATE_FIELDS}
+        )
+        for message in messages if message.get_attachment() is not None
+    ]
+    if attachments:
+        WhatsAppMessageAttachment.objects.bulk_create(
+            attachments,
+            update_conflicts=True,
+            unique_fields=['message'],
+            update_fields=ATTACHMENT_UPDATE_FIELDS,
+        )
+
+
+def count_items(batch):
+    """Count the items of a batch by kind and type in the ingest metrics"""
+    for msg in batch.messages:
+        ITEMS.inc(kind='message', type=msg.message_type or 'unknown')
+    for status_obj in batch.statuses:
+        ITEMS.inc(kind='status', type=status_obj.status or 'unknown')
+    for call in batch.calls:
+        ITEMS.inc(kind='call', type=call.event or 'unknown')
+
+
+def batch_type(types):
+    """Type label of a write stage: the type shared by all its items, or 'mixed'"""
+    distinct = set(types)
+    if len(distinct) > 1:
+        return 'mixed'
+    return distinct.pop() or 'unknown'
+
+
+def save_batch(batch):
+    """
+    Write a collected batch with one bulk statement per model in one transaction.
+
+    Messages are upserted on message_id so redeliveries refresh the stored
+    row instead of failing; when the same message appears twice in a batch
+    the last copy wins, as it did with update_or_create. Messages and
+    status events Meta has delivered before are skipped when
+    WHATSAPP_DEDUP_ENABLED is set; the batch lists are left untouched so
+    the webhook response still acknowledges every item. Raw payloads are
+    compressed into cold storage when WHATSAPP_ARCHIVE_PAYLOADS is set.
+
+    Args:
+        batch: IngestBatch to persist
+    """
+    unique_messages = list({msg.message_id: msg for msg in batch.messages}.values())
+    statuses = batch.statuses
+
+    with transaction.atomic():
+        if settings.WHATSAPP_DEDUP_ENABLED:
+            with stage('dedup'):
+                unique_messages, statuses, batch.duplicate_messages, batch.duplicate_statuses = (
+                    filter_duplicates(unique_messages, statuses)
+                )
+        if unique_messages:
+            with stage('write_messages', batch_type(msg.message_type for msg in unique_messages)):
+                # Redeliveries the idempotency filter did not catch (disabled, or keys
+                # pruned) must not be counted, archived or handed to the hook again
+                stored = set(
+                    WhatsAppMessage.objects.filter(message_id__in=[msg.message_id for msg in unique_messages])
+                    .values_list('message_id', flat=True)
+                )
+                new_messages = [msg for msg in unique_messages if msg.message_id not in stored]
+                archive_on_write(new_messages, 'messages')
+                WhatsAppMessage.objects.bulk_create(
+                    unique_messages,
+                    update_conflicts=True,
+                    unique_fields=['message_id'],
+                    update_fields=MESSAGE_UPDATE_FIELDS,
+                )
+                save_attachments(unique_messages)
+            with stage('search_index'):
+                index_messages(unique_messages)
+            with stage('conversations'):
+                record_inbound(new_messages)
+            batch.new_messages = new_messages
+        if statuses:
+            with stage('write_statuses', batch_type(status_obj.status for status_obj in statuses)):
+                archive_on_write(statuses, 'statuses')
+                WhatsAppMessageStatus.objects.bulk_create(statuses)
+                batch.new_statuses = statuses
+                # Keep each outgoing message's current delivery state on its own row
+                roll_up_statuses(statuses)
+        if batch.calls:
+            with stage('write_calls', batch_type(call.event for call in batch.calls)):
+                archive_on_write(batch.calls, 'calls')
+                WhatsAppCall.objects.bulk_create(batch.calls)
+                record_call_events(batch.calls)
+    count_items(batch)
+
+    logger.info(
+        f"Ingested batch: {len(unique_messages)} messages, "
+        f"{len(statuses)} statuses, {len(batch.calls)} calls"
+    )
+
+
+def run_post_ingest_hook(batch):
+    """
+    Hand a stored batch to the WHATSAPP_POST_INGEST_HOOK callable, if one is set.
+
+    Runs after the ingest transaction has committed. The hook receives the
+    IngestBatch; batch.new_messages and batch.new_statuses hold only the
+    items stored for the first time, so redeliveries are not handled twice.
+    Errors are logged and do not fail the delivery, whose items are already
+    stored.
+
+    Args:
+        batch: IngestBatch written by save_batch
+    """
+    path = settings.WHATSAPP_POST_INGEST_HOOK
+    if not path or not (batch.new_messages or batch.new_statuses or batch.calls):
+        return
+    try:
+        with stage('post_ingest_hook'):
+            import_string(path)(batch)
+    except Exception as e:
+        logger.error(f"Post-ingest hook {path} failed: {str(e)}", exc_info=True)
+
+
+def ingest_payload(data):
+    """
+    Collect and persist every item in a webhook payload, then run the post-ingest hook.
+
+    Args:
+        data: Decoded webhook payload
+
+    Returns:
+        IngestBatch with the rows that were written
+    """
+    with stage('collect'):
+        batch = collect_payload(data)
+    if batch:
+        save_batch(batch)
+        run_post_ingest_hook(batch)
+    return batch
+
+
+def backfill_event_times(model, batch_size=1000):
+    """
+    Fill the parsed event-time columns of rows stored before they existed.
+
+    Walks rows without event_at in primary key order and writes each batch
+    with one bulk_update. Rows whose timestamp cannot be parsed are left
+    empty.
+
+    Args:
+        model: A key of EVENT_TIME_COLUMNS
+        batch_size: Rows per batch
+
+    Returns:
+        int: Number of rows updated
+    """
+    columns = EVENT_TIME_COLUMNS[model]
+    queryset = model.objects.filter(event_at__isnull=True).order_by('id').only('id', *columns)
+
+    total = 0
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1].id
+        changed = []
+        for row in rows:
+            for source, target in columns.items():
+                setattr(row, target, parse_epoch(getattr(row, source)))
+            if row.event_at is not None:
+                changed.append(row)
+        if changed:
+            model.objects.bulk_update(changed, list(columns.values()))
+        total += len(changed)
+    logger.info(f"Backfilled event times of {total} {model.__name__} rows")
+    return total
@@ -0,0 +1,32 @@
+"""
+Move raw payloads already stored inline into compressed cold storage.
+
+Usage:
+    python manage.py archive_payloads
+    python manage.py archive_payloads --table messages --batch-size 500 --vacuum
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from webhook.archive import ARCHIVED_COLUMNS, archive_existing
+
+
+class Command(BaseCommand):
+    help = 'Compress inline raw_payload/api_response columns into the ArchivedPayload table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=sorted(ARCHIVED_COLUMNS), action='append',
+                            help='Table to archive (repeatable, default: all)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows archived per transaction')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Reclaim the freed space afterwards (VACUUM on SQLite/PostgreSQL)')
+
+    def handle(self, *args, **options):
+        for kind in options['table'] or list(ARCHIVED_COLUMNS):
+            count = archive_existing(kind, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Archived {count} {kind} payloads"))
+
+        if options['vacuum'] and connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write(self.style.SUCCESS("Vacuumed database"))
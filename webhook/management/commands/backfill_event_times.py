@@ -0,0 +1,23 @@
+"""
+Fill the parsed event-time columns (event_at, started_at, ended_at,
+conversation_expires_at) of rows stored before they were added.
+
+Usage:
+    python manage.py backfill_event_times
+    python manage.py backfill_event_times --batch-size 5000
+"""
+from django.core.management.base import BaseCommand
+from webhook.ingest import EVENT_TIME_COLUMNS, backfill_event_times
+
+
+class Command(BaseCommand):
+    help = 'Parse stored epoch timestamps into the indexed event-time columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        for model in EVENT_TIME_COLUMNS:
+            count = backfill_event_times(model, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Backfilled {count} {model.__name__} rows"))
@@ -0,0 +1,55 @@
+"""
+Download pending message media into the local content-addressed store.
+
+Usage:
+    python manage.py fetch_media                 # one pass over pending media
+    python manage.py fetch_media --loop          # keep running as a worker
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from webhook.media import fetch_pending_media
+
+
+class Command(BaseCommand):
+    help = 'Resolve pending media IDs through the Graph API and store the files locally, deduplicated by SHA-256'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Maximum number of attachments claimed per batch')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Concurrent downloads (default: WHATSAPP_MEDIA_FETCH_CONCURRENCY)')
+        parser.add_argument('--lease', type=int, default=600,
+                            help='Seconds a claimed batch stays reserved for this worker')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for pending media instead of exiting when none is left')
+        parser.add_argument('--idle-sleep', type=float, default=5.0,
+                            help='Seconds to wait between polls when nothing is pending (with --loop)')
+
+    def handle(self, *args, **options):
+        totals = {'claimed': 0, 'linked': 0, 'downloaded': 0, 'pending': 0, 'failed': 0}
+        while True:
+            try:
+                counts = fetch_pending_media(
+                    batch_size=options['batch_size'],
+                    max_workers=options['workers'],
+                    lease_seconds=options['lease'],
+                )
+            except OperationalError as e:
+                # SQLite reports "database is locked" when another worker holds the write lock
+                self.stderr.write(f"Claim failed, retrying: {e}")
+                time.sleep(options['idle_sleep'])
+                continue
+
+            for name, value in counts.items():
+                totals[name] += value
+            if counts['claimed']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['idle_sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {totals['claimed']} attachments: {totals['downloaded']} downloaded, "
+            f"{totals['linked']} already stored, {totals['pending']} rescheduled, {totals['failed']} failed"
+        ))
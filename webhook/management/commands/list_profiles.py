@@ -0,0 +1,114 @@
+"""
+List and summarise request profiles written by webhook.profiling.
+
+Usage:
+    python manage.py list_profiles                      # newest profiles
+    python manage.py list_profiles --summary            # aggregate over all profiles
+    python manage.py list_profiles --show <id>          # one profile: hot functions and SQL
+    python manage.py list_profiles --summary --view whatsapp_webhook --top 30
+"""
+import io
+import pstats
+import re
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from webhook.profiling import get_profile_dir, load_reports
+from webhook.utils import percentile
+
+
+def _normalize_sql(sql):
+    """Collapse literal values and IN lists so repeated statements group together"""
+    sql = re.sub(r"'[^']*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class Command(BaseCommand):
+    help = 'List and summarise sampled request profiles (cProfile and SQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show', metavar='ID', help='Show one profile (an id or a unique prefix)')
+        parser.add_argument('--summary', action='store_true', help='Aggregate all matching profiles')
+        parser.add_argument('--view', help='Only profiles of this view')
+        parser.add_argument('--limit', type=int, default=20, help='Profiles listed (default 20)')
+        parser.add_argument('--top', type=int, default=15, help='Functions and statements shown')
+        parser.add_argument('--sort', choices=['cumulative', 'tottime', 'ncalls'], default='cumulative',
+                            help='Function sort order')
+
+    def handle(self, *args, **options):
+        reports = load_reports()
+        if options['view']:
+            reports = [report for report in reports if report['view'] == options['view']]
+        if not reports:
+            self.stdout.write(f"No profiles in {get_profile_dir()}")
+            return
+
+        if options['show']:
+            matches = [report for report in reports if report['id'].startswith(options['show'])]
+            if len(matches) != 1:
+                raise CommandError(f"{len(matches)} profiles match {options['show']}")
+            self.show(matches[0], options)
+        elif options['summary']:
+            self.summary(reports, options)
+        else:
+            self.list(reports[-options['limit']:])
+
+    def list(self, reports):
+        self.stdout.write(f"{'id':58s} {'status':>6s} {'ms':>8s} {'queries':>7s} {'sql ms':>8s}  trigger")
+        for report in reversed(reports):
+            self.stdout.write(
+                f"{report['id']:58s} {report['status_code']:>6} {report['duration_ms']:8.1f} "
+                f"{report['query_count']:7d} {report['query_ms']:8.1f}  {report['trigger']}"
+            )
+
+    def functions(self, paths, options):
+        stats = pstats.Stats(*[str(path) for path in paths], stream=io.StringIO())
+        stats.stream = output = io.StringIO()
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        # Drop the pstats preamble; keep the table
+        text = output.getvalue()
+        start = text.find('   ncalls')
+        self.stdout.write(text[start:] if start >= 0 else text)
+
+    def statements(self, reports, options):
+        grouped = defaultdict(lambda: [0, 0.0])
+        for report in reports:
+            for query in report['queries']:
+                entry = grouped[_normalize_sql(query['sql'])]
+                entry[0] += 1
+                entry[1] += query['ms']
+        top = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:options['top']]
+        self.stdout.write(f"{'count':>6s} {'total ms':>9s}  statement")
+        for sql, (count, total_ms) in top:
+            self.stdout.write(f"{count:6d} {total_ms:9.2f}  {sql[:160]}")
+
+    def show(self, report, options):
+        for name in ('id', 'created', 'view', 'method', 'path', 'trigger', 'status_code', 'request_bytes'):
+            self.stdout.write(f"{name:14s} {report[name]}")
+        self.stdout.write(f"{'duration':14s} {report['duration_ms']:.1f} ms")
+        self.stdout.write(f"{'queries':14s} {report['query_count']} ({report['query_ms']:.1f} ms)\n")
+        path = get_profile_dir() / f"{report['id']}.prof"
+        if path.exists():
+            self.functions([path], options)
+        self.statements([report], options)
+
+    def summary(self, reports, options):
+        by_view = defaultdict(list)
+        for report in reports:
+            by_view[report['view']].append(report)
+        self.stdout.write(f"{'view':24s} {'count':>6s} {'p50 ms':>8s} {'p99 ms':>8s} {'queries':>8s} {'sql %':>6s}")
+        for view, view_reports in sorted(by_view.items()):
+            durations = [report['duration_ms'] for report in view_reports]
+            queries = sum(report['query_count'] for report in view_reports) / len(view_reports)
+            sql_share = sum(report['query_ms'] for report in view_reports) / max(sum(durations), 1e-9)
+            self.stdout.write(
+                f"{view:24s} {len(view_reports):6d} {percentile(durations, 50):8.1f} "
+                f"{percentile(durations, 99):8.1f} {queries:8.1f} {sql_share:6.0%}"
+            )
+        self.stdout.write('')
+        paths = [get_profile_dir() / f"{report['id']}.prof" for report in reports]
+        paths = [path for path in paths if path.exists()]
+        if paths:
+            self.functions(paths, options)
+        self.statements(reports, options)
@@ -0,0 +1,61 @@
+"""
+Drain the durable webhook inbox.
+
+Usage:
+    python manage.py process_webhook_inbox              # drain once and exit
+    python manage.py process_webhook_inbox --loop       # keep polling for new entries
+"""
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from webhook.inbox import drain_inbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Ingest raw webhook bodies stored by the webhook in inbox mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Maximum number of inbox entries ingested per transaction')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Failed attempts before an entry is marked failed')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new entries instead of exiting when the inbox is empty')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Seconds to wait between polls when the inbox is empty (with --loop)')
+        parser.add_argument('--max-backoff', type=float, default=60.0,
+                            help='Longest wait, in seconds, after passes that ingested nothing')
+
+    def handle(self, *args, **options):
+        total = 0
+        # Consecutive passes that attempted entries without ingesting any
+        stalled = 0
+        while True:
+            try:
+                ingested, attempted = drain_inbox(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                )
+            except OperationalError as e:
+                # SQLite reports "database is locked" when another writer holds the lock
+                logger.warning(f"Inbox drain failed, retrying: {str(e)}")
+                ingested, attempted = 0, 1
+            total += ingested
+
+            if ingested:
+                stalled = 0
+                continue
+            if attempted:
+                # Back off so a transient failure does not use up every entry's attempts at once
+                stalled += 1
+                time.sleep(min(options['idle_sleep'] * 2 ** (stalled - 1), options['max_backoff']))
+                continue
+            stalled = 0
+            if not options['loop']:
+                break
+            time.sleep(options['idle_sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Ingested {total} inbox entries"))
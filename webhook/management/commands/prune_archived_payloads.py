@@ -0,0 +1,26 @@
+"""
+Delete archived payloads no longer referenced by any row.
+
+Deleting messages, calls, statuses or outgoing messages leaves their
+ArchivedPayload behind (the foreign keys are SET_NULL), and so does each
+resend that stores a new API response. Run this periodically to keep cold
+storage from growing without bound.
+
+Usage:
+    python manage.py prune_archived_payloads
+    python manage.py prune_archived_payloads --batch-size 500
+"""
+from django.core.management.base import BaseCommand
+from webhook.archive import prune_orphaned_archives
+
+
+class Command(BaseCommand):
+    help = 'Delete ArchivedPayload rows that no message, call, status or outgoing message references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Maximum number of archives deleted per statement')
+
+    def handle(self, *args, **options):
+        total = prune_orphaned_archives(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} orphaned archived payloads"))
@@ -0,0 +1,38 @@
+"""
+Delete old idempotency keys.
+
+Meta stops redelivering a webhook after a few days, so keys older than that
+only take up space.
+
+Usage:
+    python manage.py prune_seen_keys --days 14
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from webhook.models import WebhookSeenKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys of messages and statuses older than --days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14,
+                            help='Keep keys created within this many days')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Maximum number of keys deleted per statement')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        while True:
+            keys = list(
+                WebhookSeenKey.objects.filter(created_at__lt=cutoff)
+                .values_list('key', flat=True)[:options['batch_size']]
+            )
+            if not keys:
+                break
+            deleted, _ = WebhookSeenKey.objects.filter(key__in=keys).delete()
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} seen keys older than {options['days']} days"))
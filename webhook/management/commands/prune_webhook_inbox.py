@@ -0,0 +1,32 @@
+"""
+Delete inbox entries that were ingested long ago.
+
+In inbox mode every raw request body is kept in WebhookInboxEntry. Once an
+entry is processed its messages, statuses and calls are stored in their own
+tables, so the body is only needed for replay_webhooks --source inbox. Run
+this periodically to keep the table from growing without bound.
+
+Usage:
+    python manage.py prune_webhook_inbox --days 7
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from webhook.inbox import prune_processed_entries
+
+
+class Command(BaseCommand):
+    help = 'Delete processed webhook inbox entries older than --days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Keep entries processed within this many days')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Maximum number of entries deleted per statement')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = prune_processed_entries(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {total} processed inbox entries older than {options['days']} days"
+        ))
@@ -0,0 +1,20 @@
+"""
+Regenerate the WhatsAppCallSession table from stored call events.
+
+Usage:
+    python manage.py rebuild_call_sessions
+"""
+from django.core.management.base import BaseCommand
+from webhook.call_sessions import rebuild_call_sessions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-call session summaries from WhatsAppCall events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        count = rebuild_call_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} call sessions"))
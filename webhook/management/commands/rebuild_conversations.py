@@ -0,0 +1,20 @@
+"""
+Regenerate the Conversation summary table from message history.
+
+Usage:
+    python manage.py rebuild_conversations
+"""
+from django.core.management.base import BaseCommand
+from webhook.conversations import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-contact conversation summaries from WhatsAppMessage and WhatsAppOutgoingMessage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        count = rebuild_conversations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} conversations"))
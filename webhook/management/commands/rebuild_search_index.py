@@ -0,0 +1,21 @@
+"""
+Regenerate the message full-text search index.
+
+Usage:
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from webhook.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index over incoming message text, captions and filenames'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} messages with {type(backend).__name__}"))
@@ -0,0 +1,109 @@
+"""
+Replay stored webhook traffic against a webhook URL.
+
+Usage:
+    python manage.py replay_webhooks --url http://staging:8000/webhook/
+    python manage.py replay_webhooks --since 2025-01-01 --speedup 60 --concurrency 8 --unique-ids
+    python manage.py replay_webhooks --source inbox --rate 200
+    python manage.py replay_webhooks --since 2025-01-01 --export traffic.jsonl
+    python manage.py replay_webhooks --source file --file traffic.jsonl --url http://staging:8000/webhook/
+"""
+import json
+import time
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from webhook.replay import (
+    REPLAY_SOURCES, envelopes_from_inbox, envelopes_from_journal, envelopes_from_rows, replay,
+    with_unique_ids, write_journal,
+)
+
+
+def _parse_time(value):
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f"Invalid date/time: {value}")
+        parsed = datetime(date.year, date.month, date.day)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild webhook requests from stored traffic and replay them at a controlled rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['db', 'inbox', 'file'], default='db',
+                            help='Stored messages/statuses/calls (db), raw inbox bodies (inbox) or a journal (file)')
+        parser.add_argument('--file', help='Journal to read (--source file)')
+        parser.add_argument('--kind', choices=sorted(REPLAY_SOURCES), action='append',
+                            help='Stored item kind to replay (repeatable, default: all; --source db)')
+        parser.add_argument('--since', help='Only traffic received at or after this date/time')
+        parser.add_argument('--until', help='Only traffic received before this date/time')
+        parser.add_argument('--limit', type=int, help='Maximum number of requests')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Items packed into each rebuilt request (--source db)')
+        parser.add_argument('--url', default='http://127.0.0.1:8000/webhook/', help='Webhook URL to post to')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Requests per second (default: as fast as possible)')
+        parser.add_argument('--speedup', type=float,
+                            help='Keep the original spacing, compressed by this factor (overrides --rate)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent senders')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--app-secret', default=None,
+                            help='Sign requests with this app secret (default: WHATSAPP_APP_SECRET; "" to send unsigned)')
+        parser.add_argument('--unique-ids', action='store_true',
+                            help='Suffix message/status/call ids so the target does not drop them as redeliveries')
+        parser.add_argument('--export', metavar='PATH',
+                            help='Write the requests to a journal file instead of sending them')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        since, until = _parse_time(options['since']), _parse_time(options['until'])
+        source = options['source']
+        if source == 'db':
+            envelopes = envelopes_from_rows(options['kind'], since, until, options['batch_size'], options['limit'])
+        elif source == 'inbox':
+            envelopes = envelopes_from_inbox(since, until, options['limit'])
+        else:
+            if not options['file']:
+                raise CommandError('--source file needs --file')
+            envelopes = envelopes_from_journal(options['file'], options['limit'])
+
+        if options['unique_ids']:
+            envelopes = with_unique_ids(envelopes, f".replay{int(time.time())}")
+
+        if options['export']:
+            written = write_journal(envelopes, options['export'])
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} requests to {options['export']}"))
+            return
+
+        summary = replay(
+            envelopes, options['url'],
+            rate=options['rate'], speedup=options['speedup'],
+            concurrency=options['concurrency'], timeout=options['timeout'],
+            secret=settings.WHATSAPP_APP_SECRET if options['app_secret'] is None else options['app_secret'],
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(
+            f"{summary['requests']} requests ({summary['items']} items) in {summary['elapsed_s']:.1f}s: "
+            f"{summary['req_per_sec']:.1f} req/s, {summary['items_per_sec']:.1f} items/s"
+        )
+        self.stdout.write(
+            f"latency p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+            f"p99 {summary['p99_ms']:.1f} ms, max {summary['max_ms']:.1f} ms"
+        )
+        if options['rate'] or options['speedup']:
+            self.stdout.write(f"fell behind schedule by up to {summary['max_lag_ms']:.0f} ms")
+        if summary['errors']:
+            for error, count in summary['errors'].items():
+                self.stdout.write(self.style.ERROR(f"  {error}: {count}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary['ok']} requests succeeded"))
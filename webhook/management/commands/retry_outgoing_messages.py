@@ -0,0 +1,52 @@
+"""
+Resend outgoing messages whose retry is due.
+
+Usage:
+    python manage.py retry_outgoing_messages              # one pass over due messages
+    python manage.py retry_outgoing_messages --loop       # keep running as a worker
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from webhook.outgoing import retry_due_messages
+
+
+class Command(BaseCommand):
+    help = 'Resend pending outgoing messages that failed with a transient Graph API error'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Maximum number of messages claimed per batch')
+        parser.add_argument('--lease', type=int, default=300,
+                            help='Seconds a claimed batch stays reserved for this worker')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for due messages instead of exiting when none are left')
+        parser.add_argument('--idle-sleep', type=float, default=5.0,
+                            help='Seconds to wait between polls when nothing is due (with --loop)')
+
+    def handle(self, *args, **options):
+        totals = {'claimed': 0, 'sent': 0, 'pending': 0, 'failed': 0}
+        while True:
+            try:
+                counts = retry_due_messages(
+                    batch_size=options['batch_size'],
+                    lease_seconds=options['lease'],
+                )
+            except OperationalError as e:
+                # SQLite reports "database is locked" when another worker holds the write lock
+                self.stderr.write(f"Claim failed, retrying: {e}")
+                time.sleep(options['idle_sleep'])
+                continue
+
+            for name, value in counts.items():
+                totals[name] += value
+            if counts['claimed']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['idle_sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Retried {totals['claimed']} messages: {totals['sent']} sent, "
+            f"{totals['pending']} rescheduled, {totals['failed']} failed"
+        ))
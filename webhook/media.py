@@ -0,0 +1,300 @@
+"""
+Media download pipeline and content-addressed local store.
+
+Webhooks only carry a media ID (and Meta's SHA-256 of the file); the
+download URL has to be resolved through the Graph API and expires after a
+few minutes. Ingest marks each media attachment ``pending`` and the
+``fetch_media`` management command downloads them outside the request
+path, on a bounded thread pool:
+
+1. If a file with the attachment's SHA-256 is already stored, it is linked
+   without any network call, so identical media is downloaded once.
+2. Otherwise the media ID is resolved to a URL and the bytes are streamed
+   to a temporary file while being hashed, then atomically renamed to
+   ``<WHATSAPP_MEDIA_ROOT>/<sha[:2]>/<sha[2:4]>/<sha>``.
+
+Failed downloads are retried with the outgoing-message backoff
+(WHATSAPP_RETRY_*). Stored files are served by ``/api/messages/<id>/media/``
+with sendfile or an X-Accel-Redirect.
+"""
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import MediaBlob, WhatsAppMessageAttachment
+from .outgoing import retry_delay
+from .services import get_graph_client
+
+logger = logging.getLogger(__name__)
+
+
+FETCH_RESULT_FIELDS = ['media_blob', 'mime_type', 'fetch_status', 'fetch_attempts', 'fetch_after', 'fetch_error']
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class MediaFetchError(Exception):
+    """A media file could not be resolved or downloaded"""
+
+
+def normalize_sha256(value):
+    """
+    Convert a SHA-256 as sent by Meta (hex or base64) to lowercase hex.
+
+    Returns:
+        str, or None if the value is missing or not a SHA-256
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if len(value) == 64:
+        try:
+            bytes.fromhex(value)
+            return value.lower()
+        except ValueError:
+            pass
+    altchars = b'-_' if '-' in value or '_' in value else None
+    try:
+        digest = base64.b64decode(value + '=' * (-len(value) % 4), altchars=altchars, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return digest.hex() if len(digest) == 32 else None
+
+
+class MediaStore:
+    """Files on local disk named by the SHA-256 of their content"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, sha256):
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def exists(self, sha256):
+        return self.path(sha256).is_file()
+
+    def save_stream(self, chunks, expected_sha256=None, max_bytes=None):
+        """
+        Write a stream of byte chunks into the store.
+
+        The data goes to a temporary file in the store and is renamed into
+        place once its hash is known, so readers never see partial files and
+        concurrent writers of the same content are harmless.
+
+        Returns:
+            tuple: (hex sha256, size in bytes)
+
+        Raises:
+            MediaFetchError: If the stream exceeds max_bytes or does not match expected_sha256
+        """
+        tmp_dir = self.root / 'tmp'
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise MediaFetchError(f"Media larger than {max_bytes} bytes")
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            sha256 = digest.hexdigest()
+            if expected_sha256 and sha256 != expected_sha256:
+                raise MediaFetchError(f"SHA-256 mismatch: expected {expected_sha256}, got {sha256}")
+            final_path = self.path(sha256)
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, final_path)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+def get_media_store():
+    """Return the MediaStore at WHATSAPP_MEDIA_ROOT"""
+    return MediaStore(settings.WHATSAPP_MEDIA_ROOT)
+
+
+def resolve_media(media_id):
+    """
+    Look up a media ID through the Graph API.
+
+    Returns:
+        dict: Graph API media object with 'url', 'mime_type', 'sha256' and 'file_size'
+    """
+    try:
+        response = get_graph_client().get(media_id)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise MediaFetchError(f"Could not resolve media {media_id}: {str(e)}") from e
+
+
+def download_media(media_id, expected_sha256=None, store=None):
+    """
+    Make sure the file behind a media ID is in the local store.
+
+    Runs on the worker pool; touches only the network and the disk.
+
+    Returns:
+        dict: {'sha256', 'size', 'mime_type', 'downloaded'}
+    """
+    store = store or get_media_store()
+    info = resolve_media(media_id)
+    sha256 = normalize_sha256(info.get('sha256')) or expected_sha256
+    mime_type = info.get('mime_type')
+
+    if sha256 and store.exists(sha256):
+        return {'sha256': sha256, 'size': store.path(sha256).stat().st_size,
+                'mime_type': mime_type, 'downloaded': False}
+
+    url = info.get('url')
+    if not url:
+        raise MediaFetchError(f"Graph API returned no URL for media {media_id}")
+    try:
+        with get_graph_client().get(url, stream=True) as response:
+            response.raise_for_status()
+            sha256, size = store.save_stream(
+                response.iter_content(chunk_size=_CHUNK_SIZE),
+                expected_sha256=sha256,
+                max_bytes=settings.WHATSAPP_MEDIA_MAX_BYTES,
+            )
+    except requests.exceptions.RequestException as e:
+        raise MediaFetchError(f"Could not download media {media_id}: {str(e)}") from e
+
+    return {'sha256': sha256, 'size': size, 'mime_type': mime_type, 'downloaded': True}
+
+
+def claim_pending_media(batch_size=50, lease_seconds=600):
+    """
+    Claim attachments whose media is due for download.
+
+    Rows are locked with select_for_update(skip_locked=True) and leased by
+    pushing fetch_after forward, as claim_due_messages does for sends.
+
+    Returns:
+        list: Claimed WhatsAppMessageAttachment instances
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = list(
+            WhatsAppMessageAttachment.objects.select_for_update(skip_locked=True)
+            .filter(fetch_status='pending')
+            .exclude(fetch_after__gt=now)
+            .order_by('id')[:batch_size]
+        )
+        if claimed:
+            WhatsAppMessageAttachment.objects.filter(id__in=[attachment.id for attachment in claimed]).update(
+                fetch_after=now + timedelta(seconds=lease_seconds)
+            )
+    return claimed
+
+
+def _fetch(attachment, store):
+    """Worker-pool task: returns (attachment, result dict or MediaFetchError)"""
+    try:
+        return attachment, download_media(attachment.media_id, normalize_sha256(attachment.sha256), store)
+    except MediaFetchError as e:
+        return attachment, e
+    except Exception as e:
+        logger.error(f"Unexpected error fetching media {attachment.media_id}: {str(e)}", exc_info=True)
+        return attachment, MediaFetchError(str(e))
+
+
+def fetch_pending_media(batch_size=50, max_workers=None, lease_seconds=600):
+    """
+    Download one batch of pending media and record the outcomes.
+
+    Attachments whose SHA-256 is already in the store are linked without a
+    download; the rest are fetched concurrently on at most
+    WHATSAPP_MEDIA_FETCH_CONCURRENCY threads. Database writes happen on the
+    calling thread, in bulk.
+
+    Returns:
+        dict: Counts of claimed, linked (deduplicated), downloaded, retried and failed attachments
+    """
+    claimed = claim_pending_media(batch_size, lease_seconds)
+    counts = {'claimed': len(claimed), 'linked': 0, 'downloaded': 0, 'pending': 0, 'failed': 0}
+    if not claimed:
+        return counts
+
+    store = get_media_store()
+    known = set(
+        MediaBlob.objects.filter(sha256__in={normalize_sha256(a.sha256) for a in claimed} - {None})
+        .values_list('sha256', flat=True)
+    )
+    results = []
+    to_download = []
+    # Attachments in this batch sharing a SHA-256 with one being downloaded
+    duplicates = {}
+    for attachment in claimed:
+        sha256 = normalize_sha256(attachment.sha256)
+        if sha256 in known and store.exists(sha256):
+            results.append((attachment, {'sha256': sha256, 'downloaded': False, 'mime_type': None}))
+        elif sha256 and sha256 in duplicates:
+            duplicates[sha256].append(attachment)
+        else:
+            to_download.append(attachment)
+            if sha256:
+                duplicates[sha256] = []
+
+    if to_download:
+        workers = min(max_workers or settings.WHATSAPP_MEDIA_FETCH_CONCURRENCY, len(to_download))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-fetch') as pool:
+            fetched = list(pool.map(lambda attachment: _fetch(attachment, store), to_download))
+        for attachment, result in fetched:
+            results.append((attachment, result))
+            for duplicate in duplicates.get(normalize_sha256(attachment.sha256), []):
+                if isinstance(result, MediaFetchError):
+                    results.append((duplicate, result))
+                else:
+                    results.append((duplicate, {**result, 'downloaded': False}))
+
+    now = timezone.now()
+    blobs = {}
+    for attachment, result in results:
+        attachment.fetch_attempts += 1
+        if isinstance(result, MediaFetchError):
+            attachment.fetch_error = str(result)
+            if attachment.fetch_attempts < settings.WHATSAPP_RETRY_MAX_ATTEMPTS:
+                attachment.fetch_after = now + retry_delay(attachment.fetch_attempts)
+                counts['pending'] += 1
+            else:
+                attachment.fetch_status = 'failed'
+                attachment.fetch_after = None
+                counts['failed'] += 1
+            logger.warning(f"Media fetch failed for message {attachment.message_id}: {result}")
+            continue
+
+        sha256 = result['sha256']
+        if sha256 not in known and sha256 not in blobs:
+            blobs[sha256] = MediaBlob(sha256=sha256, size=result['size'], mime_type=result['mime_type'])
+        attachment.media_blob_id = sha256
+        attachment.mime_type = attachment.mime_type or result['mime_type']
+        attachment.fetch_status = 'done'
+        attachment.fetch_after = None
+        attachment.fetch_error = None
+        counts['downloaded' if result['downloaded'] else 'linked'] += 1
+
+    with transaction.atomic():
+        if blobs:
+            MediaBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        WhatsAppMessageAttachment.objects.bulk_update(claimed, FETCH_RESULT_FIELDS)
+
+    logger.info(
+        f"Fetched media for {counts['claimed']} attachments: {counts['downloaded']} downloaded, "
+        f"{counts['linked']} already stored, {counts['pending']} rescheduled, {counts['failed']} failed"
+    )
+    return counts
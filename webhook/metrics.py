@@ -0,0 +1,291 @@
+"""
+In-process metrics for the webhook pipeline.
+
+Counters and histograms are kept in plain dicts behind a lock per metric,
+so recording costs a dictionary update. ``/metrics`` renders them in the
+Prometheus text format.
+
+Under several worker processes (gunicorn, uvicorn --workers) each process
+only sees its own numbers. With WHATSAPP_METRICS_DIR set, every process
+writes its snapshot to a file in that directory, at most every
+WHATSAPP_METRICS_FLUSH_INTERVAL seconds and at exit. ``/metrics`` then sums
+all the files, with the live numbers of the answering process taking the
+place of its own file. Files of exited processes keep counting towards the
+totals; empty the directory when deploying.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds; covers a cache hit up to a slow Graph API call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        """Current values as [[label values], value] pairs"""
+        with self._lock:
+            return [[list(key), value if not isinstance(value, list) else list(value)]
+                    for key, value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values per label combination.
+
+    Each label combination keeps one count per bucket (non-cumulative, the
+    last one is +Inf) followed by the sum and the count of observations.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def time(self, **labels):
+        """Context manager observing the seconds spent in its block"""
+        return _Timer(self, labels)
+
+
+class Registry:
+    """The metrics of this process, plus snapshot files of the other processes"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.samples() for name, metric in self.metrics.items()}
+
+    def _directory(self):
+        directory = settings.WHATSAPP_METRICS_DIR
+        return Path(directory) if directory else None
+
+    def flush(self):
+        """Write this process's snapshot file"""
+        directory = self._directory()
+        if directory is None:
+            return
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{self.token}.json"
+            tmp_path = directory / f".{self.token}.tmp"
+            tmp_path.write_text(json.dumps(self.snapshot()))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {str(e)}")
+
+    def maybe_flush(self):
+        """Flush if WHATSAPP_METRICS_FLUSH_INTERVAL has passed since the last flush"""
+        if not settings.WHATSAPP_METRICS_DIR:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < settings.WHATSAPP_METRICS_FLUSH_INTERVAL:
+            return
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self._last_flush = now
+                self.flush()
+            finally:
+                self._flush_lock.release()
+
+    def collect(self):
+        """
+        Sum the live metrics of this process with the other processes' snapshot files.
+
+        Returns:
+            dict: metric name -> {label values tuple: value}
+        """
+        snapshots = [self.snapshot()]
+        directory = self._directory()
+        if directory is not None and directory.is_dir():
+            for path in directory.glob('*.json'):
+                if path.stem == self.token:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        totals = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                if name not in totals:
+                    continue
+                merged = totals[name]
+                for labels, value in samples:
+                    key = tuple(labels)
+                    if isinstance(value, list):
+                        current = merged.get(key)
+                        merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        merged[key] = merged.get(key, 0) + value
+        return totals
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for key, value in sorted(samples.items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.type == 'counter':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+WEBHOOK_REQUESTS = registry.register(Counter(
+    'whatsapp_webhook_requests_total', 'Webhook POST requests by outcome', ['outcome'],
+))
+WEBHOOK_REQUEST_SECONDS = registry.register(Histogram(
+    'whatsapp_webhook_request_seconds', 'Webhook POST handling time by outcome', ['outcome'],
+))
+WEBHOOK_REJECTIONS = registry.register(Counter(
+    'whatsapp_webhook_rejections_total', 'Webhook POSTs refused before parsing, by reason', ['reason'],
+))
+WEBHOOK_SHED = registry.register(Counter(
+    'whatsapp_webhook_shed_total', 'Webhook POSTs refused with 503 under load, by priority and reason',
+    ['priority', 'reason'],
+))
+STAGE_SECONDS = registry.register(Histogram(
+    'whatsapp_webhook_stage_seconds',
+    'Time spent in each webhook pipeline stage, by type for the message, status and call writes',
+    ['stage', 'type'],
+))
+ITEMS = registry.register(Counter(
+    'whatsapp_webhook_items_total',
+    'Items ingested, by kind (message, status, call) and type (message type, status or call event)',
+    ['kind', 'type'],
+))
+DUPLICATES = registry.register(Counter(
+    'whatsapp_webhook_duplicates_total', 'Redelivered items skipped by the idempotency filter', ['kind'],
+))
+GRAPH_SENDS = registry.register(Counter(
+    'whatsapp_graph_sends_total', 'Graph API message sends by message type and outcome', ['message_type', 'outcome'],
+))
+GRAPH_SEND_SECONDS = registry.register(Histogram(
+    'whatsapp_graph_send_seconds', 'Graph API send time, excluding rate-limit waits, by outcome', ['outcome'],
+))
+
+
+def stage(name, type=''):
+    """Time a pipeline stage: ``with stage('parse'): ...``"""
+    return STAGE_SECONDS.time(stage=name, type=type)
+
+
+def record_request(outcome, seconds):
+    """Count a finished webhook request and flush the snapshot if due"""
+    WEBHOOK_REQUESTS.inc(outcome=outcome)
+    WEBHOOK_REQUEST_SECONDS.observe(seconds, outcome=outcome)
+    registry.maybe_flush()
+
+
+def record_send(message_type, result, seconds):
+    """Count a finished Graph API send (a send_whatsapp_message result)"""
+    if result['success']:
+        outcome = 'success'
+    elif result.get('rate_limited'):
+        outcome = 'rate_limited'
+    elif result.get('status_code'):
+        outcome = f"http_{result['status_code']}"
+    else:
+        outcome = 'retryable_error' if result.get('retryable') else 'error'
+    GRAPH_SENDS.inc(message_type=message_type, outcome=outcome)
+    GRAPH_SEND_SECONDS.observe(seconds, outcome=outcome)
+    registry.maybe_flush()
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0006_whatsappoutgoingmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookInboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('body', models.BinaryField(help_text='Raw webhook request body')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed ingest attempts')),
+                ('last_error', models.TextField(blank=True, help_text='Error from the last failed attempt', null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, help_text='When the entry was ingested', null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'webhook inbox entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='webhook_web_status_db92e1_idx')],
+            },
+        ),
+    ]
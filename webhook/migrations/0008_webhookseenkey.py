@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0007_webhookinboxentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSeenKey',
+            fields=[
+                ('key', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0008_webhookseenkey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappoutgoingmessage',
+            name='attempt_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of send attempts made'),
+        ),
+        migrations.AddField(
+            model_name='whatsappoutgoingmessage',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='When the next retry is due (pending messages only)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappoutgoingmessage',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='webhook_wha_status_588c93_idx'),
+        ),
+    ]
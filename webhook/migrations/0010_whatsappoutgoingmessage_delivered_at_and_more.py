@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0009_whatsappoutgoingmessage_attempt_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappoutgoingmessage',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, help_text='When Meta reported the message delivered', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappoutgoingmessage',
+            name='read_at',
+            field=models.DateTimeField(blank=True, help_text='When Meta reported the message read', null=True),
+        ),
+    ]
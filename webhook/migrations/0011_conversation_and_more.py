@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0010_whatsappoutgoingmessage_delivered_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number_id', models.CharField(help_text="Meta's phone number ID of our business number", max_length=100)),
+                ('wa_id', models.CharField(help_text='WhatsApp ID of the contact', max_length=50)),
+                ('contact_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('last_message_at', models.DateTimeField(help_text='When the latest message in either direction was stored')),
+                ('last_direction', models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound')], max_length=10)),
+                ('last_message_type', models.CharField(max_length=20)),
+                ('last_message_preview', models.CharField(blank=True, max_length=255, null=True)),
+                ('last_inbound_at', models.DateTimeField(blank=True, help_text='When the contact last wrote to us', null=True)),
+                ('message_count', models.PositiveIntegerField(default=0, help_text='Messages in both directions')),
+                ('unprocessed_count', models.PositiveIntegerField(default=0, help_text='Incoming messages not yet processed by the chatbot')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'indexes': [models.Index(fields=['-last_message_at'], name='webhook_con_last_me_324a76_idx'), models.Index(fields=['phone_number_id', '-last_message_at'], name='webhook_con_phone_n_e28526_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('phone_number_id', 'wa_id'), name='unique_conversation_per_contact'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0011_conversation_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(choices=[('zlib', 'zlib')], default='zlib', max_length=10)),
+                ('data', models.BinaryField(help_text='Compressed JSON document')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='whatsappcall',
+            name='raw_payload_archive',
+            field=models.ForeignKey(blank=True, help_text='Compressed raw payload in cold storage', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webhook.archivedpayload'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='raw_payload_archive',
+            field=models.ForeignKey(blank=True, help_text='Compressed raw payload in cold storage', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webhook.archivedpayload'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessagestatus',
+            name='raw_payload_archive',
+            field=models.ForeignKey(blank=True, help_text='Compressed raw payload in cold storage', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webhook.archivedpayload'),
+        ),
+        migrations.AddField(
+            model_name='whatsappoutgoingmessage',
+            name='api_response_archive',
+            field=models.ForeignKey(blank=True, help_text='Compressed API response in cold storage', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='webhook.archivedpayload'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0012_archivedpayload_whatsappcall_raw_payload_archive_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppMessageAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_id', models.CharField(blank=True, help_text='Media ID for the Graph API', max_length=255, null=True)),
+                ('url', models.URLField(blank=True, null=True)),
+                ('mime_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('sha256', models.CharField(blank=True, max_length=128, null=True)),
+                ('caption', models.TextField(blank=True, null=True)),
+                ('filename', models.CharField(blank=True, max_length=255, null=True)),
+                ('is_voice', models.BooleanField(default=False)),
+                ('is_animated', models.BooleanField(default=False)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('contacts_data', models.JSONField(blank=True, help_text='Contact information in JSON format', null=True)),
+                ('message', models.OneToOneField(db_column='message_id', on_delete=django.db.models.deletion.CASCADE, related_name='attachment', to='webhook.whatsappmessage', to_field='message_id')),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+
+# Wide WhatsAppMessage column -> attachment column, per message type
+LEGACY_COLUMNS = {
+    'audio': {'audio_id': 'media_id', 'audio_url': 'url', 'audio_mime_type': 'mime_type', 'is_voice': 'is_voice'},
+    'image': {'image_id': 'media_id', 'image_url': 'url', 'image_mime_type': 'mime_type', 'image_caption': 'caption'},
+    'video': {'video_id': 'media_id', 'video_url': 'url', 'video_mime_type': 'mime_type', 'video_caption': 'caption'},
+    'document': {'document_id': 'media_id', 'document_url': 'url', 'document_mime_type': 'mime_type',
+                 'document_filename': 'filename'},
+    'sticker': {'sticker_id': 'media_id', 'sticker_url': 'url', 'sticker_mime_type': 'mime_type',
+                'is_animated': 'is_animated'},
+    'location': {'latitude': 'latitude', 'longitude': 'longitude'},
+    'contacts': {'contacts_data': 'contacts_data'},
+}
+
+BATCH_SIZE = 1000
+
+
+def copy_to_attachments(apps, schema_editor):
+    WhatsAppMessage = apps.get_model('webhook', 'WhatsAppMessage')
+    WhatsAppMessageAttachment = apps.get_model('webhook', 'WhatsAppMessageAttachment')
+
+    for message_type, columns in LEGACY_COLUMNS.items():
+        messages = (
+            WhatsAppMessage.objects.filter(message_type=message_type, attachment__isnull=True)
+            .order_by('id').values('message_id', *columns)
+        )
+        batch = []
+        for row in messages.iterator(chunk_size=BATCH_SIZE):
+            batch.append(WhatsAppMessageAttachment(
+                message_id=row['message_id'],
+                **{column: row[legacy] for legacy, column in columns.items()}
+            ))
+            if len(batch) >= BATCH_SIZE:
+                WhatsAppMessageAttachment.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            WhatsAppMessageAttachment.objects.bulk_create(batch)
+
+
+def copy_from_attachments(apps, schema_editor):
+    WhatsAppMessage = apps.get_model('webhook', 'WhatsAppMessage')
+    WhatsAppMessageAttachment = apps.get_model('webhook', 'WhatsAppMessageAttachment')
+
+    for message_type, columns in LEGACY_COLUMNS.items():
+        attachments = (
+            WhatsAppMessageAttachment.objects.filter(message__message_type=message_type)
+            .order_by('id').select_related('message')
+        )
+        batch = []
+        for attachment in attachments.iterator(chunk_size=BATCH_SIZE):
+            message = attachment.message
+            for legacy, column in columns.items():
+                setattr(message, legacy, getattr(attachment, column))
+            batch.append(message)
+            if len(batch) >= BATCH_SIZE:
+                WhatsAppMessage.objects.bulk_update(batch, list(columns))
+                batch = []
+        if batch:
+            WhatsAppMessage.objects.bulk_update(batch, list(columns))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0013_whatsappmessageattachment'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_attachments, copy_from_attachments),
+    ]
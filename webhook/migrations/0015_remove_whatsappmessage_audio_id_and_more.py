@@ -0,0 +1,105 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0014_backfill_whatsappmessageattachment'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='audio_id',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='audio_mime_type',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='audio_url',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='contacts_data',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='document_filename',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='document_id',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='document_mime_type',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='document_url',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='image_caption',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='image_id',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='image_mime_type',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='image_url',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='is_animated',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='is_voice',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='latitude',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='longitude',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='sticker_id',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='sticker_mime_type',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='sticker_url',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='video_caption',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='video_id',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='video_mime_type',
+        ),
+        migrations.RemoveField(
+            model_name='whatsappmessage',
+            name='video_url',
+        ),
+    ]
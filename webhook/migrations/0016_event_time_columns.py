@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0015_remove_whatsappmessage_audio_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappcall',
+            name='ended_at',
+            field=models.DateTimeField(blank=True, help_text='Call end time (parsed end_time)', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappcall',
+            name='event_at',
+            field=models.DateTimeField(blank=True, help_text='Event time (parsed timestamp)', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappcall',
+            name='started_at',
+            field=models.DateTimeField(blank=True, help_text='Call start time (parsed start_time)', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='event_at',
+            field=models.DateTimeField(blank=True, help_text='When the message was sent (parsed timestamp)', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessagestatus',
+            name='conversation_expires_at',
+            field=models.DateTimeField(blank=True, help_text='Parsed conversation expiration timestamp', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessagestatus',
+            name='event_at',
+            field=models.DateTimeField(blank=True, help_text='Status time (parsed timestamp)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappcall',
+            index=models.Index(fields=['event_at'], name='webhook_wha_event_a_839961_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessage',
+            index=models.Index(fields=['event_at'], name='webhook_wha_event_a_70b963_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessage',
+            index=models.Index(fields=['wa_id', '-event_at'], name='webhook_wha_wa_id_2d0056_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessagestatus',
+            index=models.Index(fields=['event_at'], name='webhook_wha_event_a_6c3dd8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessagestatus',
+            index=models.Index(fields=['status', 'event_at'], name='webhook_wha_status_d11c82_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0016_event_time_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppCallSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('call_id', models.CharField(help_text='Unique call ID from WhatsApp', max_length=255, unique=True)),
+                ('from_number', models.CharField(help_text='Phone number of the caller', max_length=50)),
+                ('to_number', models.CharField(help_text='Phone number being called', max_length=50)),
+                ('wa_id', models.CharField(help_text='WhatsApp ID of the caller', max_length=50)),
+                ('contact_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('direction', models.CharField(blank=True, choices=[('USER_INITIATED', 'User Initiated'), ('BUSINESS_INITIATED', 'Business Initiated')], max_length=30, null=True)),
+                ('status', models.CharField(blank=True, choices=[('COMPLETED', 'Completed'), ('MISSED', 'Missed'), ('DECLINED', 'Declined'), ('FAILED', 'Failed'), ('BUSY', 'Busy'), ('NO_ANSWER', 'No Answer')], help_text='Final call status (from the terminate event)', max_length=20, null=True)),
+                ('first_event_at', models.DateTimeField(help_text='Time of the earliest event of the call')),
+                ('connected_at', models.DateTimeField(blank=True, help_text='Time of the connect event', null=True)),
+                ('terminated_at', models.DateTimeField(blank=True, help_text='Time of the terminate event', null=True)),
+                ('started_at', models.DateTimeField(blank=True, help_text='Call start time reported by Meta', null=True)),
+                ('ended_at', models.DateTimeField(blank=True, help_text='Call end time reported by Meta', null=True)),
+                ('duration', models.IntegerField(blank=True, help_text='Call duration in seconds', null=True)),
+                ('session_sdp', models.TextField(blank=True, help_text='SDP offer/answer for WebRTC call handling', null=True)),
+                ('session_sdp_type', models.CharField(blank=True, help_text='SDP type: offer or answer', max_length=20, null=True)),
+                ('phone_number_id', models.CharField(help_text="Meta's phone number ID", max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-first_event_at'],
+                'indexes': [models.Index(fields=['-first_event_at'], name='webhook_wha_first_e_533096_idx'), models.Index(fields=['wa_id', '-first_event_at'], name='webhook_wha_wa_id_15c658_idx'), models.Index(fields=['status', 'first_event_at'], name='webhook_wha_status_016f66_idx')],
+            },
+        ),
+    ]
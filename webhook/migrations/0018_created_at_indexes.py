@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0017_whatsappcallsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='whatsappcall',
+            index=models.Index(fields=['-created_at'], name='webhook_wha_created_a34780_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessage',
+            index=models.Index(fields=['-created_at'], name='webhook_wha_created_4a3a35_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessagestatus',
+            index=models.Index(fields=['-created_at'], name='webhook_wha_created_f8cc37_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappoutgoingmessage',
+            index=models.Index(fields=['-created_at'], name='webhook_wha_created_a10f82_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS webhook_message_fts "
+        "USING fts5(body, contact_name, tokenize='unicode61 remove_diacritics 2')"
+    )
+    # Index the messages stored so far
+    schema_editor.execute(
+        "INSERT INTO webhook_message_fts (rowid, body, contact_name) "
+        "SELECT m.id, TRIM(COALESCE(m.message_text, '') || ' ' || COALESCE(a.caption, '') || ' ' "
+        "|| COALESCE(a.filename, '')), COALESCE(m.contact_name, '') "
+        "FROM webhook_whatsappmessage m "
+        "LEFT JOIN webhook_whatsappmessageattachment a ON a.message_id = m.message_id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS webhook_message_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0018_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def queue_existing_media(apps, schema_editor):
+    WhatsAppMessageAttachment = apps.get_model('webhook', 'WhatsAppMessageAttachment')
+    WhatsAppMessageAttachment.objects.filter(media_id__isnull=False).update(fetch_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhook', '0019_message_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('sha256', models.CharField(help_text='Hex SHA-256 of the file content', max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField(help_text='File size in bytes')),
+                ('mime_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='whatsappmessageattachment',
+            name='fetch_after',
+            field=models.DateTimeField(blank=True, help_text='Earliest time of the next download attempt', null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessageattachment',
+            name='fetch_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessageattachment',
+            name='fetch_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessageattachment',
+            name='fetch_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], help_text='Download state of the media (media types only)', max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessageattachment',
+            index=models.Index(fields=['fetch_status', 'fetch_after'], name='webhook_wha_fetch_s_3ada12_idx'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessageattachment',
+            name='media_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attachments', to='webhook.mediablob'),
+        ),
+        migrations.RunPython(queue_existing_media, migrations.RunPython.noop),
+    ]
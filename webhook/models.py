@@ -1,4 +1,56 @@
+import json
+import zlib
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from .utils import ATTACHMENT_TYPES
+
+
+class ArchivedPayload(models.Model):
+    """Compressed JSON payload moved out of a hot table (cold storage)"""
+    
+    CODECS = [
+        ('zlib', 'zlib'),
+    ]
+    
+    codec = models.CharField(max_length=10, choices=CODECS, default='zlib')
+    data = models.BinaryField(help_text="Compressed JSON document")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    @classmethod
+    def pack(cls, payload):
+        """Build an unsaved archive row holding the compressed payload"""
+        raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return cls(codec='zlib', data=zlib.compress(raw, 6))
+    
+    def load(self):
+        """Decompress and decode the stored payload"""
+        return json.loads(zlib.decompress(bytes(self.data)))
+    
+    def __str__(self):
+        return f"Archived payload #{self.id} | {self.codec} | {len(self.data)} bytes"
+
+
+def _archived_or_inline(instance, inline_field, archive_field):
+    if getattr(instance, f'{archive_field}_id'):
+        return getattr(instance, archive_field).load()
+    return getattr(instance, inline_field)
+
+
+class _AttachmentField:
+    """Read-only message attribute backed by a WhatsAppMessageAttachment column"""
+    
+    def __init__(self, message_type, column, default=None):
+        self.message_type = message_type
+        self.column = column
+        self.default = default
+    
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if instance.message_type != self.message_type:
+            return self.default
+        attachment = instance.get_attachment()
+        return self.default if attachment is None else getattr(attachment, self.column)
 
 
 class WhatsAppMessage(models.Model):
@@ -27,50 +79,20 @@ class WhatsAppMessage(models.Model):
     message_type = models.CharField(max_length=20, choices=MESSAGE_TYPES)
     message_text = models.TextField(blank=True, null=True, help_text="Text content if message type is text")
     
-    # Audio specific fields (for voice notes)
-    audio_id = models.CharField(max_length=255, blank=True, null=True)
-    audio_url = models.URLField(blank=True, null=True)
-    audio_mime_type = models.CharField(max_length=100, blank=True, null=True)
-    is_voice = models.BooleanField(default=False)
-
-    # Image specific fields
-    image_id = models.CharField(max_length=255, blank=True, null=True)
-    image_url = models.URLField(blank=True, null=True)
-    image_mime_type = models.CharField(max_length=100, blank=True, null=True)
-    image_caption = models.TextField(blank=True, null=True)
-
-    # Video specific fields
-    video_id = models.CharField(max_length=255, blank=True, null=True)
-    video_url = models.URLField(blank=True, null=True)
-    video_mime_type = models.CharField(max_length=100, blank=True, null=True)
-    video_caption = models.TextField(blank=True, null=True)
-
-    # Document specific fields
-    document_id = models.CharField(max_length=255, blank=True, null=True)
-    document_url = models.URLField(blank=True, null=True)
-    document_filename = models.CharField(max_length=255, blank=True, null=True)
-    document_mime_type = models.CharField(max_length=100, blank=True, null=True)
-
-    # Location specific fields
-    latitude = models.DecimalField(max_digits=10, decimal_places=8, blank=True, null=True)
-    longitude = models.DecimalField(max_digits=11, decimal_places=8, blank=True, null=True)
-
-    # Sticker specific fields
-    sticker_id = models.CharField(max_length=255, blank=True, null=True)
-    sticker_url = models.URLField(blank=True, null=True)
-    sticker_mime_type = models.CharField(max_length=100, blank=True, null=True)
-    is_animated = models.BooleanField(default=False)
-
-    # Contacts specific fields (stored as JSON)
-    contacts_data = models.JSONField(blank=True, null=True, help_text="Contact information in JSON format")
+    # Type-specific content (media, location, contacts) is in WhatsAppMessageAttachment
     
     # Metadata
     timestamp = models.CharField(max_length=50)
+    event_at = models.DateTimeField(blank=True, null=True, help_text="When the message was sent (parsed timestamp)")
     phone_number_id = models.CharField(max_length=100, help_text="Meta's phone number ID")
     display_phone_number = models.CharField(max_length=50, help_text="Display phone number")
     
-    # Raw payload for reference
+    # Raw payload for reference (moved to raw_payload_archive when archiving is enabled)
     raw_payload = models.JSONField(default=dict, help_text="Complete webhook payload")
+    raw_payload_archive = models.ForeignKey(
+        ArchivedPayload, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        help_text="Compressed raw payload in cold storage"
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -82,10 +104,118 @@ class WhatsAppMessage(models.Model):
             models.Index(fields=['wa_id', '-created_at']),
             models.Index(fields=['message_type']),
             models.Index(fields=['processed']),
+            models.Index(fields=['event_at']),
+            models.Index(fields=['wa_id', '-event_at']),
+            models.Index(fields=['-created_at']),
         ]
     
     def __str__(self):
         return f"{self.from_number} - {self.message_type} - {self.created_at}"
+    
+    def get_attachment(self):
+        """Return the message's WhatsAppMessageAttachment, or None (no query for text messages)"""
+        if self.message_type not in ATTACHMENT_TYPES:
+            return None
+        try:
+            return self.attachment
+        except ObjectDoesNotExist:
+            return None
+    
+    # Read access to the type-specific columns that moved to WhatsAppMessageAttachment
+    audio_id = _AttachmentField('audio', 'media_id')
+    audio_url = _AttachmentField('audio', 'url')
+    audio_mime_type = _AttachmentField('audio', 'mime_type')
+    is_voice = _AttachmentField('audio', 'is_voice', False)
+    image_id = _AttachmentField('image', 'media_id')
+    image_url = _AttachmentField('image', 'url')
+    image_mime_type = _AttachmentField('image', 'mime_type')
+    image_caption = _AttachmentField('image', 'caption')
+    video_id = _AttachmentField('video', 'media_id')
+    video_url = _AttachmentField('video', 'url')
+    video_mime_type = _AttachmentField('video', 'mime_type')
+    video_caption = _AttachmentField('video', 'caption')
+    document_id = _AttachmentField('document', 'media_id')
+    document_url = _AttachmentField('document', 'url')
+    document_filename = _AttachmentField('document', 'filename')
+    document_mime_type = _AttachmentField('document', 'mime_type')
+    latitude = _AttachmentField('location', 'latitude')
+    longitude = _AttachmentField('location', 'longitude')
+    sticker_id = _AttachmentField('sticker', 'media_id')
+    sticker_url = _AttachmentField('sticker', 'url')
+    sticker_mime_type = _AttachmentField('sticker', 'mime_type')
+    is_animated = _AttachmentField('sticker', 'is_animated', False)
+    contacts_data = _AttachmentField('contacts', 'contacts_data')
+    
+    @property
+    def payload(self):
+        """Complete webhook payload, loaded from cold storage if archived"""
+        return _archived_or_inline(self, 'raw_payload', 'raw_payload_archive')
+
+
+class MediaBlob(models.Model):
+    """Media file downloaded to the local content-addressed store (see webhook.media)"""
+    
+    sha256 = models.CharField(max_length=64, primary_key=True, help_text="Hex SHA-256 of the file content")
+    size = models.PositiveBigIntegerField(help_text="File size in bytes")
+    mime_type = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:16]}... | {self.mime_type} | {self.size} bytes"
+
+
+class WhatsAppMessageAttachment(models.Model):
+    """
+    Type-specific content of a non-text WhatsApp message (media, location, contacts).
+
+    Text messages, the bulk of the traffic, have no attachment row, so the
+    message table only carries the columns every message uses.
+    """
+    
+    message = models.OneToOneField(
+        WhatsAppMessage, on_delete=models.CASCADE, to_field='message_id',
+        db_column='message_id', related_name='attachment'
+    )
+    
+    # Media (audio, image, video, document, sticker)
+    media_id = models.CharField(max_length=255, blank=True, null=True, help_text="Media ID for the Graph API")
+    url = models.URLField(blank=True, null=True)
+    mime_type = models.CharField(max_length=100, blank=True, null=True)
+    sha256 = models.CharField(max_length=128, blank=True, null=True)
+    caption = models.TextField(blank=True, null=True)
+    filename = models.CharField(max_length=255, blank=True, null=True)
+    is_voice = models.BooleanField(default=False)
+    is_animated = models.BooleanField(default=False)
+    
+    # Location
+    latitude = models.DecimalField(max_digits=10, decimal_places=8, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=11, decimal_places=8, blank=True, null=True)
+    
+    # Contacts (stored as JSON)
+    contacts_data = models.JSONField(blank=True, null=True, help_text="Contact information in JSON format")
+    
+    # Local copy of the media, filled by the fetch_media worker
+    FETCH_STATUSES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    media_blob = models.ForeignKey(MediaBlob, on_delete=models.SET_NULL, blank=True, null=True,
+                                   related_name='attachments')
+    fetch_status = models.CharField(max_length=10, choices=FETCH_STATUSES, blank=True, null=True,
+                                    help_text="Download state of the media (media types only)")
+    fetch_attempts = models.PositiveIntegerField(default=0)
+    fetch_after = models.DateTimeField(blank=True, null=True, help_text="Earliest time of the next download attempt")
+    fetch_error = models.TextField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['fetch_status', 'fetch_after']),
+        ]
+    
+    def __str__(self):
+        return f"Attachment of {self.message_id}"
 
 
 class WhatsAppCall(models.Model):
@@ -128,6 +258,9 @@ class WhatsAppCall(models.Model):
     timestamp = models.CharField(max_length=50, help_text="Event timestamp")
     start_time = models.CharField(max_length=50, blank=True, null=True, help_text="Call start time")
     end_time = models.CharField(max_length=50, blank=True, null=True, help_text="Call end time")
+    event_at = models.DateTimeField(blank=True, null=True, help_text="Event time (parsed timestamp)")
+    started_at = models.DateTimeField(blank=True, null=True, help_text="Call start time (parsed start_time)")
+    ended_at = models.DateTimeField(blank=True, null=True, help_text="Call end time (parsed end_time)")
     duration = models.IntegerField(blank=True, null=True, help_text="Call duration in seconds")
     
     # Session data (for connect events - contains SDP for WebRTC)
@@ -138,8 +271,12 @@ class WhatsAppCall(models.Model):
     phone_number_id = models.CharField(max_length=100, help_text="Meta's phone number ID")
     display_phone_number = models.CharField(max_length=50, help_text="Display phone number")
     
-    # Raw payload for reference
+    # Raw payload for reference (moved to raw_payload_archive when archiving is enabled)
     raw_payload = models.JSONField(default=dict, help_text="Complete call webhook payload")
+    raw_payload_archive = models.ForeignKey(
+        ArchivedPayload, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        help_text="Compressed raw payload in cold storage"
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -151,10 +288,17 @@ class WhatsAppCall(models.Model):
             models.Index(fields=['from_number', '-created_at']),
             models.Index(fields=['event']),
             models.Index(fields=['status']),
+            models.Index(fields=['event_at']),
+            models.Index(fields=['-created_at']),
         ]
     
     def __str__(self):
         return f"{self.from_number} -> {self.to_number} | {self.event} | {self.status or 'N/A'} | {self.created_at}"
+    
+    @property
+    def payload(self):
+        """Complete call webhook payload, loaded from cold storage if archived"""
+        return _archived_or_inline(self, 'raw_payload', 'raw_payload_archive')
 
 
 class WhatsAppMessageStatus(models.Model):
@@ -175,6 +319,7 @@ class WhatsAppMessageStatus(models.Model):
     # Conversation information
     conversation_id = models.CharField(max_length=255, blank=True, null=True, help_text="Conversation ID")
     conversation_expiration_timestamp = models.CharField(max_length=50, blank=True, null=True, help_text="Conversation expiration timestamp")
+    conversation_expires_at = models.DateTimeField(blank=True, null=True, help_text="Parsed conversation expiration timestamp")
     conversation_origin_type = models.CharField(max_length=50, blank=True, null=True, help_text="Origin type (service/user)")
     
     # Pricing information
@@ -185,11 +330,16 @@ class WhatsAppMessageStatus(models.Model):
     
     # Metadata
     timestamp = models.CharField(max_length=50, help_text="Status timestamp")
+    event_at = models.DateTimeField(blank=True, null=True, help_text="Status time (parsed timestamp)")
     phone_number_id = models.CharField(max_length=100, help_text="Meta's phone number ID")
     display_phone_number = models.CharField(max_length=50, help_text="Display phone number")
     
-    # Raw payload for reference
+    # Raw payload for reference (moved to raw_payload_archive when archiving is enabled)
     raw_payload = models.JSONField(default=dict, help_text="Complete status payload")
+    raw_payload_archive = models.ForeignKey(
+        ArchivedPayload, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        help_text="Compressed raw payload in cold storage"
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -200,10 +350,18 @@ class WhatsAppMessageStatus(models.Model):
             models.Index(fields=['message_id', '-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['recipient_id', '-created_at']),
+            models.Index(fields=['event_at']),
+            models.Index(fields=['status', 'event_at']),
+            models.Index(fields=['-created_at']),
         ]
     
     def __str__(self):
         return f"{self.recipient_id} | {self.status} | Message: {self.message_id[:20]}... | {self.created_at}"
+    
+    @property
+    def payload(self):
+        """Complete status payload, loaded from cold storage if archived"""
+        return _archived_or_inline(self, 'raw_payload', 'raw_payload_archive')
 
 
 class WhatsAppOutgoingMessage(models.Model):
@@ -237,11 +395,21 @@ class WhatsAppOutgoingMessage(models.Model):
     # Status tracking
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', help_text="Current message status")
     api_response = models.JSONField(blank=True, null=True, help_text="Response from WhatsApp API")
+    api_response_archive = models.ForeignKey(
+        ArchivedPayload, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        help_text="Compressed API response in cold storage"
+    )
     error_message = models.TextField(blank=True, null=True, help_text="Error message if sending failed")
     
+    # Retry tracking
+    attempt_count = models.PositiveIntegerField(default=0, help_text="Number of send attempts made")
+    next_attempt_at = models.DateTimeField(blank=True, null=True, help_text="When the next retry is due (pending messages only)")
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField(blank=True, null=True, help_text="When message was successfully sent")
+    delivered_at = models.DateTimeField(blank=True, null=True, help_text="When Meta reported the message delivered")
+    read_at = models.DateTimeField(blank=True, null=True, help_text="When Meta reported the message read")
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -250,7 +418,143 @@ class WhatsAppOutgoingMessage(models.Model):
             models.Index(fields=['to_number', '-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['message_id']),
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['-created_at']),
         ]
     
     def __str__(self):
         return f"{self.to_number} | {self.status} | {self.message_text[:30]}... | {self.created_at}"
+    
+    @property
+    def api_response_payload(self):
+        """Response from WhatsApp API, loaded from cold storage if archived"""
+        return _archived_or_inline(self, 'api_response', 'api_response_archive')
+
+
+class WebhookInboxEntry(models.Model):
+    """Raw webhook request bodies waiting to be ingested by the inbox worker"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Raw request body exactly as Meta delivered it
+    body = models.BinaryField(help_text="Raw webhook request body")
+    
+    # Processing state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0, help_text="Number of failed ingest attempts")
+    last_error = models.TextField(blank=True, null=True, help_text="Error from the last failed attempt")
+    
+    # Timestamps
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True, help_text="When the entry was ingested")
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = 'webhook inbox entries'
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Inbox #{self.id} | {self.status} | {self.received_at}"
+
+
+class WebhookSeenKey(models.Model):
+    """Digest of a message or status event that has already been ingested"""
+    
+    # blake2b digest of "m:<message_id>" or "s:<message_id>:<status>"
+    key = models.CharField(max_length=32, primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.key} | {self.created_at}"
+
+
+class Conversation(models.Model):
+    """Per-contact activity summary, updated incrementally by the ingest and send paths"""
+    
+    DIRECTIONS = [
+        ('inbound', 'Inbound'),
+        ('outbound', 'Outbound'),
+    ]
+    
+    # Conversation identification
+    phone_number_id = models.CharField(max_length=100, help_text="Meta's phone number ID of our business number")
+    wa_id = models.CharField(max_length=50, help_text="WhatsApp ID of the contact")
+    contact_name = models.CharField(max_length=255, blank=True, null=True)
+    
+    # Latest activity
+    last_message_at = models.DateTimeField(help_text="When the latest message in either direction was stored")
+    last_direction = models.CharField(max_length=10, choices=DIRECTIONS)
+    last_message_type = models.CharField(max_length=20)
+    last_message_preview = models.CharField(max_length=255, blank=True, null=True)
+    last_inbound_at = models.DateTimeField(blank=True, null=True, help_text="When the contact last wrote to us")
+    
+    # Counters
+    message_count = models.PositiveIntegerField(default=0, help_text="Messages in both directions")
+    unprocessed_count = models.PositiveIntegerField(default=0, help_text="Incoming messages not yet processed by the chatbot")
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-last_message_at']
+        constraints = [
+            models.UniqueConstraint(fields=['phone_number_id', 'wa_id'], name='unique_conversation_per_contact'),
+        ]
+        indexes = [
+            models.Index(fields=['-last_message_at']),
+            models.Index(fields=['phone_number_id', '-last_message_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.wa_id} | {self.last_direction} | {self.last_message_at}"
+
+
+class WhatsAppCallSession(models.Model):
+    """One row per call, folded from its connect/terminate WhatsAppCall events"""
+    
+    # Call identification
+    call_id = models.CharField(max_length=255, unique=True, help_text="Unique call ID from WhatsApp")
+    from_number = models.CharField(max_length=50, help_text="Phone number of the caller")
+    to_number = models.CharField(max_length=50, help_text="Phone number being called")
+    wa_id = models.CharField(max_length=50, help_text="WhatsApp ID of the caller")
+    contact_name = models.CharField(max_length=255, blank=True, null=True)
+    direction = models.CharField(max_length=30, choices=WhatsAppCall.CALL_DIRECTIONS, blank=True, null=True)
+    
+    # Outcome
+    status = models.CharField(max_length=20, choices=WhatsAppCall.CALL_STATUSES, blank=True, null=True,
+                              help_text="Final call status (from the terminate event)")
+    first_event_at = models.DateTimeField(help_text="Time of the earliest event of the call")
+    connected_at = models.DateTimeField(blank=True, null=True, help_text="Time of the connect event")
+    terminated_at = models.DateTimeField(blank=True, null=True, help_text="Time of the terminate event")
+    started_at = models.DateTimeField(blank=True, null=True, help_text="Call start time reported by Meta")
+    ended_at = models.DateTimeField(blank=True, null=True, help_text="Call end time reported by Meta")
+    duration = models.IntegerField(blank=True, null=True, help_text="Call duration in seconds")
+    
+    # Session data from the connect event
+    session_sdp = models.TextField(blank=True, null=True, help_text="SDP offer/answer for WebRTC call handling")
+    session_sdp_type = models.CharField(max_length=20, blank=True, null=True, help_text="SDP type: offer or answer")
+    
+    # Metadata
+    phone_number_id = models.CharField(max_length=100, help_text="Meta's phone number ID")
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-first_event_at']
+        indexes = [
+            models.Index(fields=['-first_event_at']),
+            models.Index(fields=['wa_id', '-first_event_at']),
+            models.Index(fields=['status', 'first_event_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.from_number} -> {self.to_number} | {self.status or 'in progress'} | {self.duration or 0}s"
@@ -0,0 +1,216 @@
+"""
+Outgoing message bookkeeping: send results, the retry queue and delivery
+status roll-up.
+
+A failed send whose error is retryable (throttling, 5xx, network trouble)
+stays ``pending`` with ``next_attempt_at`` set on an exponential backoff.
+The ``retry_outgoing_messages`` management command claims due rows in
+batches and resends them. Permanent errors, and retryable ones that run
+out of attempts, end in ``failed``.
+"""
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .archive import archive_on_write
+from .models import WhatsAppOutgoingMessage
+from .services import send_whatsapp_messages
+
+logger = logging.getLogger(__name__)
+
+
+# Columns written back after a send attempt
+SEND_RESULT_FIELDS = [
+    'message_id', 'status', 'api_response', 'api_response_archive', 'error_message', 'sent_at',
+    'attempt_count', 'next_attempt_at', 'updated_at',
+]
+
+
+def retry_delay(attempt_count):
+    """
+    Backoff before the next attempt, with +/-20% jitter so a burst of
+    failures does not come back as a burst of retries.
+
+    Args:
+        attempt_count: Attempts made so far (1 after the first failure)
+
+    Returns:
+        timedelta
+    """
+    delay = min(
+        settings.WHATSAPP_RETRY_MAX_DELAY,
+        settings.WHATSAPP_RETRY_BASE_DELAY * 2 ** max(attempt_count - 1, 0),
+    )
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def record_send_result(outgoing_msg, result, now=None):
+    """
+    Copy a send_whatsapp_message result onto an outgoing message record (unsaved).
+
+    Retryable failures are rescheduled until WHATSAPP_RETRY_MAX_ATTEMPTS
+    attempts have been made. Sends refused by the rate limiter are
+    rescheduled for when a slot is free and do not count as an attempt.
+
+    Returns:
+        str: Resulting status ('sent', 'pending' when a retry is scheduled, or 'failed')
+    """
+    now = now or timezone.now()
+    if result.get('rate_limited'):
+        # Never sent: retry once the rate limiter has a slot, without using up an attempt
+        outgoing_msg.status = 'pending'
+        outgoing_msg.error_message = result.get('error')
+        outgoing_msg.next_attempt_at = now + timedelta(seconds=result['retry_after'])
+        outgoing_msg.updated_at = now
+        return outgoing_msg.status
+
+    outgoing_msg.attempt_count += 1
+    outgoing_msg.api_response = result.get('response')
+    outgoing_msg.updated_at = now
+
+    if result['success']:
+        outgoing_msg.message_id = result['message_id']
+        outgoing_msg.status = 'sent'
+        outgoing_msg.sent_at = now
+        outgoing_msg.error_message = None
+        outgoing_msg.next_attempt_at = None
+    elif result.get('retryable') and outgoing_msg.attempt_count < settings.WHATSAPP_RETRY_MAX_ATTEMPTS:
+        outgoing_msg.status = 'pending'
+        outgoing_msg.error_message = result.get('error')
+        outgoing_msg.next_attempt_at = now + retry_delay(outgoing_msg.attempt_count)
+    else:
+        outgoing_msg.status = 'failed'
+        outgoing_msg.error_message = result.get('error')
+        outgoing_msg.next_attempt_at = None
+
+    return outgoing_msg.status
+
+
+def claim_due_messages(batch_size=100, lease_seconds=300):
+    """
+    Claim pending messages whose retry is due.
+
+    Rows are locked with select_for_update(skip_locked=True) so concurrent
+    workers take disjoint batches, and leased by pushing next_attempt_at
+    forward; a worker that dies mid-batch only delays those rows by the
+    lease.
+
+    Returns:
+        list: Claimed WhatsAppOutgoingMessage instances
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = list(
+            WhatsAppOutgoingMessage.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if claimed:
+            WhatsAppOutgoingMessage.objects.filter(id__in=[msg.id for msg in claimed]).update(
+                next_attempt_at=now + timedelta(seconds=lease_seconds)
+            )
+    return claimed
+
+
+def retry_due_messages(batch_size=100, lease_seconds=300):
+    """
+    Resend one batch of due messages and write the outcomes back in bulk.
+
+    Returns:
+        dict: Counts of claimed, sent, rescheduled and failed messages
+    """
+    claimed = claim_due_messages(batch_size, lease_seconds)
+    counts = {'claimed': len(claimed), 'sent': 0, 'pending': 0, 'failed': 0}
+    if not claimed:
+        return counts
+
+    results = send_whatsapp_messages([(msg.to_number, msg.message_text) for msg in claimed])
+
+    now = timezone.now()
+    for outgoing_msg, result in zip(claimed, results):
+        counts[record_send_result(outgoing_msg, result, now=now)] += 1
+
+    archive_on_write(claimed, 'outgoing')
+    WhatsAppOutgoingMessage.objects.bulk_update(claimed, SEND_RESULT_FIELDS)
+
+    logger.info(
+        f"Retried {counts['claimed']} outgoing messages: {counts['sent']} sent, "
+        f"{counts['pending']} rescheduled, {counts['failed']} failed"
+    )
+    return counts
+
+
+# Position of each status in the delivery lifecycle; a status update only
+# applies if it moves a message forward, so late or redelivered events
+# cannot regress it. read and failed are terminal.
+STATUS_RANK = {
+    'pending': 0,
+    'sent': 1,
+    'delivered': 2,
+    'read': 3,
+    'failed': 3,
+}
+
+ROLLUP_FIELDS = ['status', 'delivered_at', 'read_at', 'error_message', 'updated_at']
+
+
+def roll_up_statuses(statuses):
+    """
+    Advance outgoing messages through pending -> sent -> delivered -> read/failed
+    from a batch of webhook status events.
+
+    Events that would move a message backwards are ignored for the status
+    but still fill in a missing delivered_at/read_at. All matching rows are
+    fetched with one query and written back with one bulk_update; call it
+    inside the ingest transaction.
+
+    Args:
+        statuses: WhatsAppMessageStatus instances from one webhook batch
+
+    Returns:
+        int: Number of outgoing messages changed
+    """
+    by_message = defaultdict(list)
+    for status_obj in statuses:
+        if status_obj.message_id and status_obj.status in STATUS_RANK:
+            by_message[status_obj.message_id].append(status_obj)
+    if not by_message:
+        return 0
+
+    outgoing_msgs = list(
+        WhatsAppOutgoingMessage.objects.select_for_update()
+        .filter(message_id__in=list(by_message))
+        .only('id', 'message_id', 'status', 'delivered_at', 'read_at', 'error_message')
+    )
+
+    now = timezone.now()
+    changed = []
+    for outgoing_msg in outgoing_msgs:
+        updated = False
+        for status_obj in by_message[outgoing_msg.message_id]:
+            event_at = status_obj.event_at or now
+
+            if status_obj.status == 'delivered' and outgoing_msg.delivered_at is None:
+                outgoing_msg.delivered_at = event_at
+                updated = True
+            elif status_obj.status == 'read' and outgoing_msg.read_at is None:
+                outgoing_msg.read_at = event_at
+                updated = True
+
+            if STATUS_RANK[status_obj.status] > STATUS_RANK.get(outgoing_msg.status, 0):
+                outgoing_msg.status = status_obj.status
+                if status_obj.status == 'failed':
+                    errors = (status_obj.payload or {}).get('errors') or [{}]
+                    outgoing_msg.error_message = errors[0].get('title') or errors[0].get('message') or 'Delivery failed'
+                updated = True
+
+        if updated:
+            outgoing_msg.updated_at = now
+            changed.append(outgoing_msg)
+
+    if changed:
+        WhatsAppOutgoingMessage.objects.bulk_update(changed, ROLLUP_FIELDS)
+    return len(changed)
@@ -0,0 +1,247 @@
+"""
+Opt-in request profiling.
+
+Views wrapped with ``profile_request`` run under cProfile, with every SQL
+statement recorded, when either:
+
+- the request carries ``X-Profile-Token: <WHATSAPP_PROFILE_TOKEN>``, or
+- it is picked at random with probability WHATSAPP_PROFILE_SAMPLE_RATE.
+
+Each profiled request writes ``<id>.prof`` (a pstats file) and
+``<id>.json`` (request details and the query list) to
+WHATSAPP_PROFILE_DIR. Only the newest WHATSAPP_PROFILE_MAX_FILES profiles
+are kept. Requests that are not profiled cost one random number and a
+header lookup. Only the request thread is profiled, so work done on a
+worker pool (e.g. send_messages) shows up as waiting.
+
+Async views (WHATSAPP_ASYNC_VIEWS) are profiled on the event loop thread.
+Code run there by other requests while the view awaits is included, and
+the ORM work it hands to threads (in_thread, acreate) shows up as waiting.
+That work's SQL is still recorded, since the recorder is found through a
+context variable that asgiref copies into those threads. Only one request
+per thread can be profiled at a time; one picked while another is being
+profiled runs normally.
+``python manage.py list_profiles`` lists and summarises the profiles.
+"""
+import asyncio
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that records each statement and its duration (no parameters)"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'many': many,
+                'ms': (time.perf_counter() - start) * 1000,
+            })
+
+
+# Recorder of the request being profiled, inherited by the threads it awaits
+active_recorder = ContextVar('active_recorder', default=None)
+# Whether this thread is running a profiler (cProfile allows one per thread)
+_profiling = threading.local()
+
+
+def record_active_queries(execute, sql, params, many, context):
+    """execute_wrapper installed on every connection; records while a profiled request runs"""
+    recorder = active_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_recorder(sender, connection, **kwargs):
+    if record_active_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_active_queries)
+
+
+connection_created.connect(install_recorder)
+
+
+def profile_trigger(request):
+    """
+    Decide whether to profile a request.
+
+    Returns:
+        str: 'header' or 'sample', or None to run the request normally
+    """
+    token = settings.WHATSAPP_PROFILE_TOKEN
+    header = request.headers.get(PROFILE_HEADER)
+    if token and header and hmac.compare_digest(header.encode(), token.encode()):
+        return 'header'
+    rate = settings.WHATSAPP_PROFILE_SAMPLE_RATE
+    if rate > 0 and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def get_profile_dir():
+    return Path(settings.WHATSAPP_PROFILE_DIR)
+
+
+def _rotate(directory, keep):
+    """Delete the oldest profiles beyond keep"""
+    reports = sorted(directory.glob('*.json'))
+    for report in reports[:max(0, len(reports) - keep)]:
+        report.unlink(missing_ok=True)
+        report.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def _save(profile_id, profiler, report):
+    directory = get_profile_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(directory / f"{profile_id}.prof")
+        (directory / f"{profile_id}.json").write_text(json.dumps(report, indent=2))
+        _rotate(directory, settings.WHATSAPP_PROFILE_MAX_FILES)
+    except OSError as e:
+        logger.warning(f"Could not write request profile {profile_id}: {str(e)}")
+
+
+class RequestProfile:
+    """cProfile and query recording for one request"""
+
+    def __init__(self, request, view, trigger):
+        self.request = request
+        self.trigger = trigger
+        self.created = datetime.now(timezone.utc)
+        # DRF's api_view wraps every view in a function called "view"; prefer the URL name
+        match = request.resolver_match
+        self.view_name = (match.url_name if match and match.url_name else None) or view.__name__
+        # Sortable by time, so rotation and listing can go by name
+        self.id = f"{self.created:%Y%m%dT%H%M%S%f}-{self.view_name}-{uuid.uuid4().hex[:6]}"
+        self.recorder = QueryRecorder()
+        self.profiler = cProfile.Profile()
+
+    @classmethod
+    def start(cls, request, view):
+        """
+        Begin profiling a request if profile_trigger picks it.
+
+        Returns:
+            RequestProfile, or None to run the request normally
+        """
+        trigger = profile_trigger(request)
+        if trigger is None:
+            return None
+        if getattr(_profiling, 'active', False):
+            logger.debug(f"Not profiling {request.method} {request.path}: another profile is running")
+            return None
+        _profiling.active = True
+        # Connections opened before this module was imported missed connection_created
+        install_recorder(None, connection)
+        profile = cls(request, view, trigger)
+        profile._token = active_recorder.set(profile.recorder)
+        profile._start = time.perf_counter()
+        profile.profiler.enable()
+        return profile
+
+    def finish(self, response):
+        """Stop profiling and save the profile; response may be None if the view raised"""
+        self.profiler.disable()
+        duration_ms = (time.perf_counter() - self._start) * 1000
+        active_recorder.reset(self._token)
+        _profiling.active = False
+        if response is None:
+            return
+
+        request = self.request
+        queries = self.recorder.queries
+        _save(self.id, self.profiler, {
+            'id': self.id,
+            'created': self.created.isoformat(),
+            'view': self.view_name,
+            'method': request.method,
+            'path': request.path,
+            'trigger': self.trigger,
+            'status_code': response.status_code,
+            'duration_ms': duration_ms,
+            'request_bytes': int(request.META.get('CONTENT_LENGTH') or 0),
+            'query_count': len(queries),
+            'query_ms': sum(query['ms'] for query in queries),
+            'queries': queries,
+        })
+        response['X-Profile-Id'] = self.id
+        logger.info(f"Profiled {request.method} {request.path} ({self.trigger}): {duration_ms:.1f} ms, "
+                    f"{len(queries)} queries -> {self.id}")
+
+
+def profile_request(view):
+    """
+    Decorator profiling a sync or async view when profile_trigger picks the request.
+
+    A profiled response carries an X-Profile-Id header naming its files.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            profile = RequestProfile.start(request, view)
+            if profile is None:
+                return await view(request, *args, **kwargs)
+            response = None
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                profile.finish(response)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        profile = RequestProfile.start(request, view)
+        if profile is None:
+            return view(request, *args, **kwargs)
+        response = None
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            profile.finish(response)
+        return response
+
+    return wrapper
+
+
+def load_reports(directory=None):
+    """
+    Read the saved profile reports, oldest first.
+
+    Returns:
+        list: Report dicts
+    """
+    directory = directory or get_profile_dir()
+    reports = []
+    for path in sorted(directory.glob('*.json')) if directory.is_dir() else []:
+        try:
+            reports.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return reports
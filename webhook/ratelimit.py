@@ -0,0 +1,164 @@
+"""
+Outbound message rate limiting.
+
+Meta enforces a messages-per-second tier per business phone number and a
+much lower per-recipient "pair" rate. Every send reserves a token from two
+buckets (the sender's WHATSAPP_PHONE_NUMBER_ID and the sender/recipient
+pair) and sleeps until its reservation comes due, so bursts are paced
+instead of coming back as 429 / 131056 errors. A send that would have to
+wait longer than WHATSAPP_RATE_LIMIT_MAX_WAIT reserves nothing and raises
+RateLimited instead, so a burst neither holds a worker for minutes nor
+leaves later callers a debt to wait out.
+
+Bucket state lives in a small SQLite file (WHATSAPP_RATE_LIMIT_DB) so all
+worker processes on a host share the same budget. Reservations run in a
+BEGIN IMMEDIATE transaction, which serialises them across processes.
+"""
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Pair buckets idle for this long are full again and can be dropped
+_IDLE_BUCKET_SECONDS = 3600
+
+
+class RateLimited(Exception):
+    """No send slot within WHATSAPP_RATE_LIMIT_MAX_WAIT; nothing was reserved"""
+
+    def __init__(self, wait):
+        super().__init__(f"Rate limited: next send slot in {wait:.1f}s")
+        self.wait = wait
+
+
+class TokenBucketStore:
+    """Token buckets persisted in a SQLite file shared between processes"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, limits, now=None, max_wait=None):
+        """
+        Take one token from each bucket, borrowing against future refills.
+
+        Args:
+            limits: List of (key, rate per second, burst size) tuples
+            now: Current time in seconds since the epoch (default: time.time())
+            max_wait: Longest acceptable wait in seconds; past it no token is
+                taken (default: no limit)
+
+        Returns:
+            float: Seconds the caller must wait before sending; if above
+            max_wait, nothing was reserved
+        """
+        now = time.time() if now is None else now
+        conn = self._connection()
+        wait = 0.0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            taken = []
+            for key, rate, burst in limits:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                tokens -= 1
+                taken.append((key, tokens, now))
+                if tokens < 0:
+                    wait = max(wait, -tokens / rate)
+            if max_wait is not None and wait > max_wait:
+                conn.execute('ROLLBACK')
+                return wait
+            conn.executemany(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                taken,
+            )
+            if random.random() < 0.001:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - _IDLE_BUCKET_SECONDS,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide TokenBucketStore for WHATSAPP_RATE_LIMIT_DB"""
+    global _store
+    path = str(settings.WHATSAPP_RATE_LIMIT_DB)
+    if _store is None or _store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                _store = TokenBucketStore(path)
+    return _store
+
+
+def send_limits(to_number):
+    """Bucket limits that apply to a message from our phone number to to_number"""
+    sender = settings.WHATSAPP_PHONE_NUMBER_ID
+    return [
+        (f"sender:{sender}", settings.WHATSAPP_RATE_LIMIT_MPS, settings.WHATSAPP_RATE_LIMIT_BURST),
+        (f"pair:{sender}:{to_number}", settings.WHATSAPP_PAIR_RATE_LIMIT_PER_MINUTE / 60,
+         settings.WHATSAPP_PAIR_RATE_LIMIT_BURST),
+    ]
+
+
+def reserve_send(to_number):
+    """
+    Reserve a send slot for to_number.
+
+    Returns:
+        float: Seconds to wait before sending (0 when rate limiting is disabled)
+
+    Raises:
+        RateLimited: if the wait would exceed WHATSAPP_RATE_LIMIT_MAX_WAIT
+    """
+    if not settings.WHATSAPP_RATE_LIMIT_ENABLED:
+        return 0.0
+    max_wait = settings.WHATSAPP_RATE_LIMIT_MAX_WAIT
+    try:
+        wait = get_store().reserve(send_limits(to_number), max_wait=max_wait)
+    except sqlite3.Error as e:
+        # Never block sends on the limiter itself; Meta still enforces its limits
+        logger.error(f"Rate limiter unavailable, sending unthrottled: {str(e)}")
+        return 0.0
+    if wait > max_wait:
+        raise RateLimited(wait)
+    return wait
+
+
+def throttle(to_number):
+    """Block until a message to to_number may be sent; raises RateLimited past the maximum wait"""
+    wait = reserve_send(to_number)
+    if wait > 0:
+        logger.debug(f"Rate limit: delaying send to {to_number} by {wait:.3f}s")
+        time.sleep(wait)
+
+
+async def athrottle(to_number):
+    """Async version of throttle that waits without blocking the event loop"""
+    wait = await asyncio.to_thread(reserve_send, to_number)
+    if wait > 0:
+        logger.debug(f"Rate limit: delaying send to {to_number} by {wait:.3f}s")
+        await asyncio.sleep(wait)
@@ -0,0 +1,314 @@
+"""
+Replay of stored webhook traffic.
+
+Webhook envelopes are rebuilt from the stored messages, statuses and calls
+(their raw payloads plus contact and metadata columns), read back from the
+webhook inbox exactly as Meta delivered them, or loaded from a journal
+file. They are then posted to a webhook URL as fast as possible, at a fixed
+rate, or with the original spacing compressed by a speed-up factor. Used by
+``python manage.py replay_webhooks`` for capacity tests against a new build.
+
+A journal is a JSON-lines file with one ``{"at": <ISO time or null>,
+"payload": {...}}`` object per request; lines holding a bare webhook
+payload are accepted too.
+"""
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+import requests
+from .models import WebhookInboxEntry, WhatsAppCall, WhatsAppMessage, WhatsAppMessageStatus
+from .signature import SIGNATURE_HEADER, sign_body
+from .utils import build_webhook_envelope, percentile
+
+logger = logging.getLogger(__name__)
+
+
+# Stored item kind -> (model, change field, key of the change value, extra columns read)
+REPLAY_SOURCES = {
+    'messages': (WhatsAppMessage, 'messages', 'messages', ('wa_id', 'contact_name')),
+    'statuses': (WhatsAppMessageStatus, 'messages', 'statuses', ()),
+    'calls': (WhatsAppCall, 'calls', 'calls', ('wa_id', 'contact_name')),
+}
+
+
+@dataclass
+class Envelope:
+    """One webhook request to replay"""
+    at: datetime = None
+    payload: dict = None
+    # Exact request body, when it is replayed byte for byte (inbox entries)
+    body: bytes = None
+    items: int = 0
+
+    def encode(self):
+        return self.body if self.body is not None else json.dumps(self.payload).encode()
+
+
+def count_items(payload):
+    """Number of messages, statuses and calls in a webhook payload"""
+    return sum(
+        len(change.get('value', {}).get(key, []))
+        for entry in payload.get('entry', [])
+        for change in entry.get('changes', [])
+        for key in ('messages', 'statuses', 'calls')
+    )
+
+
+def _stored_items(kind, since=None, until=None, batch_size=1000):
+    """Yield (created_at, kind, row) for stored rows of one kind in arrival order"""
+    model, _, _, extra = REPLAY_SOURCES[kind]
+    queryset = model.objects.select_related('raw_payload_archive').only(
+        'id', 'created_at', 'phone_number_id', 'display_phone_number', 'raw_payload',
+        'raw_payload_archive__codec', 'raw_payload_archive__data', *extra,
+    )
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    for row in queryset.order_by('created_at', 'id').iterator(chunk_size=batch_size):
+        yield row.created_at, kind, row
+
+
+def _envelope_from_rows(kind, rows):
+    _, field, key, extra = REPLAY_SOURCES[kind]
+    first = rows[0]
+    value = {
+        'metadata': {
+            'display_phone_number': first.display_phone_number,
+            'phone_number_id': first.phone_number_id,
+        },
+    }
+    if extra:
+        contacts = {row.wa_id: row.contact_name for row in rows if row.wa_id}
+        value['contacts'] = [{'profile': {'name': name or ''}, 'wa_id': wa_id} for wa_id, name in contacts.items()]
+    value[key] = [row.payload for row in rows]
+    return Envelope(at=first.created_at, payload=build_webhook_envelope(field, value), items=len(rows))
+
+
+def envelopes_from_rows(kinds=None, since=None, until=None, batch_size=1, limit=None):
+    """
+    Rebuild webhook envelopes from stored messages, statuses and calls.
+
+    The tables are merged in arrival (created_at) order. Consecutive items of
+    the same kind and phone number are packed into one envelope, up to
+    batch_size items.
+
+    Args:
+        kinds: Keys of REPLAY_SOURCES to include (default: all)
+        since, until: Optional created_at bounds
+        batch_size: Items per envelope
+        limit: Maximum number of envelopes
+
+    Yields:
+        Envelope
+    """
+    streams = [_stored_items(kind, since, until) for kind in kinds or REPLAY_SOURCES]
+    merged = heapq.merge(*streams, key=lambda item: item[0])
+    pending, pending_key, produced = [], None, 0
+    for _, kind, row in merged:
+        key = (kind, row.phone_number_id)
+        if pending and (key != pending_key or len(pending) >= batch_size):
+            yield _envelope_from_rows(pending_key[0], pending)
+            produced += 1
+            if limit and produced >= limit:
+                return
+            pending = []
+        pending.append(row)
+        pending_key = key
+    if pending:
+        yield _envelope_from_rows(pending_key[0], pending)
+
+
+def envelopes_from_inbox(since=None, until=None, limit=None, batch_size=500):
+    """
+    Yield the raw webhook bodies kept in the inbox, in arrival order.
+
+    Yields:
+        Envelope with the original body bytes
+    """
+    queryset = WebhookInboxEntry.objects.order_by('id').only('id', 'body', 'received_at')
+    if since:
+        queryset = queryset.filter(received_at__gte=since)
+    if until:
+        queryset = queryset.filter(received_at__lt=until)
+    if limit:
+        queryset = queryset[:limit]
+    for entry in queryset.iterator(chunk_size=batch_size):
+        body = bytes(entry.body)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = {}
+        yield Envelope(at=entry.received_at, payload=payload, body=body, items=count_items(payload))
+
+
+def envelopes_from_journal(path, limit=None):
+    """
+    Yield envelopes from a JSON-lines journal written by write_journal.
+
+    Yields:
+        Envelope
+    """
+    with open(path) as f:
+        for produced, line in enumerate(line for line in f if line.strip()):
+            if limit and produced >= limit:
+                return
+            record = json.loads(line)
+            if 'payload' in record:
+                at = datetime.fromisoformat(record['at']) if record.get('at') else None
+                payload = record['payload']
+            else:
+                at, payload = None, record
+            yield Envelope(at=at, payload=payload, items=count_items(payload))
+
+
+def write_journal(envelopes, path):
+    """
+    Save envelopes as a JSON-lines journal.
+
+    Returns:
+        int: Number of envelopes written
+    """
+    written = 0
+    with open(path, 'w') as f:
+        for envelope in envelopes:
+            payload = envelope.payload if envelope.body is None else json.loads(envelope.body)
+            record = {'at': envelope.at.isoformat() if envelope.at else None, 'payload': payload}
+            f.write(json.dumps(record) + '\n')
+            written += 1
+    return written
+
+
+def with_unique_ids(envelopes, suffix):
+    """
+    Append suffix to every message, status and call id, so a replay against
+    a database that already holds the originals is not dropped as redelivery.
+    """
+    for envelope in envelopes:
+        payload = envelope.payload if envelope.body is None else json.loads(envelope.body)
+        for entry in payload.get('entry', []):
+            for change in entry.get('changes', []):
+                value = change.get('value', {})
+                for key in ('messages', 'statuses', 'calls'):
+                    if key in value:
+                        value[key] = [{**item, 'id': f"{item.get('id')}{suffix}"} for item in value[key]]
+        yield Envelope(at=envelope.at, payload=payload, items=envelope.items)
+
+
+class ReplayReport:
+    """Thread-safe tally of replayed requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.items = 0
+        self.errors = Counter()
+        self.max_lag = 0.0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, latency, items, error=None):
+        with self._lock:
+            self.latencies.append(latency)
+            self.items += items
+            if error:
+                self.errors[error] += 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        requests_sent = len(self.latencies)
+        return {
+            'requests': requests_sent,
+            'items': self.items,
+            'ok': requests_sent - sum(self.errors.values()),
+            'errors': dict(self.errors.most_common()),
+            'elapsed_s': elapsed,
+            'req_per_sec': requests_sent / elapsed if elapsed else 0.0,
+            'items_per_sec': self.items / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p95_ms': percentile(self.latencies, 95) * 1000,
+            'p99_ms': percentile(self.latencies, 99) * 1000,
+            'max_ms': max(self.latencies, default=0.0) * 1000,
+            # How far sending fell behind the requested schedule
+            'max_lag_ms': self.max_lag * 1000,
+        }
+
+
+def replay(envelopes, url, rate=None, speedup=None, concurrency=4, timeout=30, headers=None, secret=None):
+    """
+    Post envelopes to a webhook URL.
+
+    Args:
+        envelopes: Iterable of Envelope
+        url: Webhook URL
+        rate: Requests per second; None or 0 sends as fast as possible
+        speedup: Keep the original spacing of the envelopes, divided by this
+            factor (e.g. 60 replays an hour in a minute); overrides rate
+        concurrency: Number of sending threads
+        timeout: Per-request timeout in seconds
+        headers: Extra request headers
+        secret: App secret to sign each body with (X-Hub-Signature-256)
+
+    Returns:
+        dict: ReplayReport summary
+    """
+    report = ReplayReport()
+    local = threading.local()
+    request_headers = {'Content-Type': 'application/json', **(headers or {})}
+    # Bound the envelopes waiting for a sender so a slow target does not pile up memory
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def send(envelope):
+        try:
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            start = time.perf_counter()
+            error = None
+            try:
+                body = envelope.encode()
+                envelope_headers = request_headers
+                if secret:
+                    envelope_headers = {**request_headers, SIGNATURE_HEADER: sign_body(body, secret)}
+                response = session.post(url, data=body, headers=envelope_headers, timeout=timeout)
+                if response.status_code >= 400:
+                    error = f"HTTP {response.status_code}"
+            except requests.exceptions.RequestException as e:
+                error = type(e).__name__
+            report.record(time.perf_counter() - start, envelope.items, error)
+        finally:
+            slots.release()
+
+    first_at = None
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as pool:
+        report.started = time.perf_counter()
+        for index, envelope in enumerate(envelopes):
+            due = None
+            if speedup:
+                if envelope.at is not None:
+                    first_at = first_at or envelope.at
+                    due = report.started + (envelope.at - first_at).total_seconds() / speedup
+            elif rate:
+                due = report.started + index / rate
+            if due is not None:
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            if due is not None:
+                report.max_lag = max(report.max_lag, time.perf_counter() - due)
+            pool.submit(send, envelope)
+    report.finished = time.perf_counter()
+
+    summary = report.summary()
+    logger.info(
+        f"Replayed {summary['requests']} requests ({summary['items']} items) in {summary['elapsed_s']:.1f}s: "
+        f"{summary['req_per_sec']:.1f} req/s, {sum(summary['errors'].values())} errors"
+    )
+    return summary
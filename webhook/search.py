@@ -0,0 +1,180 @@
+"""
+Full-text search over incoming messages.
+
+Message text, media captions, document filenames and contact names are
+indexed so searches do not scan the message table. The backend is chosen
+with WHATSAPP_SEARCH_BACKEND (a dotted path); by default SQLite databases
+use an FTS5 index and other databases fall back to icontains lookups.
+Plug in a backend for another engine by subclassing SearchBackend.
+
+Ingest keeps the index up to date inside its transaction;
+``python manage.py rebuild_search_index`` regenerates it.
+"""
+import logging
+import re
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import WhatsAppMessage
+
+logger = logging.getLogger(__name__)
+
+
+def searchable_text(message):
+    """Text of a message that goes into the index: body, caption and filename"""
+    parts = [message.message_text]
+    attachment = message.get_attachment()
+    if attachment is not None:
+        parts += [attachment.caption, attachment.filename]
+    return ' '.join(part for part in parts if part)
+
+
+class SearchBackend:
+    """Interface of a message search backend"""
+
+    def index_messages(self, messages):
+        """Add or refresh the index entries of stored messages"""
+
+    def search(self, query, limit=50, wa_id=None):
+        """
+        Find messages matching a free-text query.
+
+        Args:
+            query: Words to search for; the last one matches as a prefix
+            limit: Maximum number of ids returned
+            wa_id: Optionally restrict to one contact
+
+        Returns:
+            list: WhatsAppMessage ids, best match first
+        """
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=2000):
+        """Regenerate the whole index; returns the number of messages indexed"""
+        return 0
+
+
+class IContainsSearchBackend(SearchBackend):
+    """Fallback that keeps no index and scans with icontains (small databases only)"""
+
+    def search(self, query, limit=50, wa_id=None):
+        queryset = WhatsAppMessage.objects.all()
+        if wa_id:
+            queryset = queryset.filter(wa_id=wa_id)
+        for word in query.split():
+            queryset = queryset.filter(
+                Q(message_text__icontains=word)
+                | Q(contact_name__icontains=word)
+                | Q(attachment__caption__icontains=word)
+                | Q(attachment__filename__icontains=word)
+            )
+        return list(queryset.order_by('-created_at').values_list('id', flat=True)[:limit])
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 index keyed by WhatsAppMessage id (the FTS rowid).
+
+    The virtual table is created by migration 0019 on SQLite databases.
+    """
+    table = 'webhook_message_fts'
+
+    @staticmethod
+    def match_expression(query):
+        """Quote each word so user input cannot inject FTS5 query syntax"""
+        words = re.findall(r'\w+', query)
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def _write(self, rows):
+        """Replace the index entries for (id, body, contact_name) rows"""
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, body, contact_name) VALUES (%s, %s, %s)', rows
+            )
+
+    def index_messages(self, messages):
+        texts = {message.message_id: (searchable_text(message), message.contact_name or '') for message in messages}
+        if not texts:
+            return
+        # Upserted messages carry no pk, so look the ids up in one query
+        ids = WhatsAppMessage.objects.filter(message_id__in=list(texts)).values_list('message_id', 'id')
+        self._write([(pk, *texts[message_id]) for message_id, pk in ids])
+
+    def search(self, query, limit=50, wa_id=None):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        sql = f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s'
+        params = [expression]
+        if wa_id:
+            sql += f' AND rowid IN (SELECT id FROM {WhatsAppMessage._meta.db_table} WHERE wa_id = %s)'
+            params.append(wa_id)
+        sql += ' ORDER BY rank LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, batch_size=2000):
+        messages = WhatsAppMessage.objects.order_by('id').select_related('attachment').only(
+            'id', 'message_type', 'message_text', 'contact_name', 'attachment__caption', 'attachment__filename',
+        )
+        total = 0
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table}')
+            rows = []
+            for message in messages.iterator(chunk_size=batch_size):
+                rows.append((message.id, searchable_text(message), message.contact_name or ''))
+                if len(rows) >= batch_size:
+                    self._write(rows)
+                    total += len(rows)
+                    rows = []
+            if rows:
+                self._write(rows)
+                total += len(rows)
+        logger.info(f"Rebuilt search index for {total} messages")
+        return total
+
+
+_backend = None
+_backend_path = None
+
+
+def get_search_backend():
+    """Return the configured search backend instance"""
+    global _backend, _backend_path
+    path = settings.WHATSAPP_SEARCH_BACKEND
+    if not path:
+        path = (
+            'webhook.search.SQLiteFTSSearchBackend' if connection.vendor == 'sqlite'
+            else 'webhook.search.IContainsSearchBackend'
+        )
+    if _backend is None or _backend_path != path:
+        _backend = import_string(path)()
+        _backend_path = path
+    return _backend
+
+
+def index_messages(messages):
+    """Index freshly stored messages; call inside the ingest transaction"""
+    if messages:
+        get_search_backend().index_messages(messages)
+
+
+def search_messages(query, limit=50, wa_id=None):
+    """
+    Search incoming messages.
+
+    Returns:
+        list: WhatsAppMessage instances (without raw_payload), best match first
+    """
+    ids = get_search_backend().search(query, limit=limit, wa_id=wa_id)
+    found = WhatsAppMessage.objects.defer('raw_payload').select_related('attachment').in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
@@ -1,40 +1,134 @@
 """
 Service functions for WhatsApp Business API operations
 """
+import asyncio
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 import logging
+from .metrics import record_send
+from .ratelimit import RateLimited, athrottle, throttle
 
 logger = logging.getLogger(__name__)
 
 
-def send_whatsapp_message(to_number, message_text, message_type='text'):
+class GraphAPIClient:
     """
-    Send a message via WhatsApp Business API
-    
-    Args:
-        to_number: Recipient phone number (with country code, e.g., 918279486865)
-        message_text: Text content to send
-        message_type: Type of message (text, image, etc.)
-    
-    Returns:
-        dict: {'success': True/False, 'message_id': '...', 'error': '...', 'response': {...}}
+    Shared HTTP client for the Graph API.
+
+    Wraps a requests.Session with a sized connection pool, so sends reuse
+    keep-alive connections (and their TLS sessions) to graph.facebook.com
+    instead of opening a new one per message. The auth headers are built
+    once. requests sessions are safe to share between threads for plain
+    request/response calls like these.
     """
-    if not settings.WHATSAPP_ACCESS_TOKEN or not settings.WHATSAPP_PHONE_NUMBER_ID:
-        error_msg = "WhatsApp API credentials not configured. Please set WHATSAPP_ACCESS_TOKEN and WHATSAPP_PHONE_NUMBER_ID in .env"
-        logger.error(error_msg)
-        return {
-            'success': False,
-            'error': error_msg
-        }
-    
-    url = f"{settings.WHATSAPP_API_BASE_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
-    
-    headers = {
-        'Authorization': f'Bearer {settings.WHATSAPP_ACCESS_TOKEN}',
+
+    def __init__(self, base_url, access_token, pool_size, connect_timeout, read_timeout):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(_auth_headers(access_token))
+
+    def post(self, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(f"{self.base_url}/{path}", **kwargs)
+
+    def get(self, path_or_url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        url = path_or_url if '://' in path_or_url else f"{self.base_url}/{path_or_url}"
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _auth_headers(access_token):
+    return {
+        'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
     }
-    
+
+
+def _client_config():
+    return (
+        settings.WHATSAPP_API_BASE_URL,
+        settings.WHATSAPP_ACCESS_TOKEN,
+        settings.WHATSAPP_HTTP_POOL_SIZE,
+        settings.WHATSAPP_HTTP_CONNECT_TIMEOUT,
+        settings.WHATSAPP_HTTP_READ_TIMEOUT,
+        settings.WHATSAPP_HTTP_POOL_TIMEOUT,
+    )
+
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+# httpx.AsyncClient is bound to the event loop it was first used on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_graph_client():
+    """
+    Return the process-wide GraphAPIClient.
+
+    The client is rebuilt if the WhatsApp API settings change (e.g. under
+    override_settings in tests).
+    """
+    global _client, _client_key
+    key = _client_config()
+    if _client is None or _client_key != key:
+        with _client_lock:
+            if _client is None or _client_key != key:
+                base_url, access_token, pool_size, connect_timeout, read_timeout, _ = key
+                if _client is not None:
+                    _client.close()
+                _client = GraphAPIClient(base_url, access_token, pool_size, connect_timeout, read_timeout)
+                _client_key = key
+    return _client
+
+
+def get_async_graph_client():
+    """Return the pooled httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    key = _client_config()
+    entry = _async_clients.get(loop)
+    if entry is None or entry[0] != key:
+        base_url, access_token, pool_size, connect_timeout, read_timeout, pool_timeout = key
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=_auth_headers(access_token),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout),
+        )
+        if entry is not None:
+            loop.create_task(entry[1].aclose())
+        _async_clients[loop] = (key, client)
+        return client
+    return entry[1]
+
+
+def _build_send_request(to_number, message_text, message_type):
+    """
+    Build the Graph API request for sending a message.
+
+    Returns:
+        tuple: (path relative to WHATSAPP_API_BASE_URL, payload), or None if credentials are missing
+    """
+    if not settings.WHATSAPP_ACCESS_TOKEN or not settings.WHATSAPP_PHONE_NUMBER_ID:
+        return None
+
+    path = f"{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+
     payload = {
         "messaging_product": "whatsapp",
         "to": to_number,
@@ -43,45 +137,227 @@ def send_whatsapp_message(to_number, message_text, message_type='text'):
             "body": message_text
         }
     }
-    
+
+    return path, payload
+
+
+# Graph API error codes caused by throttling or transient upstream trouble;
+# other error codes (bad recipient, expired token, invalid payload) are permanent
+RETRYABLE_ERROR_CODES = {
+    1,       # API unknown error
+    2,       # API service temporarily unavailable
+    4,       # API too many calls
+    17,      # API user too many calls
+    80007,   # WhatsApp Business Account rate limit
+    130429,  # Cloud API throughput reached
+    131000,  # Something went wrong
+    131016,  # Service unavailable
+    131048,  # Spam rate limit hit
+    131056,  # Pair rate limit hit
+    133004,  # Server temporarily unavailable
+}
+
+
+def is_retryable_error(status_code, error_code):
+    """
+    Decide whether a failed send is worth retrying.
+
+    Args:
+        status_code: HTTP status of the Graph API response, None if no response arrived
+        error_code: Graph API error code from the response body, if any
+
+    Returns:
+        bool
+    """
+    if error_code in RETRYABLE_ERROR_CODES:
+        return True
+    if status_code is None:
+        # Connection errors and timeouts
+        return True
+    return status_code == 429 or status_code >= 500
+
+
+def _graph_error_code(response_data):
+    if isinstance(response_data, dict):
+        return (response_data.get('error') or {}).get('code')
+    return None
+
+
+def _credentials_error():
+    error_msg = "WhatsApp API credentials not configured. Please set WHATSAPP_ACCESS_TOKEN and WHATSAPP_PHONE_NUMBER_ID in .env"
+    logger.error(error_msg)
+    return {
+        'success': False,
+        'error': error_msg,
+        'retryable': False,
+    }
+
+
+def _success_result(data, to_number):
+    message_id = data.get('messages', [{}])[0].get('id')
+
+    logger.info(f"Message sent successfully: {message_id} to {to_number}")
+
+    return {
+        'success': True,
+        'message_id': message_id,
+        'response': data
+    }
+
+
+def _error_result(error_msg, response=None, status_code=None, retryable=None, exc_info=False):
+    logger.error(f"Failed to send message: {error_msg}", exc_info=exc_info)
+    error_code = _graph_error_code(response)
+    result = {
+        'success': False,
+        'error': error_msg,
+        'status_code': status_code,
+        'error_code': error_code,
+        'retryable': is_retryable_error(status_code, error_code) if retryable is None else retryable,
+    }
+    if response is not None:
+        result['response'] = response
+    return result
+
+
+def _rate_limited_result(error):
+    """Send result for a message refused by our own rate limiter; it was never sent"""
+    logger.warning(f"Send not attempted: {str(error)}")
+    return {
+        'success': False,
+        'error': str(error),
+        'status_code': None,
+        'error_code': None,
+        'retryable': True,
+        'rate_limited': True,
+        'retry_after': error.wait,
+    }
+
+
+def _http_error_result(status_code, text, content):
+    try:
+        response_data = json.loads(content) if content else None
+    except ValueError:
+        response_data = None
+    return _error_result(
+        f"HTTP Error: {status_code} - {text}",
+        response=response_data,
+        status_code=status_code,
+    )
+
+
+def send_whatsapp_message(to_number, message_text, message_type='text'):
+    """
+    Send a message via WhatsApp Business API
+
+    Args:
+        to_number: Recipient phone number (with country code, e.g., 918279486865)
+        message_text: Text content to send
+        message_type: Type of message (text, image, etc.)
+
+    Returns:
+        dict: {'success': True/False, 'message_id': '...', 'error': '...', 'response': {...}}
+        Failures also carry 'status_code', 'error_code' and 'retryable'; sends
+        refused by the rate limiter carry 'rate_limited' and 'retry_after' (seconds).
+    """
+    request_parts = _build_send_request(to_number, message_text, message_type)
+    if request_parts is None:
+        return _credentials_error()
+    path, payload = request_parts
+
+    # Queue behind Meta's throughput and pair rate limits instead of failing
+    try:
+        throttle(to_number)
+    except RateLimited as e:
+        result = _rate_limited_result(e)
+        record_send(message_type, result, 0.0)
+        return result
+
+    start = time.perf_counter()
+    result = _post_send(path, payload, to_number)
+    record_send(message_type, result, time.perf_counter() - start)
+    return result
+
+
+def _post_send(path, payload, to_number):
+    """POST a send request to the Graph API and turn the response into a send result"""
     try:
         logger.info(f"Attempting to send message to {to_number}")
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = get_graph_client().post(path, json=payload)
         response.raise_for_status()
-        data = response.json()
-        
-        message_id = data.get('messages', [{}])[0].get('id')
-        
-        logger.info(f"Message sent successfully: {message_id} to {to_number}")
-        
-        return {
-            'success': True,
-            'message_id': message_id,
-            'response': data
-        }
-    
+        return _success_result(response.json(), to_number)
+
     except requests.exceptions.HTTPError as e:
-        error_msg = f"HTTP Error: {e.response.status_code} - {e.response.text}"
-        logger.error(f"Failed to send message: {error_msg}")
-        return {
-            'success': False,
-            'error': error_msg,
-            'response': e.response.json() if e.response.content else None
-        }
-    
+        return _http_error_result(e.response.status_code, e.response.text, e.response.content)
+
     except requests.exceptions.RequestException as e:
-        error_msg = f"Request Error: {str(e)}"
-        logger.error(f"Failed to send message: {error_msg}")
-        return {
-            'success': False,
-            'error': error_msg
-        }
-    
+        return _error_result(f"Request Error: {str(e)}", retryable=True)
+
     except Exception as e:
-        error_msg = f"Unexpected Error: {str(e)}"
-        logger.error(f"Failed to send message: {error_msg}", exc_info=True)
-        return {
-            'success': False,
-            'error': error_msg
-        }
+        return _error_result(f"Unexpected Error: {str(e)}", retryable=False, exc_info=True)
+
+
+def send_whatsapp_messages(items, max_workers=None):
+    """
+    Send many messages concurrently over the shared Graph API client.
+
+    Args:
+        items: List of (to_number, message_text) tuples
+        max_workers: Maximum concurrent sends (default: WHATSAPP_SEND_CONCURRENCY)
+
+    Returns:
+        list: send_whatsapp_message results, in the same order as items
+    """
+    if not items:
+        return []
+    max_workers = min(max_workers or settings.WHATSAPP_SEND_CONCURRENCY, len(items))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='whatsapp-send') as pool:
+        return list(pool.map(lambda item: send_whatsapp_message(*item), items))
+
+
+async def asend_whatsapp_message(to_number, message_text, message_type='text'):
+    """
+    Async version of send_whatsapp_message using a non-blocking HTTP client.
 
+    Args:
+        to_number: Recipient phone number (with country code, e.g., 918279486865)
+        message_text: Text content to send
+        message_type: Type of message (text, image, etc.)
+
+    Returns:
+        dict: Same shape as send_whatsapp_message
+    """
+    request_parts = _build_send_request(to_number, message_text, message_type)
+    if request_parts is None:
+        return _credentials_error()
+    path, payload = request_parts
+
+    try:
+        await athrottle(to_number)
+    except RateLimited as e:
+        result = _rate_limited_result(e)
+        record_send(message_type, result, 0.0)
+        return result
+
+    start = time.perf_counter()
+    result = await _apost_send(path, payload, to_number)
+    record_send(message_type, result, time.perf_counter() - start)
+    return result
+
+
+async def _apost_send(path, payload, to_number):
+    """Async version of _post_send"""
+    try:
+        logger.info(f"Attempting to send message to {to_number}")
+        response = await get_async_graph_client().post(path, json=payload)
+        response.raise_for_status()
+        return _success_result(response.json(), to_number)
+
+    except httpx.HTTPStatusError as e:
+        return _http_error_result(e.response.status_code, e.response.text, e.response.content)
+
+    except httpx.RequestError as e:
+        return _error_result(f"Request Error: {str(e)}", retryable=True)
+
+    except Exception as e:
+        return _error_result(f"Unexpected Error: {str(e)}", retryable=False, exc_info=True)
@@ -0,0 +1,110 @@
+"""
+Early rejection of webhook POSTs that are too large or not signed by Meta.
+
+Meta signs every delivery with ``X-Hub-Signature-256: sha256=<hex HMAC of
+the raw body, keyed with the app secret>``. The checks here run on the raw
+request, before the body is parsed, logged or queued in the inbox:
+
+1. A Content-Length above WHATSAPP_WEBHOOK_MAX_BODY_BYTES is refused before
+   the body is read.
+2. With WHATSAPP_APP_SECRET set, the signature is verified over the body.
+   WHATSAPP_VERIFY_SIGNATURES=False turns this off explicitly. Without a
+   secret and without that setting, deliveries are accepted unverified, and
+   both the system check below and the first such delivery warn about it.
+
+Rejected requests are counted by reason in the
+``whatsapp_webhook_rejections_total`` metric.
+"""
+import hashlib
+import hmac
+import logging
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.http import JsonResponse
+from .metrics import WEBHOOK_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+SIGNATURE_HEADER = 'X-Hub-Signature-256'
+SIGNATURE_PREFIX = 'sha256='
+
+
+# Whether the unverified-delivery warning has been logged in this process
+_warned_unverified = False
+
+
+@register()
+def check_app_secret(app_configs, **kwargs):
+    """System check: signature verification is on but there is no secret to verify with"""
+    if settings.WHATSAPP_VERIFY_SIGNATURES and not settings.WHATSAPP_APP_SECRET:
+        return [Warning(
+            'WHATSAPP_APP_SECRET is not set, so webhook signatures are not verified '
+            'and anyone can post deliveries to /webhook/.',
+            hint='Set WHATSAPP_APP_SECRET to the Meta app secret, or set '
+                 'WHATSAPP_VERIFY_SIGNATURES=False to accept unsigned deliveries on purpose.',
+            id='webhook.W001',
+        )]
+    return []
+
+
+def _signing_secret():
+    """The secret to verify deliveries with, or '' when they are accepted unverified"""
+    global _warned_unverified
+    if not settings.WHATSAPP_VERIFY_SIGNATURES:
+        return ''
+    secret = settings.WHATSAPP_APP_SECRET
+    if not secret and not _warned_unverified:
+        _warned_unverified = True
+        logger.warning("Accepting unsigned webhook POSTs: WHATSAPP_APP_SECRET is not set "
+                       "(set WHATSAPP_VERIFY_SIGNATURES=False if this is intended)")
+    return secret
+
+
+def sign_body(body, secret):
+    """X-Hub-Signature-256 header value for a raw body"""
+    return SIGNATURE_PREFIX + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def _declared_length(request):
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None
+
+
+def _reject(reason, message, status):
+    WEBHOOK_REJECTIONS.inc(reason=reason)
+    logger.warning(f"Rejected webhook POST: {message}")
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def reject_webhook_request(request):
+    """
+    Check a webhook POST before anything else is done with it.
+
+    Args:
+        request: Django HttpRequest of the webhook POST
+
+    Returns:
+        JsonResponse rejecting the request, or None if it may be processed
+    """
+    max_bytes = settings.WHATSAPP_WEBHOOK_MAX_BODY_BYTES
+    length = _declared_length(request)
+    if length is None:
+        return _reject('bad_length', 'Invalid Content-Length', 400)
+    if max_bytes and length > max_bytes:
+        return _reject('too_large', f'Payload larger than {max_bytes} bytes', 413)
+
+    secret = _signing_secret()
+    signature = request.headers.get(SIGNATURE_HEADER, '')
+    if secret and not signature.startswith(SIGNATURE_PREFIX):
+        return _reject('missing_signature', 'Missing signature', 401)
+
+    body = request.body
+    if max_bytes and len(body) > max_bytes:
+        # Chunked bodies have no Content-Length to check up front
+        return _reject('too_large', f'Payload larger than {max_bytes} bytes', 413)
+    if secret and not hmac.compare_digest(signature.encode(), sign_body(body, secret).encode()):
+        return _reject('bad_signature', 'Invalid signature', 401)
+    return None
@@ -0,0 +1,309 @@
+import hashlib
+import inspect
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from whatsapp_webhook.dispatch import COPIED_LOAD_MIDDLEWARE_SHA256, LeanWSGIHandler
+from .metrics import STAGE_SECONDS
+from .models import Conversation, WebhookInboxEntry, WebhookSeenKey, WhatsAppMessage, WhatsAppMessageStatus
+from .profiling import load_reports, profile_request
+from .replay import Envelope, with_unique_ids
+from .signature import check_app_secret
+from .utils import build_webhook_envelope
+
+
+METADATA = {'display_phone_number': '15550000000', 'phone_number_id': '100000000000000'}
+
+
+@override_settings(WHATSAPP_APP_SECRET='', WHATSAPP_WEBHOOK_INBOX_MODE=False)
+class WebhookIngestTests(TestCase):
+
+    def post(self, payload):
+        return self.client.post('/webhook/', data=json.dumps(payload), content_type='application/json')
+
+    def test_invalid_items_do_not_drop_valid_ones(self):
+        payload = build_webhook_envelope('messages', {
+            'metadata': METADATA,
+            'contacts': [{'profile': {'name': 'Ana'}, 'wa_id': '15551230000'}],
+            'messages': [
+                {'from': '15551230000', 'id': 'wamid.valid', 'timestamp': '1766216432',
+                 'type': 'text', 'text': {'body': 'hello'}},
+                # No timestamp: the column is NOT NULL
+                {'from': '15551230000', 'id': 'wamid.no_timestamp', 'type': 'text', 'text': {'body': 'lost'}},
+            ],
+            'statuses': [
+                {'id': 'wamid.out.1', 'status': 'delivered', 'recipient_id': '15551230000',
+                 'timestamp': '1766216500'},
+                # No recipient_id: the column is NOT NULL
+                {'id': 'wamid.out.2', 'status': 'read', 'timestamp': '1766216501'},
+            ],
+        })
+
+        response = self.post(payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message_ids'], ['wamid.valid'])
+        self.assertEqual(response.json()['status_ids'], ['wamid.out.1'])
+        self.assertEqual(list(WhatsAppMessage.objects.values_list('message_id', flat=True)), ['wamid.valid'])
+        self.assertEqual(list(WhatsAppMessageStatus.objects.values_list('message_id', flat=True)), ['wamid.out.1'])
+
+        # A redelivery of the same body succeeds again instead of failing forever
+        self.assertEqual(self.post(payload).status_code, 200)
+
+    def test_write_stages_are_timed_by_type(self):
+        STAGE_SECONDS.clear()
+        self.post(build_webhook_envelope('messages', {
+            'metadata': METADATA,
+            'contacts': [{'profile': {'name': 'Ana'}, 'wa_id': '15551230000'}],
+            'messages': [{'from': '15551230000', 'id': 'wamid.text', 'timestamp': '1766216432',
+                          'type': 'text', 'text': {'body': 'hello'}}],
+            'statuses': [
+                {'id': 'wamid.out.3', 'status': 'delivered', 'recipient_id': '15551230000', 'timestamp': '1766216500'},
+                {'id': 'wamid.out.3', 'status': 'read', 'recipient_id': '15551230000', 'timestamp': '1766216501'},
+            ],
+        }))
+
+        labels = {tuple(key) for key, _ in STAGE_SECONDS.samples()}
+        self.assertIn(('write_messages', 'text'), labels)
+        self.assertIn(('write_statuses', 'mixed'), labels)
+        self.assertIn(('parse', ''), labels)
+
+
+hook_calls = []
+
+
+def record_batch(batch):
+    hook_calls.append(([msg.message_id for msg in batch.new_messages], [s.status for s in batch.new_statuses]))
+
+
+@override_settings(WHATSAPP_APP_SECRET='', WHATSAPP_WEBHOOK_INBOX_MODE=False,
+                   WHATSAPP_POST_INGEST_HOOK='webhook.tests.record_batch')
+class PostIngestHookTests(TestCase):
+
+    def setUp(self):
+        hook_calls.clear()
+
+    def test_hook_sees_new_items_once(self):
+        payload = build_webhook_envelope('messages', {
+            'metadata': METADATA,
+            'contacts': [{'profile': {'name': 'Ana'}, 'wa_id': '15551230000'}],
+            'messages': [{'from': '15551230000', 'id': 'wamid.hook', 'timestamp': '1766216432',
+                          'type': 'text', 'text': {'body': 'hi'}}],
+        })
+
+        for _ in range(2):
+            response = self.client.post('/webhook/', data=json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+        # The redelivery is acknowledged but not handed to the hook again
+        self.assertEqual(hook_calls, [(['wamid.hook'], [])])
+
+    def test_hook_skips_redelivery_after_seen_keys_are_pruned(self):
+        payload = build_webhook_envelope('messages', {
+            'metadata': METADATA,
+            'contacts': [{'profile': {'name': 'Ana'}, 'wa_id': '15551230000'}],
+            'messages': [{'from': '15551230000', 'id': 'wamid.pruned', 'timestamp': '1766216432',
+                          'type': 'text', 'text': {'body': 'hi'}}],
+        })
+        body = json.dumps(payload)
+
+        self.assertEqual(self.client.post('/webhook/', data=body, content_type='application/json').status_code, 200)
+        # As after prune_seen_keys, in a fresh process
+        WebhookSeenKey.objects.all().delete()
+        with mock.patch('webhook.dedup._cache', None):
+            response = self.client.post('/webhook/', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(hook_calls, [(['wamid.pruned'], [])])
+        self.assertEqual(Conversation.objects.get(wa_id='15551230000').message_count, 1)
+
+
+@override_settings(WHATSAPP_API_TOKEN='read-token')
+class ReadAPIAuthTests(TestCase):
+
+    def assert_token_required(self, url):
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        with override_settings(WHATSAPP_API_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer read-token').status_code, 401)
+        return self.client.get(url, HTTP_AUTHORIZATION='Bearer read-token')
+
+    def test_history_requires_token(self):
+        response = self.assert_token_required('/api/conversations/15551230000/messages/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_requires_token(self):
+        response = self.assert_token_required('/api/search/?q=hello')
+        self.assertEqual(response.status_code, 200)
+
+    def send_bulk(self, messages, **headers):
+        return self.client.post('/api/send-messages/', data=json.dumps({'messages': messages}),
+                                content_type='application/json', **headers)
+
+    def test_bulk_send_requires_token(self):
+        messages = [{'to': '15551230000', 'message': 'hi'}]
+        with mock.patch('webhook.views.send_whatsapp_messages') as send:
+            self.assertEqual(self.send_bulk(messages).status_code, 401)
+            self.assertEqual(self.send_bulk(messages, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            send.assert_not_called()
+
+    def test_bulk_send_counts_each_status(self):
+        results = [
+            {'success': True, 'message_id': 'wamid.sent'},
+            {'success': False, 'error': 'Rate limited', 'retryable': True, 'rate_limited': True, 'retry_after': 1.0},
+            {'success': False, 'error': 'Bad number', 'status_code': 400, 'retryable': False},
+        ]
+        messages = [{'to': f'1555123000{i}', 'message': 'hi'} for i in range(3)] + [{'to': ''}]
+        with mock.patch('webhook.views.send_whatsapp_messages', return_value=results):
+            response = self.send_bulk(messages, HTTP_AUTHORIZATION='Bearer read-token')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual({key: data[key] for key in ('sent', 'pending', 'failed', 'invalid')},
+                         {'sent': 1, 'pending': 1, 'failed': 1, 'invalid': 1})
+        self.assertEqual([result['status'] for result in data['results']], ['sent', 'pending', 'failed', 'invalid'])
+
+    def test_media_requires_token(self):
+        # 404: authenticated, but no such message
+        response = self.assert_token_required('/api/messages/wamid.none/media/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(WHATSAPP_PROFILE_TOKEN='profile-token', WHATSAPP_PROFILE_SAMPLE_RATE=0.0)
+class ProfileRequestTests(TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+
+    def test_async_view_is_profiled(self):
+        async def view(request):
+            await WhatsAppMessage.objects.acount()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/webhook/', HTTP_X_PROFILE_TOKEN='profile-token')
+        with override_settings(WHATSAPP_PROFILE_DIR=self.profile_dir):
+            response = async_to_sync(profile_request(view))(request)
+            [report] = load_reports()
+
+        self.assertEqual(response['X-Profile-Id'], report['id'])
+        # The count ran on a sync_to_async thread and is still recorded
+        self.assertEqual(report['query_count'], 1)
+
+    def test_non_ascii_token_is_not_profiled(self):
+        view = profile_request(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/webhook/', HTTP_X_PROFILE_TOKEN='pröfile-token')
+        with override_settings(WHATSAPP_PROFILE_DIR=self.profile_dir):
+            response = view(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+
+def middleware_chain(handler):
+    """Middleware instances of a loaded handler, outermost first"""
+    chain = []
+    layer = handler._middleware_chain
+    while layer is not None:
+        # convert_exception_to_response wraps each layer in a closure over it
+        layer = layer.__wrapped__ if hasattr(layer, '__wrapped__') else layer
+        if not hasattr(layer, 'get_response'):
+            break
+        chain.append(layer)
+        layer = layer.get_response
+    return chain
+
+
+class LeanDispatchTests(TestCase):
+
+    def test_load_middleware_copy_is_current(self):
+        source = inspect.getsource(BaseHandler.load_middleware)
+        self.assertEqual(
+            hashlib.sha256(source.encode()).hexdigest(), COPIED_LOAD_MIDDLEWARE_SHA256,
+            "Django's BaseHandler.load_middleware changed; update LeanBaseHandler.load_middleware to match",
+        )
+
+    def test_lean_handler_runs_lean_middleware_only(self):
+        full_stack = list(settings.MIDDLEWARE)
+        handler = LeanWSGIHandler()
+
+        self.assertEqual(settings.MIDDLEWARE, full_stack)
+        self.assertEqual([type(mw).__name__ for mw in middleware_chain(handler)],
+                         [path.rsplit('.', 1)[1] for path in settings.WHATSAPP_LEAN_MIDDLEWARE])
+
+
+class InboxRetentionTests(TestCase):
+
+    def test_prune_keeps_recent_pending_and_failed_entries(self):
+        now = timezone.now()
+        old = WebhookInboxEntry.objects.create(body=b'{}', status='processed', processed_at=now - timedelta(days=8))
+        recent = WebhookInboxEntry.objects.create(body=b'{}', status='processed', processed_at=now - timedelta(days=1))
+        pending = WebhookInboxEntry.objects.create(body=b'{}')
+        failed = WebhookInboxEntry.objects.create(body=b'{}', status='failed')
+
+        call_command('prune_webhook_inbox', '--days', '7', stdout=StringIO())
+
+        remaining = set(WebhookInboxEntry.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {recent.id, pending.id, failed.id})
+        self.assertNotIn(old.id, remaining)
+
+
+class SignatureSettingsTests(TestCase):
+
+    def test_missing_secret_is_reported(self):
+        with override_settings(WHATSAPP_APP_SECRET='', WHATSAPP_VERIFY_SIGNATURES=True):
+            self.assertEqual([warning.id for warning in check_app_secret(None)], ['webhook.W001'])
+        with override_settings(WHATSAPP_APP_SECRET='', WHATSAPP_VERIFY_SIGNATURES=False):
+            self.assertEqual(check_app_secret(None), [])
+        with override_settings(WHATSAPP_APP_SECRET='app-secret', WHATSAPP_VERIFY_SIGNATURES=True):
+            self.assertEqual(check_app_secret(None), [])
+
+    @override_settings(WHATSAPP_APP_SECRET='app-secret', WHATSAPP_WEBHOOK_INBOX_MODE=False)
+    def test_unsigned_post_is_rejected_unless_verification_is_off(self):
+        body = json.dumps(build_webhook_envelope('messages', {'metadata': METADATA}))
+
+        response = self.client.post('/webhook/', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        with override_settings(WHATSAPP_VERIFY_SIGNATURES=False):
+            response = self.client.post('/webhook/', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsAuthTests(TestCase):
+
+    def test_metrics_need_a_configured_token(self):
+        with override_settings(WHATSAPP_METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with override_settings(WHATSAPP_METRICS_TOKEN='metrics-token'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer metrics-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'whatsapp_webhook_requests_total', response.content)
+
+
+class ReplayTests(TestCase):
+
+    def test_unique_ids_keep_the_payload_shape(self):
+        payload = build_webhook_envelope('messages', {
+            'metadata': METADATA,
+            'statuses': [{'id': 'wamid.out.1', 'status': 'read', 'recipient_id': '15551230000',
+                          'timestamp': '1766216500'}],
+        })
+
+        [envelope] = with_unique_ids([Envelope(at=None, payload=payload, items=1)], '-r1')
+
+        value = envelope.payload['entry'][0]['changes'][0]['value']
+        self.assertEqual([status['id'] for status in value['statuses']], ['wamid.out.1-r1'])
+        self.assertNotIn('messages', value)
+        self.assertNotIn('calls', value)
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'webhook'
 
 urlpatterns = [
-    path('', views.whatsapp_webhook, name='whatsapp_webhook'),
+    path(
+        '',
+        async_views.whatsapp_webhook if settings.WHATSAPP_ASYNC_VIEWS else views.whatsapp_webhook,
+        name='whatsapp_webhook',
+    ),
 ]
-
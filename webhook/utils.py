@@ -1,6 +1,98 @@
 """
 Utility functions for WhatsApp webhook processing
 """
+from datetime import datetime, timezone as dt_timezone
+
+
+def parse_epoch(value):
+    """
+    Convert a Meta epoch-seconds timestamp (usually a string) to an aware datetime.
+
+    Returns:
+        datetime in UTC, or None if the value is missing or malformed
+    """
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+# Type-specific fields of each message type: (payload key, attachment column, default).
+# Text lives on the message row itself and contacts are kept whole as contacts_data.
+MESSAGE_CONTENT_FIELDS = {
+    'audio': (
+        ('id', 'media_id', None),
+        ('url', 'url', None),
+        ('mime_type', 'mime_type', None),
+        ('sha256', 'sha256', None),
+        ('voice', 'is_voice', False),
+    ),
+    'image': (
+        ('id', 'media_id', None),
+        ('url', 'url', None),
+        ('mime_type', 'mime_type', None),
+        ('sha256', 'sha256', None),
+        ('caption', 'caption', None),
+    ),
+    'video': (
+        ('id', 'media_id', None),
+        ('url', 'url', None),
+        ('mime_type', 'mime_type', None),
+        ('sha256', 'sha256', None),
+        ('caption', 'caption', None),
+    ),
+    'document': (
+        ('id', 'media_id', None),
+        ('url', 'url', None),
+        ('filename', 'filename', None),
+        ('mime_type', 'mime_type', None),
+        ('sha256', 'sha256', None),
+        ('caption', 'caption', None),
+    ),
+    'sticker': (
+        ('id', 'media_id', None),
+        ('url', 'url', None),
+        ('mime_type', 'mime_type', None),
+        ('sha256', 'sha256', None),
+        ('animated', 'is_animated', False),
+    ),
+    'location': (
+        ('latitude', 'latitude', None),
+        ('longitude', 'longitude', None),
+    ),
+}
+
+# Message types whose content is stored in WhatsAppMessageAttachment
+ATTACHMENT_TYPES = frozenset(MESSAGE_CONTENT_FIELDS) | {'contacts'}
+
+
+def extract_message_text(message_data):
+    """Text body of a text message, None for other types"""
+    if message_data.get('type') == 'text':
+        return message_data.get('text', {}).get('body', '')
+    return None
+
+
+def extract_attachment_fields(message_data):
+    """
+    Extract the type-specific content of a message as WhatsAppMessageAttachment columns.
+
+    Args:
+        message_data: The message object from webhook payload
+
+    Returns:
+        dict: Column values, or None if the message type has no attachment
+    """
+    message_type = message_data.get('type')
+    if message_type == 'contacts':
+        return {'contacts_data': message_data.get('contacts', [])}
+    spec = MESSAGE_CONTENT_FIELDS.get(message_type)
+    if spec is None:
+        return None
+    data = message_data.get(message_type, {})
+    return {column: data.get(key, default) for key, column, default in spec}
 
 
 def extract_message_content(message_data):
@@ -11,57 +103,64 @@ def extract_message_content(message_data):
         message_data: The message object from webhook payload
     
     Returns:
-        dict: Extracted message content
+        dict: Extracted message content, with the type-specific fields
+        under the message type's key (e.g. content['audio']['voice'])
     """
     message_type = message_data.get('type')
     content = {
         'type': message_type,
-        'text': None,
+        'text': extract_message_text(message_data),
         'audio': None,
         'image': None,
         'video': None,
         'document': None,
     }
     
-    if message_type == 'text':
-        content['text'] = message_data.get('text', {}).get('body', '')
-    
-    elif message_type == 'audio':
-        audio_data = message_data.get('audio', {})
-        content['audio'] = {
-            'id': audio_data.get('id'),
-            'url': audio_data.get('url'),
-            'mime_type': audio_data.get('mime_type'),
-            'voice': audio_data.get('voice', False),
-            'sha256': audio_data.get('sha256'),
-        }
-    
-    elif message_type == 'image':
-        image_data = message_data.get('image', {})
-        content['image'] = {
-            'id': image_data.get('id'),
-            'url': image_data.get('url'),
-            'mime_type': image_data.get('mime_type'),
-            'caption': image_data.get('caption'),
-        }
-    
-    elif message_type == 'video':
-        video_data = message_data.get('video', {})
-        content['video'] = {
-            'id': video_data.get('id'),
-            'url': video_data.get('url'),
-            'mime_type': video_data.get('mime_type'),
-            'caption': video_data.get('caption'),
-        }
-    
-    elif message_type == 'document':
-        doc_data = message_data.get('document', {})
-        content['document'] = {
-            'id': doc_data.get('id'),
-            'url': doc_data.get('url'),
-            'filename': doc_data.get('filename'),
-            'mime_type': doc_data.get('mime_type'),
-        }
+    spec = MESSAGE_CONTENT_FIELDS.get(message_type)
+    if spec is not None:
+        data = message_data.get(message_type, {})
+        content[message_type] = {key: data.get(key, default) for key, _, default in spec}
+    elif message_type == 'contacts':
+        content['contacts'] = message_data.get('contacts', [])
     
     return content
 
+
+def build_webhook_envelope(field, value, entry_id='0'):
+    """
+    Wrap one change value in the envelope Meta posts to the webhook.
+
+    Args:
+        field: Change field, 'messages' or 'calls'
+        value: Change value with metadata and messages, statuses or calls
+        entry_id: WhatsApp Business Account ID of the entry
+
+    Returns:
+        dict: Webhook payload
+    """
+    return {
+        'object': 'whatsapp_business_account',
+        'entry': [
+            {
+                'id': entry_id,
+                'changes': [{'value': {'messaging_product': 'whatsapp', **value}, 'field': field}],
+            }
+        ],
+    }
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+
+    Shared by the replay report, list_profiles and the benchmarks so their
+    percentiles are computed the same way.
+
+    Returns:
+        The sample at that rank, or 0.0 for an empty list
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
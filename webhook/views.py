@@ -1,21 +1,36 @@
+import hmac
 import json
 import logging
+import time
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
-from django.utils import timezone
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework import status as http_status
-from .models import WhatsAppMessage, WhatsAppCall, WhatsAppMessageStatus, WhatsAppOutgoingMessage
+from .models import WhatsAppMessageAttachment, WhatsAppOutgoingMessage
 from .serializers import WhatsAppWebhookSerializer
-from .services import send_whatsapp_message
+from .services import send_whatsapp_message, send_whatsapp_messages
+from .admission import admission, shed_webhook_request
+from .api_auth import APITokenAuthentication, HasAPIToken
+from .archive import archive_on_write
+from .conversations import record_outbound
+from .history import DEFAULT_PAGE_SIZE, InvalidHistoryRequest, fetch_history
+from .inbox import append_to_inbox
+from .media import get_media_store
+from .metrics import record_request, registry, stage
+from .profiling import profile_request
+from .outgoing import SEND_RESULT_FIELDS, record_send_result
+from .search import search_messages
+from .signature import reject_webhook_request
+from .ingest import ingest_payload
 
 logger = logging.getLogger(__name__)
 
 
+@profile_request
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def whatsapp_webhook(request):
@@ -27,390 +42,167 @@ def whatsapp_webhook(request):
     """
     
     if request.method == 'GET':
-        # Webhook verification
-        mode = request.GET.get('hub.mode')
-        token = request.GET.get('hub.verify_token')
-        challenge = request.GET.get('hub.challenge')
-        
-        if mode == 'subscribe' and token == settings.WHATSAPP_VERIFY_TOKEN:
-            logger.info("Webhook verified successfully")
-            return HttpResponse(challenge, content_type='text/plain')
-        else:
-            logger.warning(f"Webhook verification failed. Mode: {mode}, Token match: {token == settings.WHATSAPP_VERIFY_TOKEN}")
-            return HttpResponse('Verification failed', status=403)
+        return verify_webhook_subscription(request)
     
     elif request.method == 'POST':
-        # Handle incoming messages
-        try:
-            data = json.loads(request.body)
-            logger.info(f"Received webhook payload: {json.dumps(data, indent=2)}")
-            
-            # Verify it's a WhatsApp Business Account webhook
-            if data.get('object') != 'whatsapp_business_account':
-                logger.warning(f"Invalid webhook object type: {data.get('object')}")
-                return JsonResponse({'status': 'error', 'message': 'Invalid webhook object'}, status=400)
-            
-            # Process each entry
-            entries = data.get('entry', [])
-            processed_messages = []
-            processed_calls = []
-            processed_statuses = []
-            
-            for entry in entries:
-                changes = entry.get('changes', [])
-                
-                for change in changes:
-                    value = change.get('value', {})
-                    field = change.get('field')
-                    
-                    # Handle messages field (can contain messages OR statuses)
-                    if field == 'messages':
-                        metadata = value.get('metadata', {})
-                        
-                        # Check for incoming messages
-                        messages = value.get('messages', [])
-                        if messages:
-                            contacts = value.get('contacts', [])
-                            # Create a mapping of wa_id to contact info
-                            contact_map = {contact.get('wa_id'): contact for contact in contacts}
-                            
-                            # Process each message
-                            for message in messages:
-                                message_data = process_message(message, contact_map, metadata, entry.get('id'))
-                                if message_data:
-                                    processed_messages.append(message_data)
-                        
-                        # Check for message status updates (sent/delivered/read/failed)
-                        statuses = value.get('statuses', [])
-                        if statuses:
-                            # Process each status update
-                            for status_update in statuses:
-                                status_data = process_message_status(status_update, metadata)
-                                if status_data:
-                                    processed_statuses.append(status_data)
-                    
-                    # Handle calls
-                    elif field == 'calls':
-                        calls = value.get('calls', [])
-                        contacts = value.get('contacts', [])
-                        metadata = value.get('metadata', {})
-                        
-                        # Create a mapping of wa_id to contact info
-                        contact_map = {contact.get('wa_id'): contact for contact in contacts}
-                        
-                        # Process each call event
-                        for call in calls:
-                            call_data = process_call(call, contact_map, metadata)
-                            if call_data:
-                                processed_calls.append(call_data)
-            
-            response_data = {
-                'status': 'success',
-                'messages_processed': len(processed_messages),
-                'calls_processed': len(processed_calls),
-                'statuses_processed': len(processed_statuses),
-            }
-            
-            if processed_messages:
-                response_data['message_ids'] = [msg.message_id for msg in processed_messages]
-            if processed_calls:
-                response_data['call_ids'] = [call.call_id for call in processed_calls]
-            if processed_statuses:
-                response_data['status_ids'] = [s.message_id for s in processed_statuses]
-            
-            return JsonResponse(response_data, status=200)
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}")
-            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
-        except Exception as e:
-            logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        start = time.perf_counter()
+        response, outcome = receive_webhook(request)
+        record_request(outcome, time.perf_counter() - start)
+        return response
 
 
-def process_message(message, contact_map, metadata, entry_id):
+def receive_webhook(request):
     """
-    Process a single message from the webhook payload and save it to the database.
-    
-    Args:
-        message: The message object from the webhook
-        contact_map: Dictionary mapping wa_id to contact information
-        metadata: Metadata containing phone_number_id and display_phone_number
-        entry_id: The entry ID from the webhook
+    Handle a webhook POST.
     
     Returns:
-        WhatsAppMessage instance if created successfully, None otherwise
+        tuple: (response, outcome label for the request metrics)
     """
+    # Oversized and unsigned bodies are refused before they are parsed, logged or stored
+    with stage('verify'):
+        rejection = reject_webhook_request(request)
+    if rejection is not None:
+        return rejection, 'rejected'
+    
+    # Under load, refuse at once and let Meta redeliver rather than queue on the write lock
+    with stage('admission'):
+        shed = shed_webhook_request(request)
+    if shed is not None:
+        return shed, 'shed'
     try:
-        from_number = message.get('from')
-        message_id = message.get('id')
-        message_type = message.get('type')
-        timestamp = message.get('timestamp')
-        
-        # Get contact information
-        contact = contact_map.get(from_number, {})
-        contact_name = contact.get('profile', {}).get('name', '')
-        wa_id = contact.get('wa_id', from_number)
-        
-        # Extract message content based on type
-        message_text = None
-        audio_id = None
-        audio_url = None
-        audio_mime_type = None
-        is_voice = False
-
-        # Initialize new message type fields
-        image_id = None
-        image_url = None
-        image_mime_type = None
-        image_caption = None
-
-        video_id = None
-        video_url = None
-        video_mime_type = None
-        video_caption = None
-
-        document_id = None
-        document_url = None
-        document_filename = None
-        document_mime_type = None
-
-        latitude = None
-        longitude = None
-
-        sticker_id = None
-        sticker_url = None
-        sticker_mime_type = None
-        is_animated = False
-
-        contacts_data = None
-
-        if message_type == 'text':
-            message_text = message.get('text', {}).get('body', '')
-        elif message_type == 'audio':
-            audio_data = message.get('audio', {})
-            audio_id = audio_data.get('id')
-            audio_url = audio_data.get('url')
-            audio_mime_type = audio_data.get('mime_type')
-            is_voice = audio_data.get('voice', False)
-        elif message_type == 'image':
-            image_data = message.get('image', {})
-            image_id = image_data.get('id')
-            image_url = image_data.get('url')
-            image_mime_type = image_data.get('mime_type')
-            image_caption = image_data.get('caption')
-        elif message_type == 'video':
-            video_data = message.get('video', {})
-            video_id = video_data.get('id')
-            video_url = video_data.get('url')
-            video_mime_type = video_data.get('mime_type')
-            video_caption = video_data.get('caption')
-        elif message_type == 'document':
-            doc_data = message.get('document', {})
-            document_id = doc_data.get('id')
-            document_url = doc_data.get('url')
-            document_filename = doc_data.get('filename')
-            document_mime_type = doc_data.get('mime_type')
-        elif message_type == 'location':
-            location_data = message.get('location', {})
-            latitude = location_data.get('latitude')
-            longitude = location_data.get('longitude')
-        elif message_type == 'sticker':
-            sticker_data = message.get('sticker', {})
-            sticker_id = sticker_data.get('id')
-            sticker_url = sticker_data.get('url')
-            sticker_mime_type = sticker_data.get('mime_type')
-            is_animated = sticker_data.get('animated', False)
-        elif message_type == 'contacts':
-            contacts_data = message.get('contacts', [])
-        
-        # Create or update message record
-        message_obj, created = WhatsAppMessage.objects.update_or_create(
-            message_id=message_id,
-            defaults={
-                'wa_id': wa_id,
-                'from_number': from_number,
-                'contact_name': contact_name,
-                'message_type': message_type,
-                'message_text': message_text,
-                'audio_id': audio_id,
-                'audio_url': audio_url,
-                'audio_mime_type': audio_mime_type,
-                'is_voice': is_voice,
-                'image_id': image_id,
-                'image_url': image_url,
-                'image_mime_type': image_mime_type,
-                'image_caption': image_caption,
-                'video_id': video_id,
-                'video_url': video_url,
-                'video_mime_type': video_mime_type,
-                'video_caption': video_caption,
-                'document_id': document_id,
-                'document_url': document_url,
-                'document_filename': document_filename,
-                'document_mime_type': document_mime_type,
-                'latitude': latitude,
-                'longitude': longitude,
-                'sticker_id': sticker_id,
-                'sticker_url': sticker_url,
-                'sticker_mime_type': sticker_mime_type,
-                'is_animated': is_animated,
-                'contacts_data': contacts_data,
-                'timestamp': timestamp,
-                'phone_number_id': metadata.get('phone_number_id', ''),
-                'display_phone_number': metadata.get('display_phone_number', ''),
-                'raw_payload': message,  # Store the complete message payload
-            }
-        )
-        
-        if created:
-            logger.info(f"New message saved: {message_id} from {from_number} ({message_type})")
-        else:
-            logger.info(f"Message updated: {message_id}")
-        
-        # Here you can add your chatbot logic to process the message
-        # For example, you could trigger an async task or call a function
-        # handle_message_response(message_obj)
-        
-        return message_obj
-        
-    except Exception as e:
-        logger.error(f"Error processing individual message: {str(e)}", exc_info=True)
-        return None
+        return store_webhook(request)
+    finally:
+        admission.release()
 
 
-def process_call(call, contact_map, metadata):
+def store_webhook(request):
     """
-    Process a single call event from the webhook payload and save it to the database.
-    Each event (connect, terminate) is stored as a separate record.
-    
-    Args:
-        call: The call object from the webhook
-        contact_map: Dictionary mapping wa_id to contact information
-        metadata: Metadata containing phone_number_id and display_phone_number
+    Queue or ingest an admitted webhook POST.
     
     Returns:
-        WhatsAppCall instance if created successfully, None otherwise
+        tuple: (response, outcome label for the request metrics)
     """
+    # Inbox mode: persist the raw body and ack without parsing
+    if settings.WHATSAPP_WEBHOOK_INBOX_MODE:
+        with stage('inbox_append'), admission.timed_write():
+            entry = append_to_inbox(request.body)
+        logger.debug(f"Webhook body queued in inbox: {entry.id}")
+        return JsonResponse({'status': 'queued', 'inbox_id': entry.id}, status=200), 'queued'
+    
+    # Handle incoming messages
     try:
-        call_id = call.get('id')
-        from_number = call.get('from')
-        to_number = call.get('to')
-        event = call.get('event')
-        direction = call.get('direction')
-        timestamp = call.get('timestamp')
-        
-        # Get contact information
-        contact = contact_map.get(from_number, {})
-        contact_name = contact.get('profile', {}).get('name', '')
-        wa_id = contact.get('wa_id', from_number)
-        
-        # Call timing (available on terminate/completed events)
-        call_status = call.get('status')
-        start_time = call.get('start_time')
-        end_time = call.get('end_time')
-        duration = call.get('duration')
-        
-        # Session data (available on connect events for WebRTC)
-        session = call.get('session', {})
-        session_sdp = session.get('sdp')
-        session_sdp_type = session.get('sdp_type')
-        
-        # Create call record (each event as separate record)
-        call_obj = WhatsAppCall.objects.create(
-            call_id=call_id,
-            from_number=from_number,
-            to_number=to_number,
-            wa_id=wa_id,
-            contact_name=contact_name,
-            event=event,
-            direction=direction,
-            status=call_status,
-            timestamp=timestamp,
-            start_time=start_time,
-            end_time=end_time,
-            duration=duration,
-            session_sdp=session_sdp,
-            session_sdp_type=session_sdp_type,
-            phone_number_id=metadata.get('phone_number_id', ''),
-            display_phone_number=metadata.get('display_phone_number', ''),
-            raw_payload=call,
-        )
+        with stage('parse'):
+            data = json.loads(request.body)
+        with stage('log_payload'):
+            logger.info(f"Received webhook payload: {json.dumps(data, indent=2)}")
         
-        logger.info(f"Call event saved: {call_id} | {event} | from {from_number} to {to_number}")
+        # Verify it's a WhatsApp Business Account webhook
+        if data.get('object') != 'whatsapp_business_account':
+            logger.warning(f"Invalid webhook object type: {data.get('object')}")
+            return JsonResponse({'status': 'error', 'message': 'Invalid webhook object'}, status=400), 'invalid_object'
         
-        # Here you can add logic to handle calls programmatically
-        # For example: handle_call_event(call_obj)
+        # Collect every message, status and call, then write them in one transaction
+        with stage('ingest'), admission.timed_write():
+            batch = ingest_payload(data)
+        response_data = build_ingest_response(batch)
         
-        return call_obj
+        return JsonResponse(response_data, status=200), 'ok'
         
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400), 'invalid_json'
     except Exception as e:
-        logger.error(f"Error processing call event: {str(e)}", exc_info=True)
-        return None
+        logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500), 'error'
+
+
+def verify_webhook_subscription(request):
+    """Answer Meta's GET verification challenge"""
+    mode = request.GET.get('hub.mode')
+    token = request.GET.get('hub.verify_token')
+    challenge = request.GET.get('hub.challenge')
+    
+    if mode == 'subscribe' and token == settings.WHATSAPP_VERIFY_TOKEN:
+        logger.info("Webhook verified successfully")
+        return HttpResponse(challenge, content_type='text/plain')
+    else:
+        logger.warning(f"Webhook verification failed. Mode: {mode}, Token match: {token == settings.WHATSAPP_VERIFY_TOKEN}")
+        return HttpResponse('Verification failed', status=403)
+
+
+def build_ingest_response(batch):
+    """Build the webhook response body for an ingested batch"""
+    processed_messages = batch.messages
+    processed_calls = batch.calls
+    processed_statuses = batch.statuses
+    
+    response_data = {
+        'status': 'success',
+        'messages_processed': len(processed_messages),
+        'calls_processed': len(processed_calls),
+        'statuses_processed': len(processed_statuses),
+    }
+    
+    if processed_messages:
+        response_data['message_ids'] = [msg.message_id for msg in processed_messages]
+    if processed_calls:
+        response_data['call_ids'] = [call.call_id for call in processed_calls]
+    if processed_statuses:
+        response_data['status_ids'] = [s.message_id for s in processed_statuses]
+    
+    return response_data
 
 
-def process_message_status(status_update, metadata):
+def validate_send_request(to_number, message_text):
     """
-    Process a message status update (sent/delivered/read/failed) and save it to the database.
+    Validate the fields of a send request.
     
-    Args:
-        status_update: The status object from the webhook
-        metadata: Metadata containing phone_number_id and display_phone_number
+    Returns:
+        Error message, or None if the request is valid
+    """
+    if not to_number or not message_text:
+        return 'Missing required fields: to, message'
+    
+    # Validate phone number format (basic check)
+    if not isinstance(to_number, str) or not to_number.isdigit():
+        return 'Invalid phone number format. Should contain only digits with country code.'
+    
+    return None
+
+
+def apply_send_result(outgoing_msg, result):
+    """
+    Record a send_whatsapp_message result on an outgoing message record (unsaved).
     
     Returns:
-        WhatsAppMessageStatus instance if created successfully, None otherwise
+        tuple: (response body, HTTP status code)
     """
-    try:
-        message_id = status_update.get('id')
-        status_type = status_update.get('status')
-        recipient_id = status_update.get('recipient_id')
-        timestamp = status_update.get('timestamp')
-        
-        # Conversation information
-        conversation = status_update.get('conversation', {})
-        conversation_id = conversation.get('id')
-        conversation_expiration_timestamp = conversation.get('expiration_timestamp')
-        conversation_origin = conversation.get('origin', {})
-        conversation_origin_type = conversation_origin.get('type')
-        
-        # Pricing information
-        pricing = status_update.get('pricing', {})
-        is_billable = pricing.get('billable', False)
-        pricing_model = pricing.get('pricing_model')
-        pricing_category = pricing.get('category')
-        pricing_type = pricing.get('type')
-        
-        # Create status record (allow multiple statuses for same message_id - sent, delivered, read)
-        status_obj = WhatsAppMessageStatus.objects.create(
-            message_id=message_id,
-            status=status_type,
-            recipient_id=recipient_id,
-            conversation_id=conversation_id,
-            conversation_expiration_timestamp=conversation_expiration_timestamp,
-            conversation_origin_type=conversation_origin_type,
-            is_billable=is_billable,
-            pricing_model=pricing_model,
-            pricing_category=pricing_category,
-            pricing_type=pricing_type,
-            timestamp=timestamp,
-            phone_number_id=metadata.get('phone_number_id', ''),
-            display_phone_number=metadata.get('display_phone_number', ''),
-            raw_payload=status_update,
-        )
-        
-        logger.info(f"Message status saved: {message_id} | {status_type} | to {recipient_id}")
-        
-        # Here you can add logic based on status
-        # For example: if status == 'failed', trigger retry logic
-        # if status == 'read', update conversation analytics
-        
-        return status_obj
-        
-    except Exception as e:
-        logger.error(f"Error processing message status: {str(e)}", exc_info=True)
-        return None
+    status = record_send_result(outgoing_msg, result)
+    
+    if status == 'sent':
+        return {
+            'success': True,
+            'message_id': result['message_id'],
+            'outgoing_message_id': outgoing_msg.id,
+            'status': 'sent'
+        }, http_status.HTTP_200_OK
+    
+    response_data = {
+        'success': False,
+        'error': result.get('error'),
+        'outgoing_message_id': outgoing_msg.id,
+        'status': status
+    }
+    
+    if status == 'pending':
+        # Transient failure: the retry worker will resend it
+        response_data['next_attempt_at'] = outgoing_msg.next_attempt_at.isoformat()
+        return response_data, http_status.HTTP_202_ACCEPTED
+    
+    return response_data, http_status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
+@profile_request
 @api_view(['POST'])
 def send_message(request):
     """
@@ -432,18 +224,9 @@ def send_message(request):
     to_number = request.data.get('to')
     message_text = request.data.get('message')
     
-    if not to_number or not message_text:
-        return Response(
-            {'error': 'Missing required fields: to, message'},
-            status=http_status.HTTP_400_BAD_REQUEST
-        )
-    
-    # Validate phone number format (basic check)
-    if not to_number.isdigit():
-        return Response(
-            {'error': 'Invalid phone number format. Should contain only digits with country code.'},
-            status=http_status.HTTP_400_BAD_REQUEST
-        )
+    error = validate_send_request(to_number, message_text)
+    if error:
+        return Response({'error': error}, status=http_status.HTTP_400_BAD_REQUEST)
     
     # Create pending message record
     outgoing_msg = WhatsAppOutgoingMessage.objects.create(
@@ -452,39 +235,267 @@ def send_message(request):
         message_text=message_text,
         status='pending'
     )
+    record_outbound([outgoing_msg])
     
     # Send message via WhatsApp API
     result = send_whatsapp_message(to_number, message_text)
     
+    response_data, status_code = apply_send_result(outgoing_msg, result)
+    archive_on_write([outgoing_msg], 'outgoing')
+    outgoing_msg.save()
+    
     if result['success']:
-        # Update message record with success
-        outgoing_msg.message_id = result['message_id']
-        outgoing_msg.status = 'sent'
-        outgoing_msg.api_response = result.get('response')
-        outgoing_msg.sent_at = timezone.now()
-        outgoing_msg.save()
-        
         logger.info(f"Outgoing message saved: ID {outgoing_msg.id}, WhatsApp ID {result['message_id']}")
-        
-        return Response({
-            'success': True,
-            'message_id': result['message_id'],
-            'outgoing_message_id': outgoing_msg.id,
-            'status': 'sent'
-        }, status=http_status.HTTP_200_OK)
-    
+    elif outgoing_msg.status == 'pending':
+        logger.warning(f"Send failed, retry scheduled for {outgoing_msg.next_attempt_at}: {result.get('error')}")
     else:
-        # Update message record with failure
-        outgoing_msg.status = 'failed'
-        outgoing_msg.error_message = result.get('error')
-        outgoing_msg.api_response = result.get('response')
-        outgoing_msg.save()
-        
         logger.error(f"Failed to send message: {result.get('error')}")
+    
+    return Response(response_data, status=status_code)
+
+
+@profile_request
+@api_view(['POST'])
+@authentication_classes([APITokenAuthentication])
+@permission_classes([HasAPIToken])
+def send_messages(request):
+    """
+    API endpoint to send WhatsApp messages to many recipients at once
+    
+    POST /api/send-messages/
+    Authorization: Bearer <WHATSAPP_API_TOKEN>
+    {
+        "messages": [
+            {"to": "918279486865", "message": "Hello!"},
+            {"to": "918279486866", "message": "Hi there!"}
+        ]
+    }
+    
+    Response:
+    {
+        "sent": 2,
+        "pending": 0,
+        "failed": 0,
+        "invalid": 0,
+        "results": [
+            {"success": true, "message_id": "wamid.xxx", "outgoing_message_id": 1, "status": "sent"},
+            ...
+        ]
+    }
+    
+    Results are returned in request order, and the counts give the number
+    of results with each status. Items that fail validation are reported
+    as "invalid" and are not stored; items that hit a transient Graph API
+    error or the rate limit come back as "pending" and are retried by the
+    retry worker.
+    """
+    items = request.data.get('messages') if isinstance(request.data, dict) else None
+    
+    if not isinstance(items, list) or not items:
+        return Response(
+            {'error': 'Missing required field: messages (non-empty list)'},
+            status=http_status.HTTP_400_BAD_REQUEST
+        )
+    
+    if len(items) > settings.WHATSAPP_BULK_SEND_MAX_ITEMS:
+        return Response(
+            {'error': f'Too many messages: at most {settings.WHATSAPP_BULK_SEND_MAX_ITEMS} per request'},
+            status=http_status.HTTP_400_BAD_REQUEST
+        )
+    
+    results = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        to_number = item.get('to')
+        message_text = item.get('message')
         
-        return Response({
-            'success': False,
-            'error': result.get('error'),
-            'outgoing_message_id': outgoing_msg.id,
-            'status': 'failed'
-        }, status=http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+        error = validate_send_request(to_number, message_text)
+        if error:
+            results[index] = {'success': False, 'error': error, 'status': 'invalid'}
+            continue
+        
+        pending.append((index, WhatsAppOutgoingMessage(
+            to_number=to_number,
+            message_type='text',
+            message_text=message_text,
+            status='pending'
+        )))
+    
+    # Create all pending message records in one statement
+    outgoing_msgs = WhatsAppOutgoingMessage.objects.bulk_create([msg for _, msg in pending])
+    record_outbound(outgoing_msgs)
+    
+    # Fan the sends out over a bounded pool of Graph API requests
+    send_results = send_whatsapp_messages([(msg.to_number, msg.message_text) for msg in outgoing_msgs])
+    
+    for (index, outgoing_msg), result in zip(pending, send_results):
+        results[index], _ = apply_send_result(outgoing_msg, result)
+    
+    # Write every outcome back in one statement
+    archive_on_write(outgoing_msgs, 'outgoing')
+    WhatsAppOutgoingMessage.objects.bulk_update(outgoing_msgs, SEND_RESULT_FIELDS)
+    
+    counts = {status: 0 for status in ('sent', 'pending', 'failed', 'invalid')}
+    for result in results:
+        counts[result['status']] += 1
+    logger.info(
+        f"Bulk send finished: {counts['sent']} sent, {counts['pending']} pending, "
+        f"{counts['failed']} failed, {counts['invalid']} invalid"
+    )
+    
+    return Response({**counts, 'results': results}, status=http_status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@authentication_classes([APITokenAuthentication])
+@permission_classes([HasAPIToken])
+def conversation_messages(request, wa_id):
+    """
+    API endpoint to read a contact's conversation history, newest first
+    
+    GET /api/conversations/<wa_id>/messages/?limit=50&cursor=...&fields=direction,text,created_at
+    Authorization: Bearer <WHATSAPP_API_TOKEN>
+    
+    Response:
+    {
+        "results": [
+            {"direction": "outbound", "id": 7, "text": "Hi!", "status": "read", "created_at": "...", ...},
+            {"direction": "inbound", "id": 12, "text": "Hello", "contact_name": "John", "created_at": "...", ...}
+        ],
+        "next_cursor": "WyIyMDI1LTA..."
+    }
+    
+    Incoming and outgoing messages are interleaved. Pass next_cursor back as
+    cursor to read the next (older) page; it is null on the last page.
+    """
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+        page = fetch_history(
+            wa_id,
+            cursor=request.query_params.get('cursor'),
+            limit=limit,
+            fields=request.query_params.get('fields'),
+        )
+    except ValueError as e:
+        # InvalidHistoryRequest, or a non-numeric limit
+        message = str(e) if isinstance(e, InvalidHistoryRequest) else 'limit must be an integer'
+        return Response({'error': message}, status=http_status.HTTP_400_BAD_REQUEST)
+    
+    return Response(page)
+
+
+@api_view(['GET'])
+@authentication_classes([APITokenAuthentication])
+@permission_classes([HasAPIToken])
+def search(request):
+    """
+    API endpoint to full-text search incoming messages
+    
+    GET /api/search/?q=refund+order&wa_id=918279486865&limit=20
+    Authorization: Bearer <WHATSAPP_API_TOKEN>
+    
+    Response:
+    {
+        "results": [
+            {"id": 12, "message_id": "wamid.xxx", "wa_id": "918279486865", "contact_name": "John",
+             "message_type": "text", "text": "Where is my refund?", "caption": null, "created_at": "..."}
+        ]
+    }
+    
+    Matches message text, media captions, document filenames and contact
+    names; the last word matches as a prefix. Results are best match first.
+    """
+    query = (request.query_params.get('q') or '').strip()
+    if not query:
+        return Response({'error': 'Missing required parameter: q'}, status=http_status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.query_params.get('limit', 50))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= 200:
+        return Response({'error': 'limit must be between 1 and 200'}, status=http_status.HTTP_400_BAD_REQUEST)
+    
+    messages = search_messages(query, limit=limit, wa_id=request.query_params.get('wa_id'))
+    results = []
+    for message in messages:
+        attachment = message.get_attachment()
+        results.append({
+            'id': message.id,
+            'message_id': message.message_id,
+            'wa_id': message.wa_id,
+            'contact_name': message.contact_name,
+            'message_type': message.message_type,
+            'text': message.message_text,
+            'caption': attachment.caption if attachment else None,
+            'created_at': message.created_at,
+        })
+    
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+@authentication_classes([APITokenAuthentication])
+@permission_classes([HasAPIToken])
+def message_media(request, message_id):
+    """
+    API endpoint to download the media of an incoming message from the local store
+    
+    GET /api/messages/<message_id>/media/
+    Authorization: Bearer <WHATSAPP_API_TOKEN>
+    
+    Returns the file (404 until the fetch_media worker has stored it). The
+    file is sent with sendfile where the server supports it, or handed to
+    the front-end server with X-Accel-Redirect when
+    WHATSAPP_MEDIA_ACCEL_REDIRECT is set.
+    """
+    attachment = (
+        WhatsAppMessageAttachment.objects.select_related('media_blob')
+        .filter(message_id=message_id).first()
+    )
+    if attachment is None or attachment.media_blob is None:
+        status = attachment.fetch_status if attachment else None
+        return Response({'error': 'Media not available', 'fetch_status': status},
+                        status=http_status.HTTP_404_NOT_FOUND)
+    
+    blob = attachment.media_blob
+    store = get_media_store()
+    relative_path = store.path(blob.sha256).relative_to(store.root)
+    
+    if settings.WHATSAPP_MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=blob.mime_type or 'application/octet-stream')
+        response['X-Accel-Redirect'] = f"{settings.WHATSAPP_MEDIA_ACCEL_REDIRECT.rstrip('/')}/{relative_path.as_posix()}"
+    else:
+        try:
+            media_file = open(store.path(blob.sha256), 'rb')
+        except FileNotFoundError:
+            logger.error(f"Stored media file missing: {blob.sha256}")
+            return Response({'error': 'Media not available'}, status=http_status.HTTP_404_NOT_FOUND)
+        response = FileResponse(media_file, content_type=blob.mime_type or 'application/octet-stream',
+                                filename=attachment.filename or None)
+    
+    # Content-addressed: the bytes behind this URL never change
+    response['ETag'] = f'"{blob.sha256}"'
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Prometheus metrics of the webhook pipeline (see webhook.metrics).
+    
+    GET /metrics
+    
+    Authorization: Bearer <WHATSAPP_METRICS_TOKEN>
+    
+    The metrics reveal traffic volumes and database timings, so the
+    endpoint answers 404 until WHATSAPP_METRICS_TOKEN is set.
+    """
+    token = settings.WHATSAPP_METRICS_TOKEN
+    if not token:
+        return HttpResponse('Not Found', status=404, content_type='text/plain')
+    presented = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(presented.encode(), f'Bearer {token}'.encode()):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
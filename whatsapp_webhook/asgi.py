@@ -9,9 +9,16 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'whatsapp_webhook.settings')
 
 application = get_asgi_application()
 
+if settings.WHATSAPP_LEAN_DISPATCH:
+    from .dispatch import LeanDispatchASGI
+
+    # /webhook/ and /api/ skip the session, auth, message, CSRF and clickjacking middleware
+    application = LeanDispatchASGI(application)
+
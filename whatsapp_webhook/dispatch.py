@@ -0,0 +1,128 @@
+"""
+Lean request dispatch for the machine-to-machine routes.
+
+Meta's webhook deliveries and the send API never use sessions, logins,
+flash messages, CSRF tokens (the views are csrf_exempt) or frame options,
+yet each request still runs that middleware. The WSGI and ASGI
+applications here send requests under WHATSAPP_LEAN_PATH_PREFIXES to a
+second Django handler built with WHATSAPP_LEAN_MIDDLEWARE. All other
+requests, including the admin, keep the full MIDDLEWARE stack.
+
+Views on the lean path see no request.session, and request.user is only
+set by DRF, as AnonymousUser.
+"""
+import logging
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('django.request')
+
+# LeanBaseHandler.load_middleware is a copy of BaseHandler.load_middleware from
+# Django 4.2.7; this is the SHA-256 of that method's source there. A test fails
+# when Django's copy changes, so the lean copy can be brought up to date.
+COPIED_LOAD_MIDDLEWARE_SHA256 = 'a1fb7ee5f8586195da2174d1bbc2bbfc7ca19b9d26ea66412cb434f45bf6d467'
+
+
+class LeanBaseHandler(BaseHandler):
+    """Builds the handler's middleware chain from WHATSAPP_LEAN_MIDDLEWARE"""
+
+    def load_middleware(self, is_async=False):
+        """
+        BaseHandler.load_middleware (Django 4.2.7) reading WHATSAPP_LEAN_MIDDLEWARE.
+
+        It is copied rather than wrapped because BaseHandler always reads
+        settings.MIDDLEWARE, and swapping that setting while the chain is
+        built would race with the full handler loading on another thread.
+        """
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(settings.WHATSAPP_LEAN_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, 'sync_capable', True)
+            middleware_can_async = getattr(middleware, 'async_capable', False)
+            if not middleware_can_sync and not middleware_can_async:
+                raise RuntimeError(
+                    f"Middleware {middleware_path} must have at least one of sync_capable/async_capable set to True."
+                )
+            elif not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async, handler, handler_is_async,
+                    debug=settings.DEBUG, name=f"middleware {middleware_path}",
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed as e:
+                if settings.DEBUG:
+                    logger.debug(f"MiddlewareNotUsed({middleware_path!r}): {str(e)}")
+                continue
+            else:
+                handler = adapted_handler
+
+            if mw_instance is None:
+                raise ImproperlyConfigured(f"Middleware factory {middleware_path} returned None.")
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, mw_instance.process_view))
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response)
+                )
+            if hasattr(mw_instance, 'process_exception'):
+                # Django runs exception middleware synchronously
+                self._exception_middleware.append(self.adapt_method_mode(False, mw_instance.process_exception))
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        handler = self.adapt_method_mode(is_async, handler, handler_is_async)
+        # Assigned last: Django uses it as the flag that loading has finished
+        self._middleware_chain = handler
+
+
+class LeanWSGIHandler(LeanBaseHandler, WSGIHandler):
+    pass
+
+
+class LeanASGIHandler(LeanBaseHandler, ASGIHandler):
+    pass
+
+
+def is_lean_path(path):
+    return path.startswith(tuple(settings.WHATSAPP_LEAN_PATH_PREFIXES))
+
+
+class LeanDispatchWSGI:
+    """WSGI application choosing the lean or the full handler by path"""
+
+    def __init__(self, full):
+        self.full = full
+        self.lean = LeanWSGIHandler()
+
+    def __call__(self, environ, start_response):
+        handler = self.lean if is_lean_path(environ.get('PATH_INFO', '')) else self.full
+        return handler(environ, start_response)
+
+
+class LeanDispatchASGI:
+    """ASGI application choosing the lean or the full handler by path"""
+
+    def __init__(self, full):
+        self.full = full
+        self.lean = LeanASGIHandler()
+
+    async def __call__(self, scope, receive, send):
+        lean = scope['type'] == 'http' and is_lean_path(scope.get('path', ''))
+        return await (self.lean if lean else self.full)(scope, receive, send)
@@ -30,12 +30,99 @@ CSRF_TRUSTED_ORIGINS = config(
 # WhatsApp Webhook Verification Token (set this in Meta App Dashboard)
 WHATSAPP_VERIFY_TOKEN = config('WHATSAPP_VERIFY_TOKEN', default='your_verify_token_here')
 
+# Meta app secret (App Dashboard > Settings > Basic); when set, webhook POSTs must carry a valid
+# X-Hub-Signature-256 and unsigned or forged deliveries are rejected before parsing
+WHATSAPP_APP_SECRET = config('WHATSAPP_APP_SECRET', default='')
+# Set to False to accept unsigned webhook POSTs on purpose (local testing); while it is True
+# and WHATSAPP_APP_SECRET is empty, deliveries are not verified and a warning is raised
+WHATSAPP_VERIFY_SIGNATURES = config('WHATSAPP_VERIFY_SIGNATURES', default=True, cast=bool)
+# Largest webhook body accepted, in bytes (0: no limit)
+WHATSAPP_WEBHOOK_MAX_BODY_BYTES = config('WHATSAPP_WEBHOOK_MAX_BODY_BYTES', default=1024 * 1024, cast=int)
+
+# Admission control: webhook POSTs get 503 Retry-After (Meta redelivers) while this process has
+# more than WHATSAPP_ADMISSION_MAX_IN_FLIGHT requests in progress or its average delivery write
+# takes longer than WHATSAPP_ADMISSION_MAX_WRITE_SECONDS (0 disables either limit). Status-only
+# deliveries are shed at WHATSAPP_ADMISSION_STATUS_SHARE of the limits.
+WHATSAPP_ADMISSION_MAX_IN_FLIGHT = config('WHATSAPP_ADMISSION_MAX_IN_FLIGHT', default=16, cast=int)
+WHATSAPP_ADMISSION_MAX_WRITE_SECONDS = config('WHATSAPP_ADMISSION_MAX_WRITE_SECONDS', default=2.0, cast=float)
+WHATSAPP_ADMISSION_STATUS_SHARE = config('WHATSAPP_ADMISSION_STATUS_SHARE', default=0.5, cast=float)
+WHATSAPP_ADMISSION_RETRY_AFTER = config('WHATSAPP_ADMISSION_RETRY_AFTER', default=5, cast=int)
+
 # WhatsApp Business API Configuration (for sending messages)
 WHATSAPP_ACCESS_TOKEN = config('WHATSAPP_ACCESS_TOKEN', default='')
 WHATSAPP_PHONE_NUMBER_ID = config('WHATSAPP_PHONE_NUMBER_ID', default='')
 WHATSAPP_API_VERSION = config('WHATSAPP_API_VERSION', default='v21.0')
 WHATSAPP_API_BASE_URL = f'https://graph.facebook.com/{WHATSAPP_API_VERSION}'
 
+# Graph API HTTP client: keep-alive connection pool size and per-phase timeouts (seconds)
+WHATSAPP_HTTP_POOL_SIZE = config('WHATSAPP_HTTP_POOL_SIZE', default=20, cast=int)
+WHATSAPP_HTTP_CONNECT_TIMEOUT = config('WHATSAPP_HTTP_CONNECT_TIMEOUT', default=5.0, cast=float)
+WHATSAPP_HTTP_READ_TIMEOUT = config('WHATSAPP_HTTP_READ_TIMEOUT', default=30.0, cast=float)
+WHATSAPP_HTTP_POOL_TIMEOUT = config('WHATSAPP_HTTP_POOL_TIMEOUT', default=10.0, cast=float)
+
+# Bulk sends: concurrent Graph API requests (keep <= WHATSAPP_HTTP_POOL_SIZE) and max recipients per request
+WHATSAPP_SEND_CONCURRENCY = config('WHATSAPP_SEND_CONCURRENCY', default=16, cast=int)
+WHATSAPP_BULK_SEND_MAX_ITEMS = config('WHATSAPP_BULK_SEND_MAX_ITEMS', default=1000, cast=int)
+
+# Retries of sends that failed with a transient Graph API error (delays in seconds)
+WHATSAPP_RETRY_MAX_ATTEMPTS = config('WHATSAPP_RETRY_MAX_ATTEMPTS', default=6, cast=int)
+WHATSAPP_RETRY_BASE_DELAY = config('WHATSAPP_RETRY_BASE_DELAY', default=30.0, cast=float)
+WHATSAPP_RETRY_MAX_DELAY = config('WHATSAPP_RETRY_MAX_DELAY', default=3600.0, cast=float)
+
+# Outbound rate limiting, shared by all worker processes through a local SQLite file.
+# MPS is the phone number's throughput tier; the pair limit caps messages to one recipient.
+WHATSAPP_RATE_LIMIT_ENABLED = config('WHATSAPP_RATE_LIMIT_ENABLED', default=True, cast=bool)
+WHATSAPP_RATE_LIMIT_MPS = config('WHATSAPP_RATE_LIMIT_MPS', default=80.0, cast=float)
+WHATSAPP_RATE_LIMIT_BURST = config('WHATSAPP_RATE_LIMIT_BURST', default=80.0, cast=float)
+WHATSAPP_PAIR_RATE_LIMIT_PER_MINUTE = config('WHATSAPP_PAIR_RATE_LIMIT_PER_MINUTE', default=10.0, cast=float)
+WHATSAPP_PAIR_RATE_LIMIT_BURST = config('WHATSAPP_PAIR_RATE_LIMIT_BURST', default=10.0, cast=float)
+WHATSAPP_RATE_LIMIT_DB = config('WHATSAPP_RATE_LIMIT_DB', default=str(BASE_DIR / 'ratelimit.sqlite3'))
+# Longest a send waits for a slot; past it the send is refused as retryable and rescheduled
+WHATSAPP_RATE_LIMIT_MAX_WAIT = config('WHATSAPP_RATE_LIMIT_MAX_WAIT', default=5.0, cast=float)
+
+# Webhook inbox mode: store raw bodies and ack immediately; run
+# `python manage.py process_webhook_inbox --loop` to ingest them
+WHATSAPP_WEBHOOK_INBOX_MODE = config('WHATSAPP_WEBHOOK_INBOX_MODE', default=False, cast=bool)
+
+# Skip messages and status events Meta has already delivered
+WHATSAPP_DEDUP_ENABLED = config('WHATSAPP_DEDUP_ENABLED', default=True, cast=bool)
+WHATSAPP_DEDUP_CACHE_SIZE = config('WHATSAPP_DEDUP_CACHE_SIZE', default=100000, cast=int)
+
+# Local content-addressed store for downloaded media (see webhook/media.py)
+WHATSAPP_MEDIA_ROOT = config('WHATSAPP_MEDIA_ROOT', default=str(BASE_DIR / 'media_store'))
+WHATSAPP_MEDIA_FETCH_CONCURRENCY = config('WHATSAPP_MEDIA_FETCH_CONCURRENCY', default=8, cast=int)
+WHATSAPP_MEDIA_MAX_BYTES = config('WHATSAPP_MEDIA_MAX_BYTES', default=100 * 1024 * 1024, cast=int)
+# Serve media via the front-end server: internal location prefix for X-Accel-Redirect (e.g. /protected-media/)
+WHATSAPP_MEDIA_ACCEL_REDIRECT = config('WHATSAPP_MEDIA_ACCEL_REDIRECT', default='')
+
+# Metrics (/metrics). Set a directory to aggregate the numbers of several worker processes
+WHATSAPP_METRICS_DIR = config('WHATSAPP_METRICS_DIR', default='')
+WHATSAPP_METRICS_FLUSH_INTERVAL = config('WHATSAPP_METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+# Bearer token required to read /metrics (empty: /metrics answers 404)
+WHATSAPP_METRICS_TOKEN = config('WHATSAPP_METRICS_TOKEN', default='')
+
+# Bearer token required by the read APIs (conversation history, search, media); unset refuses them all
+WHATSAPP_API_TOKEN = config('WHATSAPP_API_TOKEN', default='')
+
+# Opt-in request profiling (see webhook/profiling.py): share of requests sampled,
+# token that profiles a request sent with X-Profile-Token, and where profiles go
+WHATSAPP_PROFILE_SAMPLE_RATE = config('WHATSAPP_PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+WHATSAPP_PROFILE_TOKEN = config('WHATSAPP_PROFILE_TOKEN', default='')
+WHATSAPP_PROFILE_DIR = config('WHATSAPP_PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+WHATSAPP_PROFILE_MAX_FILES = config('WHATSAPP_PROFILE_MAX_FILES', default=200, cast=int)
+
+# Dotted path of a callable run with each stored IngestBatch (chatbot logic); empty: none
+WHATSAPP_POST_INGEST_HOOK = config('WHATSAPP_POST_INGEST_HOOK', default='')
+
+# Message search backend (dotted path); empty picks SQLite FTS5 on SQLite, icontains elsewhere
+WHATSAPP_SEARCH_BACKEND = config('WHATSAPP_SEARCH_BACKEND', default='')
+
+# Compress raw webhook payloads and API responses into the ArchivedPayload table
+WHATSAPP_ARCHIVE_PAYLOADS = config('WHATSAPP_ARCHIVE_PAYLOADS', default=False, cast=bool)
+
+# Serve /webhook/ and /api/send-message/ with async views (use with an ASGI server)
+WHATSAPP_ASYNC_VIEWS = config('WHATSAPP_ASYNC_VIEWS', default=False, cast=bool)
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -59,6 +146,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Requests under these path prefixes run only WHATSAPP_LEAN_MIDDLEWARE (see whatsapp_webhook/dispatch.py);
+# off by default, it only saves time on cheap requests such as the GET verification
+WHATSAPP_LEAN_DISPATCH = config('WHATSAPP_LEAN_DISPATCH', default=False, cast=bool)
+WHATSAPP_LEAN_PATH_PREFIXES = config(
+    'WHATSAPP_LEAN_PATH_PREFIXES', default='/webhook/,/api/', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]
+)
+WHATSAPP_LEAN_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
 ROOT_URLCONF = 'whatsapp_webhook.urls'
 
 TEMPLATES = [
@@ -85,8 +183,14 @@ WSGI_APPLICATION = 'whatsapp_webhook.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 with BEGIN IMMEDIATE transactions, so concurrent ingests
+        # wait for the write lock instead of failing with "database is locked"
+        'ENGINE': 'whatsapp_webhook.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Seconds a transaction waits for the write lock
+            'timeout': 20,
+        },
     }
 }
 
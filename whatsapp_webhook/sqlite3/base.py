@@ -0,0 +1,17 @@
+"""
+SQLite backend whose transactions take the write lock when they begin.
+
+Django opens SQLite transactions with a plain (deferred) BEGIN. When two
+connections write at once, as concurrent webhook ingests do, the one that
+read first cannot upgrade to the write lock and fails at once with
+"database is locked" instead of waiting out the busy timeout. BEGIN
+IMMEDIATE takes the write lock up front, so concurrent transactions queue
+for up to OPTIONS['timeout'] seconds instead of failing.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
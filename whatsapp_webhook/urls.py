@@ -3,10 +3,12 @@ URL configuration for whatsapp_webhook project.
 """
 from django.contrib import admin
 from django.urls import path, include
+from webhook import views as webhook_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('webhook/', include('webhook.urls')),
     path('api/', include('webhook.api_urls')),
+    path('metrics', webhook_views.metrics, name='metrics'),
 ]
 
@@ -9,9 +9,16 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'whatsapp_webhook.settings')
 
 application = get_wsgi_application()
 
+if settings.WHATSAPP_LEAN_DISPATCH:
+    from .dispatch import LeanDispatchWSGI
+
+    # /webhook/ and /api/ skip the session, auth, message, CSRF and clickjacking middleware
+    application = LeanDispatchWSGI(application)
+